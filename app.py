@@ -4,6 +4,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import time
+import html
+import os
+import tempfile
 from doc_utils import *
 
 # ====================================
@@ -17,6 +20,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Documentos por página en los resultados de búsqueda
+RESULTADOS_POR_PAGINA = 20
+
 # CSS personalizado para mejor apariencia
 st.markdown("""
 <style>
@@ -45,6 +51,19 @@ st.markdown("""
         margin: 1rem 0;
     }
     
+    .fragmento {
+        border-left: 3px solid #667eea;
+        padding: 0.3rem 0.8rem;
+        margin: 0.3rem 0;
+        font-size: 0.9rem;
+        color: #444;
+    }
+    
+    .fragmento mark {
+        background-color: #fff3a3;
+        padding: 0 0.1rem;
+    }
+    
     .stTabs [data-baseweb="tab-list"] {
         gap: 2rem;
     }
@@ -58,6 +77,8 @@ st.markdown("""
 
 # Inicializar sistema
 init_storage()
+# Procesar la cola de documentos en segundo plano (un hilo por servidor)
+iniciar_trabajador_en_hilo()
 
 # ====================================
 # SIDEBAR
@@ -94,6 +115,8 @@ if pagina == "🏠 Dashboard":
     st.markdown('<h1 class="main-header">🤖 Doc Finder - Sistema Inteligente de Gestión de Documentos</h1>', unsafe_allow_html=True)
     st.markdown("### Gestión de documentos potenciada por Inteligencia Artificial")
     
+    panel = resumen_panel()
+    
     # Métricas principales
     col1, col2, col3, col4 = st.columns(4)
     
@@ -116,7 +139,7 @@ if pagina == "🏠 Dashboard":
         """.format(stats["confianza_promedio"]), unsafe_allow_html=True)
     
     with col3:
-        docs_hoy = len([d for d in get_all_documents() if d["fecha_subida"][:10] == datetime.now().strftime("%Y-%m-%d")])
+        docs_hoy = panel["subidos_hoy"]
         st.markdown("""
         <div class="metric-card">
             <h2>📤</h2>
@@ -165,10 +188,8 @@ if pagina == "🏠 Dashboard":
     
     # Documentos recientes
     st.subheader("📄 Documentos Recientes")
-    docs = get_all_documents()
-    if docs:
-        docs_recientes = sorted(docs, key=lambda x: x["fecha_subida"], reverse=True)[:5]
-        
+    docs_recientes = panel["recientes"]
+    if docs_recientes:
         for doc in docs_recientes:
             with st.expander(f"📄 {doc['nombre_original']} - {doc['categoria']}", expanded=False):
                 col1, col2, col3 = st.columns(3)
@@ -176,7 +197,8 @@ if pagina == "🏠 Dashboard":
                 col2.metric("Confianza", f"{doc['confianza']*100:.1f}%")
                 col3.metric("Tamaño", f"{doc['tamaño_kb']} KB")
                 st.caption(f"📅 Subido: {doc['fecha_subida']}")
-                st.text_area("Extracto", doc["texto_extraido"][:200] + "...", height=100, disabled=True)
+                st.text_area("Extracto", doc["texto_extraido"][:200] + "...", height=100, disabled=True,
+                             key=f"reciente_{doc['id']}")
     else:
         st.info("📭 No hay documentos recientes")
 
@@ -221,77 +243,10 @@ elif pagina == "📤 Subir Documentos":
             st.markdown("---")
             
             if st.button("🚀 Procesar Documento", type="primary", use_container_width=True):
-                # Barra de progreso
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                # Paso 1: Guardar temporalmente
-                status_text.text("📁 Guardando archivo temporal...")
-                progress_bar.progress(20)
-                time.sleep(0.5)
-                
-                temp_path = TEMP_DIR / uploaded_file.name
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                # Paso 2: Extraer texto
-                status_text.text("🔍 Extrayendo texto con OCR...")
-                progress_bar.progress(40)
-                time.sleep(0.8)
-                
-                if uploaded_file.type == "application/pdf":
-                    texto_extraido = extract_text_from_pdf(temp_path)
-                else:
-                    texto_extraido = extract_text_from_image(temp_path)
-                
-                # Paso 3: Clasificar
-                status_text.text("🤖 Clasificando con IA (Zero-Shot Learning)...")
-                progress_bar.progress(60)
-                time.sleep(1.0)
-                
-                categoria, confianza = clasificar_documento_inteligente(texto_extraido, uploaded_file.name)
-                
-                # Paso 4: Guardar
-                status_text.text("💾 Guardando en el sistema...")
-                progress_bar.progress(80)
-                time.sleep(0.5)
-                
-                success, doc_id, mensaje = save_document(uploaded_file, texto_extraido, categoria, confianza)
-                
-                progress_bar.progress(100)
-                status_text.empty()
-                
-                if success:
-                    st.balloons()
-                    st.markdown(f"""
-                    <div class="success-box">
-                        <h3>✅ ¡Documento Procesado Exitosamente!</h3>
-                        <p><strong>ID del Documento:</strong> #{doc_id:04d}</p>
-                        <p><strong>Categoría Detectada:</strong> {categoria}</p>
-                        <p><strong>Nivel de Confianza:</strong> {confianza*100:.1f}%</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Mostrar resultados
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.subheader("📋 Texto Extraído (Primeros 500 caracteres)")
-                        st.text_area("", texto_extraido[:500], height=200, disabled=True, label_visibility="collapsed")
-                    
-                    with col2:
-                        st.subheader("🎯 Análisis de Clasificación")
-                        st.progress(confianza, text=f"Confianza: {confianza*100:.1f}%")
-                        
-                        st.markdown(f"""
-                        **Categoría Asignada:** {categoria}
-                        
-                        **¿Por qué esta categoría?**  
-                        El sistema analizó el contenido del documento y detectó palabras clave 
-                        asociadas con documentos de tipo "{categoria}".
-                        """)
-                else:
-                    st.error(mensaje)
+                trabajo_id = encolar_documento(uploaded_file)
+                st.session_state.setdefault("trabajos", []).append(trabajo_id)
+                st.success(f"📥 Documento en cola (trabajo #{trabajo_id}). "
+                           "Se procesará en segundo plano; puedes seguir usando la aplicación.")
     
     # ========== TAB 2: Múltiple ==========
     with tab2:
@@ -312,45 +267,59 @@ elif pagina == "📤 Subir Documentos":
             st.markdown("---")
             
             if st.button("🚀 Procesar Todos los Documentos", type="primary", use_container_width=True):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                procesados = 0
-                errores = 0
-                
-                for i, file in enumerate(uploaded_files):
-                    status_text.text(f"⚙️ Procesando {i+1}/{len(uploaded_files)}: {file.name}")
-                    
-                    # Guardar temporal
-                    temp_path = TEMP_DIR / file.name
-                    with open(temp_path, "wb") as f:
-                        f.write(file.getbuffer())
-                    
-                    # Extraer texto
-                    if file.type == "application/pdf":
-                        texto = extract_text_from_pdf(temp_path)
-                    else:
-                        texto = extract_text_from_image(temp_path)
-                    
-                    # Clasificar
-                    categoria, confianza = clasificar_documento_inteligente(texto, file.name)
-                    
-                    # Guardar
-                    success, doc_id, mensaje = save_document(file, texto, categoria, confianza)
-                    
-                    if success:
-                        procesados += 1
-                    else:
-                        errores += 1
-                    
-                    progress_bar.progress((i + 1) / len(uploaded_files))
-                    time.sleep(0.3)
-                
-                status_text.empty()
-                progress_bar.empty()
+                trabajos = st.session_state.setdefault("trabajos", [])
+                for file in uploaded_files:
+                    trabajos.append(encolar_documento(file))
                 
-                st.success(f"✅ Procesamiento completado: {procesados} exitosos, {errores} errores")
-                st.balloons()
+                st.success(f"📥 {len(uploaded_files)} documentos en cola. Se procesarán en segundo plano.")
+    
+    # ========== ESTADO DE LOS TRABAJOS ==========
+    def panel_trabajos():
+        trabajos = estado_trabajos(st.session_state.get("trabajos", []))
+        if not trabajos:
+            return
+        
+        st.markdown("---")
+        st.subheader("📋 Estado del Procesamiento")
+        
+        iconos = {"pendiente": "⏳", "procesando": "⚙️", "completado": "✅", "error": "❌"}
+        df = pd.DataFrame([{
+            "Trabajo": f"#{t['id']}",
+            "Archivo": t["nombre"],
+            "Estado": f"{iconos[t['estado']]} {t['estado']}",
+            "Categoría": t["categoria"] or "",
+            "Confianza": f"{t['confianza']*100:.1f}%" if t["confianza"] is not None else "",
+            "Documento": f"#{t['doc_id']:04d}" if t["doc_id"] else "",
+            "Tiempo (s)": round(t["terminado"] - t["creado"], 1) if t["terminado"] else None,
+            "Intentos": t["intentos"],
+            "Error": t["error"] or ""
+        } for t in trabajos])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        
+        # Resultado de los trabajos recién completados
+        mostrados = st.session_state.setdefault("trabajos_mostrados", set())
+        for t in trabajos:
+            if t["estado"] == "completado" and t["id"] not in mostrados:
+                mostrados.add(t["id"])
+                st.markdown(f"""
+                <div class="success-box">
+                    <h3>✅ ¡Documento Procesado Exitosamente!</h3>
+                    <p><strong>Archivo:</strong> {t['nombre']}</p>
+                    <p><strong>ID del Documento:</strong> #{t['doc_id']:04d}</p>
+                    <p><strong>Categoría Detectada:</strong> {t['categoria']}</p>
+                    <p><strong>Nivel de Confianza:</strong> {t['confianza']*100:.1f}%</p>
+                </div>
+                """, unsafe_allow_html=True)
+        
+        pendientes = [t for t in trabajos if t["estado"] in ("pendiente", "procesando")]
+        if pendientes:
+            st.caption(f"⏳ {len(pendientes)} trabajos en curso. El estado se actualiza automáticamente.")
+        st.button("🔄 Actualizar estado")
+    
+    # Consultar el estado periódicamente sin bloquear el resto de la página
+    if hasattr(st, "fragment"):
+        panel_trabajos = st.fragment(run_every=3)(panel_trabajos)
+    panel_trabajos()
 
 
 # ====================================
@@ -389,13 +358,60 @@ elif pagina == "🔍 Búsqueda Inteligente":
         buscar_simple_btn = st.button("🔎 Búsqueda Simple", use_container_width=True)
     with col3:
         if st.button("🔄 Limpiar", use_container_width=True):
+            st.session_state.pop("busqueda", None)
             st.rerun()
     
-    # ========== BÚSQUEDA CON IA ==========
+    # Recordar la última búsqueda para que los botones de detalle no la borren
     if buscar_btn and consulta:
+        st.session_state["busqueda"] = ("ia", consulta)
+    elif buscar_simple_btn and consulta:
+        st.session_state["busqueda"] = ("simple", consulta)
+    modo_busqueda, consulta_activa = st.session_state.get("busqueda", (None, None))
+    
+    def visor_paginas(doc, clave):
+        """Muestra una página del texto completo (solo se descomprime esa página)"""
+        total_paginas = paginas_documento(doc["id"])
+        if not total_paginas:
+            return
+        numero = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas,
+                                 value=1, key=f"{clave}_pagina_{doc['id']}")
+        st.text_area(f"📄 Página {numero}", leer_pagina(doc["id"], numero), height=300,
+                     disabled=True, key=f"{clave}_texto_{doc['id']}")
+    
+    def pagina_resultados(resultados):
+        """Los resultados de la página elegida; solo para ellos se calculan fragmentos y visor"""
+        total_paginas = -(-len(resultados) // RESULTADOS_POR_PAGINA)
+        numero = 1
+        if total_paginas > 1:
+            # La clave incluye la consulta: una búsqueda nueva vuelve a la primera página
+            numero = st.number_input(f"Página de resultados (de {total_paginas})", min_value=1,
+                                     max_value=total_paginas, value=1,
+                                     key=f"resultados_{modo_busqueda}_{consulta_activa}_{len(resultados)}")
+        inicio = (numero - 1) * RESULTADOS_POR_PAGINA
+        fin = min(inicio + RESULTADOS_POR_PAGINA, len(resultados))
+        st.caption(f"Mostrando {inicio + 1}–{fin} de {len(resultados)}")
+        return resultados[inicio:fin]
+    
+    def mostrar_fragmentos(doc):
+        """Pasajes donde aparece la búsqueda, con los términos resaltados"""
+        for fragmento in doc["fragmentos"]:
+            texto, partes, posicion = fragmento["texto"], [], 0
+            for inicio, fin in fragmento["resaltados"]:
+                partes.append(html.escape(texto[posicion:inicio]))
+                partes.append(f"<mark>{html.escape(texto[inicio:fin])}</mark>")
+                posicion = fin
+            partes.append(html.escape(texto[posicion:]))
+            pagina_fragmento = f"<b>Pág. {fragmento['pagina']}</b> · " if fragmento["pagina"] else ""
+            st.markdown(f'<div class="fragmento">{pagina_fragmento}{"".join(partes)}</div>',
+                        unsafe_allow_html=True)
+        return bool(doc["fragmentos"])
+    
+    # ========== BÚSQUEDA CON IA ==========
+    if modo_busqueda == "ia":
         with st.spinner("🤖 La IA está analizando tu consulta..."):
-            time.sleep(1.2)
-            parametros, resultados = buscar_documentos_ia(consulta)
+            if buscar_btn:
+                time.sleep(1.2)
+            parametros, resultados = buscar_documentos_ia(consulta_activa)
         
         st.markdown("---")
         
@@ -422,7 +438,7 @@ elif pagina == "🔍 Búsqueda Inteligente":
         if resultados:
             st.subheader(f"📊 Se encontraron {len(resultados)} documentos")
             
-            for doc in resultados:
+            for doc in pagina_resultados(resultados):
                 with st.container():
                     col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
                     
@@ -442,6 +458,8 @@ elif pagina == "🔍 Búsqueda Inteligente":
                         if st.button("👁️", key=f"ver_{doc['id']}", help="Ver detalles"):
                             st.session_state[f"show_{doc['id']}"] = True
                     
+                    mostrar_fragmentos(doc)
+                    
                     # Detalles expandibles
                     if st.session_state.get(f"show_{doc['id']}", False):
                         st.markdown(f"""
@@ -451,19 +469,20 @@ elif pagina == "🔍 Búsqueda Inteligente":
                         
                         **📁 Ruta:** `{doc['ruta']}`
                         """)
+                        visor_paginas(doc, "ia")
                     
                     st.markdown("---")
         else:
             st.warning("😕 No se encontraron documentos que coincidan con tu búsqueda")
     
     # ========== BÚSQUEDA SIMPLE ==========
-    elif buscar_simple_btn and consulta:
-        resultados = search_documents(consulta)
+    elif modo_busqueda == "simple":
+        resultados = search_documents(consulta_activa)
         
         if resultados:
             st.success(f"✅ Se encontraron {len(resultados)} documentos")
             
-            for doc in resultados:
+            for doc in pagina_resultados(resultados):
                 with st.expander(f"📄 {doc['nombre_original']} - Relevancia: {doc['relevancia']}⭐"):
                     col1, col2 = st.columns(2)
                     
@@ -475,9 +494,24 @@ elif pagina == "🔍 Búsqueda Inteligente":
                         st.metric("Fecha", doc["fecha_subida"][:10])
                         st.metric("Tamaño", f"{doc['tamaño_kb']} KB")
                     
-                    st.text_area("Extracto", doc["texto_extraido"], height=150, disabled=True)
+                    # Sin coincidencias en el texto (solo nombre o categoría) se muestra el extracto
+                    if not mostrar_fragmentos(doc):
+                        st.text_area("Extracto", doc["texto_extraido"], height=150, disabled=True,
+                                     key=f"extracto_{doc['id']}")
+                    
+                    # El texto completo solo se descomprime si se pide, como en la búsqueda con IA
+                    if st.button("📖 Ver páginas", key=f"paginas_{doc['id']}"):
+                        st.session_state[f"show_paginas_{doc['id']}"] = True
+                    if st.session_state.get(f"show_paginas_{doc['id']}", False):
+                        visor_paginas(doc, "simple")
         else:
             st.warning("😕 No se encontraron documentos")
+    
+    if modo_busqueda:
+        cache = metricas_cache_consultas()
+        st.caption(f"⚡ Caché de búsquedas: {cache['aciertos']} de {cache['consultas']} consultas "
+                   f"respondidas sin recalcular ({cache['tasa_aciertos']*100:.0f}%) · "
+                   f"{cache['entradas']}/{cache['capacidad']} entradas · generación del índice {cache['generacion']}")
 
 
 # ====================================
@@ -487,26 +521,26 @@ elif pagina == "🔍 Búsqueda Inteligente":
 elif pagina == "📊 Análisis y Reportes":
     st.markdown('<h1 class="main-header">📊 Análisis y Reportes del Sistema</h1>', unsafe_allow_html=True)
     
-    docs = get_all_documents()
+    analisis = analisis_columnar()
     
-    if not docs:
+    if not analisis["total_documentos"]:
         st.info("📭 No hay documentos para analizar. ¡Sube algunos documentos primero!")
     else:
         # Métricas principales
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("📄 Total Documentos", len(docs))
+            st.metric("📄 Total Documentos", analisis["total_documentos"])
         
         with col2:
-            st.metric("📂 Categorías Únicas", len(set(d["categoria"] for d in docs)))
+            st.metric("📂 Categorías Únicas", len(analisis["categorias"]))
         
         with col3:
-            tamaño_total = sum(d["tamaño_kb"] for d in docs) / 1024
+            tamaño_total = analisis["tamaño_total_kb"] / 1024
             st.metric("💾 Espacio Total", f"{tamaño_total:.2f} MB")
         
         with col4:
-            confianza_avg = sum(d["confianza"] for d in docs) / len(docs) * 100
+            confianza_avg = analisis["confianza_promedio"] * 100
             st.metric("🎯 Precisión Promedio", f"{confianza_avg:.1f}%")
         
         st.markdown("---")
@@ -519,25 +553,20 @@ elif pagina == "📊 Análisis y Reportes":
             
             with col1:
                 st.subheader("Distribución por Categorías")
-                df_cat = pd.DataFrame([(d["categoria"], d["tamaño_kb"]) for d in docs], 
-                                     columns=["Categoría", "Tamaño KB"])
-                cat_counts = df_cat["Categoría"].value_counts()
-                fig = px.pie(values=cat_counts.values, names=cat_counts.index,
+                fig = px.pie(values=analisis["conteo_categorias"], names=analisis["categorias"],
                            title="Documentos por Categoría")
                 st.plotly_chart(fig, use_container_width=True)
             
             with col2:
                 st.subheader("Tamaño por Categoría")
-                cat_size = df_cat.groupby("Categoría")["Tamaño KB"].sum().sort_values(ascending=True)
+                cat_size = pd.Series(analisis["tamaño_categorias"], index=analisis["categorias"]).sort_values(ascending=True)
                 fig = px.bar(x=cat_size.values, y=cat_size.index, orientation='h',
                            title="Espacio usado por categoría")
                 st.plotly_chart(fig, use_container_width=True)
         
         with tab2:
             st.subheader("📅 Línea de Tiempo de Documentos")
-            df_time = pd.DataFrame([(d["fecha_subida"][:10], 1) for d in docs],
-                                  columns=["Fecha", "Cantidad"])
-            df_time = df_time.groupby("Fecha").count().reset_index()
+            df_time = pd.DataFrame({"Fecha": analisis["dias"], "Cantidad": analisis["por_dia"]})
             fig = px.line(df_time, x="Fecha", y="Cantidad", 
                          title="Documentos subidos por día",
                          markers=True)
@@ -545,8 +574,9 @@ elif pagina == "📊 Análisis y Reportes":
         
         with tab3:
             st.subheader("🎯 Distribución de Confianza IA")
-            confianzas = [d["confianza"] * 100 for d in docs]
-            fig = go.Figure(data=[go.Histogram(x=confianzas, nbinsx=20)])
+            frecuencias, bordes = analisis["histograma_confianza"]
+            fig = go.Figure(data=[go.Bar(x=(bordes[:-1] + bordes[1:]) / 2, y=frecuencias,
+                                         width=bordes[1] - bordes[0])])
             fig.update_layout(title="Histograma de Niveles de Confianza",
                             xaxis_title="Confianza (%)",
                             yaxis_title="Cantidad de Documentos")
@@ -554,33 +584,68 @@ elif pagina == "📊 Análisis y Reportes":
         
         st.markdown("---")
         
-        # Tabla de todos los documentos
+        # Tabla de documentos (los más recientes)
         st.subheader("📋 Listado Completo de Documentos")
         
-        df = pd.DataFrame([{
-            "ID": f"#{d['id']:04d}",
-            "Nombre": d["nombre_original"],
-            "Categoría": d["categoria"],
-            "Confianza": f"{d['confianza']*100:.1f}%",
-            "Fecha": d["fecha_subida"][:10],
-            "Tamaño (KB)": d["tamaño_kb"]
-        } for d in docs])
+        listado = analisis["listado"]
+        df = pd.DataFrame({
+            "ID": pd.Series(listado["id"]).map("#{:04d}".format),
+            "Nombre": listado["nombre"],
+            "Categoría": listado["categoria"],
+            "Confianza": pd.Series(listado["confianza"] * 100).map("{:.1f}%".format),
+            "Fecha": pd.Series(listado["fecha"]).dt.strftime("%Y-%m-%d"),
+            "Tamaño (KB)": listado["tamano_kb"].round(2)
+        })
         
+        if len(df) < analisis["total_documentos"]:
+            st.caption(f"Mostrando los {len(df)} documentos más recientes de {analisis['total_documentos']}")
         st.dataframe(df, use_container_width=True, hide_index=True)
         
         # Exportar reporte
         st.markdown("---")
-        if st.button("📥 Exportar Reporte Completo (JSON)", use_container_width=True):
-            import json
-            reporte = {
-                "fecha_generacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "estadisticas": stats,
-                "documentos": docs
-            }
+        st.subheader("📥 Exportar Reporte")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            formato = st.selectbox("Formato", list(FORMATOS_EXPORTACION), format_func=str.upper)
+        with col2:
+            categoria_export = st.selectbox("Categoría", ["Todas"] + CATEGORIAS)
+        with col3:
+            rango = st.date_input("Rango de fechas", value=())
+        
+        incluir_archivos = formato == "zip" and st.checkbox("Incluir archivos originales en el ZIP")
+        
+        if st.button("📥 Exportar Reporte Completo", use_container_width=True):
+            mime, extension = FORMATOS_EXPORTACION[formato]
+            nombre = f"reporte_doc_finder_{datetime.now().strftime('%Y%m%d')}{extension}"
+            # Un archivo propio por exportación: varios usuarios pueden exportar a la vez
+            TEMP_DIR.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=TEMP_DIR, prefix="reporte_", suffix=extension,
+                                             delete=False) as temporal:
+                destino = Path(temporal.name)
+            
+            with st.spinner("Generando reporte..."):
+                total = exportar_reporte(
+                    destino, formato,
+                    categoria=None if categoria_export == "Todas" else categoria_export,
+                    fecha_desde=rango[0].isoformat() if len(rango) > 0 else None,
+                    fecha_hasta=rango[-1].isoformat() if len(rango) > 0 else None,
+                    incluir_archivos=incluir_archivos
+                )
             
-            st.download_button(
-                label="⬇️ Descargar reporte.json",
-                data=json.dumps(reporte, indent=2, ensure_ascii=False),
-                file_name=f"reporte_doc_finder_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json"
-            )
\ No newline at end of file
+            st.caption(f"{total} documentos exportados")
+            # st.download_button carga el archivo entero en memoria: los reportes
+            # muy grandes se dejan en el servidor en vez de ofrecerlos para descargar
+            tamaño_mb = destino.stat().st_size / (1024 * 1024)
+            if tamaño_mb > MAX_DESCARGA_MB:
+                st.warning(f"El reporte pesa {tamaño_mb:.0f} MB (más de {MAX_DESCARGA_MB} MB) y no se "
+                           f"ofrece como descarga. Quedó guardado en el servidor: {destino.resolve()}")
+            else:
+                with open(destino, "rb") as f:
+                    st.download_button(
+                        label=f"⬇️ Descargar {nombre}",
+                        data=f,
+                        file_name=nombre,
+                        mime=mime
+                    )
+                os.remove(destino)
@@ -0,0 +1,273 @@
+"""
+Herramientas de línea de comandos de Doc Finder
+
+Uso:
+    python cli.py reclasificar [--todos] [--simular] [--procesos N]
+    python cli.py convertir ORIGEN DESTINO
+    python cli.py verificar INDICE.dfb
+    python cli.py trabajadores [-n N] [--hasta-vaciar]
+    python cli.py cola
+    python cli.py particiones [--cantidad N | --dividir | --unir]
+    python cli.py vigilar [CARPETA ...] [-n N] [--espera S] [--lote N] [--max-pendientes N]
+    python cli.py importacion [--repeticiones N]
+    python cli.py carga [--usuarios N] [--procesos N] [--duracion S] [--corpus N] [--mezcla OP=PESO,...]
+                        [--particiones N] [--limite-operacion S]
+"""
+import argparse
+import json
+import sys
+
+
+def cmd_reclasificar(args):
+    from doc_utils import reclasificar_documentos, BASE_DIR
+    from datetime import datetime
+    
+    reporte = reclasificar_documentos(procesos=args.procesos, todos=args.todos,
+                                      aplicar=not args.simular, tamaño_lote=args.lote)
+    
+    destino = args.reporte or BASE_DIR / f"reclasificacion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(destino, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+    
+    print(f"Versión del clasificador: {reporte['version_clasificador']}")
+    print(f"Procesados: {reporte['procesados']}  Cambiados: {reporte['cambiados']}  "
+          f"({reporte['duracion_s']} s){'' if reporte['aplicado'] else '  [simulación]'}")
+    for transicion, cantidad in sorted(reporte["resumen"].items(), key=lambda x: -x[1]):
+        print(f"  {cantidad:6d}  {transicion}")
+    print(f"Reporte: {destino}")
+
+
+def cmd_convertir(args):
+    from doc_utils import indice_json_a_binario, indice_binario_a_json
+    
+    if args.origen.endswith(".json"):
+        total = indice_json_a_binario(args.origen, args.destino)
+    else:
+        total = indice_binario_a_json(args.origen, args.destino)
+    print(f"{total} documentos convertidos: {args.origen} -> {args.destino}")
+
+
+def cmd_verificar(args):
+    from doc_utils import verificar_indice_binario
+    
+    try:
+        cabecera = verificar_indice_binario(args.indice)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ Índice válido: {cabecera['filas']} documentos "
+          f"(capacidad {cabecera['capacidad']}, último ID {cabecera['ultimo_id']})")
+
+
+def cmd_trabajadores(args):
+    from doc_utils import iniciar_trabajadores
+    
+    iniciar_trabajadores(args.n, salir_si_vacia=args.hasta_vaciar)
+
+
+def cmd_cola(args):
+    from doc_utils import resumen_cola, estado_trabajos
+    
+    print("  ".join(f"{estado}: {cantidad}" for estado, cantidad in resumen_cola().items()))
+    for t in estado_trabajos(limite=args.ultimos):
+        duracion = f"{t['terminado'] - t['creado']:.1f}s" if t["terminado"] else "-"
+        print(f"  #{t['id']:<6} {t['estado']:<11} {duracion:>8}  {t['nombre']}  {t['error'] or ''}")
+
+
+def cmd_particiones(args):
+    from doc_utils import (configurar_particiones, dividir_particiones, unir_particiones,
+                           leer_config_particiones, cargar_tabla, particiones_vigentes)
+    
+    try:
+        if args.cantidad is not None:
+            configurar_particiones(args.cantidad)
+        elif args.dividir:
+            dividir_particiones()
+        elif args.unir:
+            unir_particiones()
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    
+    config = leer_config_particiones()
+    if config["cantidad"] <= 1:
+        print("Sin particiones: una sola tabla")
+        return
+    print(f"{config['cantidad']} particiones (versión {config['version']})")
+    for particion in particiones_vigentes(config):
+        print(f"  #{particion[1]:<4} {len(cargar_tabla(particion)):>10} documentos")
+
+
+def cmd_vigilar(args):
+    from doc_utils import vigilar_carpetas, CARPETAS_ENTRADA
+    from datetime import datetime
+    
+    def al_encolar(lote):
+        for ruta, trabajo_id in lote.items():
+            print(f"{datetime.now():%H:%M:%S}  #{trabajo_id:<6} {ruta}")
+    
+    carpetas = args.carpetas or CARPETAS_ENTRADA
+    print(f"Vigilando: {', '.join(map(str, carpetas))}  (Ctrl+C para terminar)")
+    try:
+        total = vigilar_carpetas(carpetas, trabajadores=args.n, espera_estable=args.espera,
+                                 tamaño_lote=args.lote, max_pendientes=args.max_pendientes,
+                                 al_encolar=al_encolar)
+    except KeyboardInterrupt:
+        return
+    print(f"{total} archivos encolados")
+
+
+# Dependencias pesadas que importar doc_utils no debería cargar
+MODULOS_PESADOS = ("streamlit", "fitz", "pymupdf", "PIL", "pytesseract", "pandas", "numpy", "torch", "transformers")
+
+MEDIR_IMPORTACION = """
+import sys, time
+inicio = time.perf_counter()
+import doc_utils
+print(time.perf_counter() - inicio)
+print(",".join(m for m in sys.argv[1:] if m in sys.modules))
+"""
+
+
+def cmd_importacion(args):
+    import statistics
+    import subprocess
+    import time
+    from pathlib import Path
+    
+    carpeta = Path(__file__).resolve().parent
+    importacion, arranque = [], []
+    for _ in range(args.repeticiones):
+        inicio = time.perf_counter()
+        salida = subprocess.run([sys.executable, "-c", MEDIR_IMPORTACION, *MODULOS_PESADOS],
+                                cwd=carpeta, capture_output=True, text=True, check=True).stdout.splitlines()
+        arranque.append(time.perf_counter() - inicio)
+        # Las dos últimas líneas (algunas dependencias escriben avisos al importarse)
+        importacion.append(float(salida[-2]))
+        cargados = salida[-1]
+    
+    for nombre, tiempos in (("import doc_utils", importacion), ("proceso completo", arranque)):
+        print(f"{nombre:<18} mediana {statistics.median(tiempos) * 1000:8.1f} ms   "
+              f"mínimo {min(tiempos) * 1000:8.1f} ms")
+    if cargados:
+        print(f"⚠️ Dependencias pesadas cargadas al importar: {cargados}")
+        return 1
+    print("✅ Sin dependencias pesadas al importar")
+
+
+def cmd_carga(args):
+    from prueba_carga import ejecutar_prueba_carga
+    
+    try:
+        mezcla = None
+        if args.mezcla:
+            mezcla = {nombre.strip(): float(peso) for nombre, peso in
+                      (parte.split("=") for parte in args.mezcla.split(","))}
+        reporte = ejecutar_prueba_carga(usuarios=args.usuarios, procesos=args.procesos,
+                                        duracion=args.duracion, corpus=args.corpus, mezcla=mezcla,
+                                        pausa=args.pausa, datos=args.datos, particiones=args.particiones,
+                                        semilla=args.semilla, limite_operacion=args.limite_operacion)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    
+    if args.reporte:
+        with open(args.reporte, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, indent=2, ensure_ascii=False)
+    
+    print(f"{reporte['usuarios']} usuarios en {reporte['procesos']} procesos, {reporte['duracion_s']} s, "
+          f"{reporte['documentos_iniciales']} documentos al empezar ({reporte['datos']})")
+    print(f"{'operación':<10} {'hechas':>7} {'errores':>7} {'por s':>8} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'máx ms':>8}")
+    for nombre, op in reporte["operaciones"].items():
+        print(f"{nombre:<10} {op['completadas']:>7} {op['errores']:>7} {op['por_segundo']:>8} {op['p50_ms']:>8} "
+              f"{op['p90_ms']:>8} {op['p99_ms']:>8} {op['max_ms']:>8}")
+        for mensaje, veces in op["mensajes_error"].items():
+            print(f"    {veces:>5}x {mensaje}")
+    if reporte["procesos_sin_respuesta"]:
+        print(f"⚠️ {reporte['procesos_sin_respuesta']} procesos no entregaron resultados y se terminaron")
+    print(f"Total: {reporte['total_por_segundo']} operaciones/s, {reporte['total_errores']} errores")
+    
+    integridad = reporte["integridad"]
+    if integridad["ok"]:
+        print(f"✅ Índice íntegro: {integridad['documentos']} documentos")
+        return 1 if reporte["total_errores"] else None
+    print(f"❌ Problemas de integridad ({integridad['documentos']} documentos, {integridad['esperados']} esperados):")
+    for clave, valor in integridad.items():
+        if clave not in ("documentos", "esperados", "ok") and valor:
+            print(f"    {clave}: {valor if isinstance(valor, bool) else valor[:20]}")
+    return 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="Herramientas de Doc Finder")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    
+    p = sub.add_parser("reclasificar", help="Reclasifica documentos con el clasificador actual")
+    p.add_argument("--todos", action="store_true", help="Incluir también los ya actualizados")
+    p.add_argument("--simular", action="store_true", help="Solo reportar, sin modificar el índice")
+    p.add_argument("--procesos", type=int, default=None, help="Procesos en paralelo (por defecto: núcleos)")
+    p.add_argument("--lote", type=int, default=None,
+                   help="Documentos por escritura del índice (por defecto 50000)")
+    p.add_argument("--reporte", help="Ruta del reporte JSON de cambios")
+    p.set_defaults(func=cmd_reclasificar)
+    
+    p = sub.add_parser("convertir", help="Convierte entre index.json y el índice binario (.dfb)")
+    p.add_argument("origen", help="index.json o archivo .dfb")
+    p.add_argument("destino", help="Archivo de salida en el otro formato")
+    p.set_defaults(func=cmd_convertir)
+    
+    p = sub.add_parser("verificar", help="Comprueba los checksums de un índice binario")
+    p.add_argument("indice", help="Archivo .dfb")
+    p.set_defaults(func=cmd_verificar)
+    
+    p = sub.add_parser("trabajadores", help="Procesa la cola de documentos subidos")
+    p.add_argument("-n", type=int, default=None, help="Procesos trabajadores (por defecto: núcleos)")
+    p.add_argument("--hasta-vaciar", action="store_true", help="Terminar cuando no queden trabajos")
+    p.set_defaults(func=cmd_trabajadores)
+    
+    p = sub.add_parser("cola", help="Muestra el estado de la cola de trabajos")
+    p.add_argument("--ultimos", type=int, default=20, help="Cantidad de trabajos a listar")
+    p.set_defaults(func=cmd_cola)
+    
+    p = sub.add_parser("particiones", help="Muestra, cambia, divide o une las particiones del índice")
+    grupo = p.add_mutually_exclusive_group()
+    grupo.add_argument("--cantidad", type=int, help="Repartir el índice en N particiones (1 = sin particiones)")
+    grupo.add_argument("--dividir", action="store_true", help="Duplicar la cantidad de particiones")
+    grupo.add_argument("--unir", action="store_true", help="Unir las particiones de a pares")
+    p.set_defaults(func=cmd_particiones)
+    
+    p = sub.add_parser("vigilar", help="Ingiere automáticamente lo que llega a las carpetas de entrada")
+    p.add_argument("carpetas", nargs="*", help="Carpetas a vigilar (por defecto: data_demo/entrada)")
+    p.add_argument("-n", type=int, default=None, help="Procesos trabajadores (por defecto: núcleos; 0 = ninguno)")
+    p.add_argument("--espera", type=float, default=None, help="Segundos sin cambios para dar un archivo por terminado")
+    p.add_argument("--lote", type=int, default=None, help="Archivos por lote encolado")
+    p.add_argument("--max-pendientes", type=int, default=None, help="Trabajos sin terminar a partir de los que se deja de encolar")
+    p.set_defaults(func=cmd_vigilar)
+    
+    p = sub.add_parser("importacion", help="Mide cuánto tarda importar doc_utils en un proceso nuevo")
+    p.add_argument("--repeticiones", type=int, default=10, help="Procesos a lanzar")
+    p.set_defaults(func=cmd_importacion)
+    
+    p = sub.add_parser("carga", help="Prueba de carga: usuarios simultáneos subiendo y buscando")
+    p.add_argument("--usuarios", type=int, default=8, help="Usuarios simultáneos (hilos)")
+    p.add_argument("--procesos", type=int, default=2, help="Procesos entre los que se reparten los usuarios")
+    p.add_argument("--duracion", type=float, default=30, help="Segundos de carga")
+    p.add_argument("--corpus", type=int, default=200, help="Documentos sintéticos iniciales (si la carpeta está vacía)")
+    p.add_argument("--mezcla", help="Pesos de cada operación, p. ej. subida=1,busqueda=5,ia=2,panel=2")
+    p.add_argument("--pausa", type=float, default=0, help="Pausa media entre operaciones de un usuario (s)")
+    p.add_argument("--particiones", type=int, default=2,
+                   help="Particiones del índice durante la prueba (1 para una sola tabla)")
+    p.add_argument("--limite-operacion", type=float, default=60,
+                   help="Segundos que puede tardar una operación antes de contarse como error")
+    p.add_argument("--datos", help="Carpeta de datos (por defecto una temporal nueva)")
+    p.add_argument("--semilla", type=int, default=0, help="Semilla del generador aleatorio")
+    p.add_argument("--reporte", help="Guardar el reporte completo en este JSON")
+    p.set_defaults(func=cmd_carga)
+    
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,34 @@
 import os
 import json
-import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
-from datetime import datetime
-import streamlit as st
+from datetime import datetime, timedelta
 from pathlib import Path
 import shutil
 import random
+import array
+import mmap
+import struct
+import zlib
+import sys
+import bisect
+import re
+import hashlib
+import csv
+import io
+import zipfile
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+from contextlib import contextmanager
+import threading
+import sqlite3
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # ====================================
 # CONFIGURACIÓN
@@ -18,9 +39,16 @@ BASE_DIR = Path("./data_demo")
 DOCS_DIR = BASE_DIR / "documentos"
 INDEX_FILE = BASE_DIR / "index.json"
 TEMP_DIR = BASE_DIR / "temp"
+COLA_DIR = BASE_DIR / "cola"
+TEXTOS_DIR = BASE_DIR / "textos"
+COLA_DB = BASE_DIR / "cola.db"
+
+# Ejecutable de Tesseract: variable de entorno TESSERACT_CMD o, si no está,
+# el que esté en el PATH (en Windows también la carpeta de instalación habitual)
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD")
 
-# Configuración de Tesseract (ajusta según tu instalación)
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+# Separador de páginas en el texto extraído (como en la salida de Tesseract)
+SEPARADOR_PAGINA = "\f"
 
 # Categorías predefinidas del sistema
 CATEGORIAS = [
@@ -47,6 +75,22 @@ def init_storage():
             json.dump({"documentos": [], "ultimo_id": 0}, f, indent=2)
 
 
+def configurar_rutas(base_dir):
+    """Cambia la carpeta de datos; todas las rutas cuelgan de BASE_DIR"""
+    global BASE_DIR, DOCS_DIR, INDEX_FILE, TEMP_DIR, COLA_DIR, TEXTOS_DIR, COLA_DB, INDICE_BIN_DIR, PARTICIONES_DIR
+    global CARPETAS_ENTRADA
+    BASE_DIR = Path(base_dir)
+    DOCS_DIR = BASE_DIR / "documentos"
+    INDEX_FILE = BASE_DIR / "index.json"
+    TEMP_DIR = BASE_DIR / "temp"
+    COLA_DIR = BASE_DIR / "cola"
+    TEXTOS_DIR = BASE_DIR / "textos"
+    COLA_DB = BASE_DIR / "cola.db"
+    INDICE_BIN_DIR = BASE_DIR / "indice"
+    PARTICIONES_DIR = BASE_DIR / "particiones"
+    CARPETAS_ENTRADA = [BASE_DIR / "entrada"]
+
+
 def load_index():
     """Carga el índice de documentos"""
     init_storage()
@@ -58,42 +102,188 @@ def load_index():
 
 
 def save_index(data):
-    """Guarda el índice de documentos"""
-    with open(INDEX_FILE, 'w', encoding='utf-8') as f:
+    """
+    Guarda el índice de documentos.
+    Se escribe a un temporal y se reemplaza, para que ningún lector vea
+    un JSON a medio escribir.
+    """
+    temporal = INDEX_FILE.with_name(f"{INDEX_FILE.name}.{os.getpid()}.tmp")
+    with open(temporal, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
+    for intento in range(10):
+        try:
+            os.replace(temporal, INDEX_FILE)
+            return
+        except PermissionError:
+            # En Windows falla si otro proceso tiene el archivo abierto
+            time.sleep(0.05 * (intento + 1))
+    os.replace(temporal, INDEX_FILE)
+
+
+# ====================================
+# BLOQUEO DEL ÍNDICE
+# ====================================
+
+# Un solo escritor a la vez entre hilos (sesiones de Streamlit) y procesos
+# (trabajadores de la cola, herramientas de línea de comandos)
+_bloqueo_hilos = threading.RLock()
+_bloqueo_estado = {"nivel": 0, "archivo": None}
+
+
+def _bloquear_archivo(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK se rinde después de ~10 s; seguir esperando
+                continue
+
+
+def _desbloquear_archivo(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def bloqueo_indice():
+    """Exclusión mutua para leer-modificar-escribir el índice (reentrante)"""
+    with _bloqueo_hilos:
+        if _bloqueo_estado["nivel"] == 0:
+            BASE_DIR.mkdir(parents=True, exist_ok=True)
+            archivo = open(BASE_DIR / "index.lock", 'a+b')
+            try:
+                _bloquear_archivo(archivo)
+            except BaseException:
+                archivo.close()
+                raise
+            _bloqueo_estado["archivo"] = archivo
+        _bloqueo_estado["nivel"] += 1
+        try:
+            yield
+        finally:
+            _bloqueo_estado["nivel"] -= 1
+            if _bloqueo_estado["nivel"] == 0:
+                archivo = _bloqueo_estado["archivo"]
+                _bloqueo_estado["archivo"] = None
+                _desbloquear_archivo(archivo)
+                archivo.close()
 
 
 # ====================================
 # FUNCIONES OCR
 # ====================================
 
+# PyMuPDF, Pillow y pytesseract se importan recién al extraer texto: buscar,
+# listar o calcular estadísticas no los necesita (ver `python cli.py importacion`)
+
+def ruta_tesseract():
+    """Ruta del ejecutable de Tesseract según TESSERACT_CMD, el PATH o la instalación de Windows"""
+    if TESSERACT_CMD:
+        return TESSERACT_CMD
+    encontrado = shutil.which("tesseract")
+    if encontrado:
+        return encontrado
+    windows = Path(os.environ.get("ProgramFiles", r"C:\Program Files")) / "Tesseract-OCR" / "tesseract.exe"
+    if windows.exists():
+        return str(windows)
+    return "tesseract"
+
+
+# Cada cuántas páginas se vacía la caché de MuPDF (fuentes, imágenes) en PDFs grandes
+PAGINAS_POR_LIMPIEZA = 16
+
+
 def extract_text_from_pdf(pdf_path):
-    """Extrae texto de un PDF usando PyMuPDF"""
+    """
+    Extrae texto de un PDF usando PyMuPDF (páginas separadas por SEPARADOR_PAGINA).
+    Se lee desde el archivo en disco, de a una página, así que en memoria solo
+    queda el texto y no el PDF completo.
+    """
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text if text.strip() else "Documento sin texto extraíble"
+        return _extraer_texto_pdf(pdf_path)
     except Exception as e:
         return f"Error al extraer texto: {str(e)}"
 
 
+def _extraer_texto_pdf(pdf_path):
+    """Como extract_text_from_pdf, pero lanza la excepción si falla"""
+    import fitz  # PyMuPDF
+    
+    paginas = []
+    with fitz.open(pdf_path) as doc:
+        for numero, page in enumerate(doc, 1):
+            paginas.append(page.get_text())
+            if numero % PAGINAS_POR_LIMPIEZA == 0:
+                fitz.TOOLS.store_shrink(100)
+    fitz.TOOLS.store_shrink(100)
+    text = SEPARADOR_PAGINA.join(paginas)
+    return text if text.strip() else "Documento sin texto extraíble"
+
+
 def extract_text_from_image(image_path):
     """Extrae texto de una imagen usando Tesseract OCR"""
     try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image, lang='spa')
-        return text if text.strip() else "Imagen sin texto reconocible"
+        return _extraer_texto_imagen(image_path)
     except Exception as e:
         return f"Error al extraer texto: {str(e)}"
 
 
+def _extraer_texto_imagen(image_path):
+    """Como extract_text_from_image, pero lanza la excepción si falla"""
+    import pytesseract
+    
+    pytesseract.pytesseract.tesseract_cmd = ruta_tesseract()
+    if isinstance(image_path, (str, Path)):
+        # Tesseract lee el archivo directamente, sin decodificar la imagen aquí
+        image = os.fspath(image_path)
+    else:
+        from PIL import Image
+        image = Image.open(image_path)
+    text = pytesseract.image_to_string(image, lang='spa')
+    return text if text.strip() else "Imagen sin texto reconocible"
+
+
 # ====================================
 # CLASIFICACIÓN INTELIGENTE (SIMULADA)
 # ====================================
 
+# Diccionario de palabras clave por categoría
+PALABRAS_CLAVE = {
+    "Contrato": ["contrato", "acuerdo", "partes", "cláusula", "convenio", "obligaciones"],
+    "Factura": ["factura", "invoice", "total", "subtotal", "iva", "importe", "pago"],
+    "Recibo": ["recibo", "receipt", "pagado", "abono", "recibí"],
+    "Identificación personal": ["cédula", "pasaporte", "dni", "identificación", "carnet"],
+    "Informe": ["informe", "reporte", "análisis", "conclusión", "resultados", "estudio"],
+    "Currículum / Hoja de vida": ["currículum", "cv", "experiencia laboral", "educación", "habilidades"],
+    "Certificado": ["certificado", "certificate", "certifica", "otorga", "registro", "onapi", "cámara de comercio"],
+    "Licencia o permiso": ["licencia", "permiso", "autorización", "license"],
+    "Correspondencia": ["carta", "email", "correo", "estimado", "atentamente"],
+    "Documentación legal": ["legal", "jurídico", "demanda", "sentencia", "juzgado", "acta", "asamblea", "dgii"],
+    "Documentación técnica": ["técnico", "especificación", "manual técnico", "diagrama"],
+    "Manual o guía": ["manual", "guía", "instructivo", "tutorial", "paso a paso"],
+    "Proyecto": ["proyecto", "propuesta", "plan de", "cronograma"],
+    "Planificación / Agenda": ["agenda", "calendario", "planificación", "horario", "schedule"],
+    "Leyes y normativas": ["ley", "normativa", "reglamento", "decreto", "código"],
+}
+
+# Subir este número al cambiar la forma de calcular los scores
+_REVISION_CLASIFICADOR = 1
+
+# Versión del clasificador: cambia sola cuando se modifica el diccionario,
+# así se detectan los documentos clasificados con reglas anteriores
+VERSION_CLASIFICADOR = hashlib.sha1(
+    json.dumps([_REVISION_CLASIFICADOR, PALABRAS_CLAVE], sort_keys=True, ensure_ascii=False).encode('utf-8')
+).hexdigest()[:8]
+
+
 def clasificar_documento_inteligente(texto, nombre_archivo):
     """
     Clasificación inteligente basada en palabras clave
@@ -102,28 +292,9 @@ def clasificar_documento_inteligente(texto, nombre_archivo):
     texto_lower = texto.lower()
     nombre_lower = nombre_archivo.lower()
     
-    # Diccionario de palabras clave por categoría
-    keywords = {
-        "Contrato": ["contrato", "acuerdo", "partes", "cláusula", "convenio", "obligaciones"],
-        "Factura": ["factura", "invoice", "total", "subtotal", "iva", "importe", "pago"],
-        "Recibo": ["recibo", "receipt", "pagado", "abono", "recibí"],
-        "Identificación personal": ["cédula", "pasaporte", "dni", "identificación", "carnet"],
-        "Informe": ["informe", "reporte", "análisis", "conclusión", "resultados", "estudio"],
-        "Currículum / Hoja de vida": ["currículum", "cv", "experiencia laboral", "educación", "habilidades"],
-        "Certificado": ["certificado", "certificate", "certifica", "otorga", "registro", "onapi", "cámara de comercio"],
-        "Licencia o permiso": ["licencia", "permiso", "autorización", "license"],
-        "Correspondencia": ["carta", "email", "correo", "estimado", "atentamente"],
-        "Documentación legal": ["legal", "jurídico", "demanda", "sentencia", "juzgado", "acta", "asamblea", "dgii"],
-        "Documentación técnica": ["técnico", "especificación", "manual técnico", "diagrama"],
-        "Manual o guía": ["manual", "guía", "instructivo", "tutorial", "paso a paso"],
-        "Proyecto": ["proyecto", "propuesta", "plan de", "cronograma"],
-        "Planificación / Agenda": ["agenda", "calendario", "planificación", "horario", "schedule"],
-        "Leyes y normativas": ["ley", "normativa", "reglamento", "decreto", "código"],
-    }
-    
     # Calcular scores por categoría
     scores = {}
-    for categoria, palabras in keywords.items():
+    for categoria, palabras in PALABRAS_CLAVE.items():
         score = 0
         for palabra in palabras:
             if palabra in texto_lower:
@@ -146,54 +317,249 @@ def clasificar_documento_inteligente(texto, nombre_archivo):
     return mejor_categoria, confianza
 
 
+# ====================================
+# CACHÉ DE CONSULTAS
+# ====================================
+#
+# Los resultados se guardan por consulta normalizada (y filtros) junto con
+# la generación del índice con la que se calcularon. La generación sube con
+# cada cambio del índice y deja inválidas todas las entradas a la vez; no hay
+# vencimiento por tiempo.
+
+CAPACIDAD_CACHE_CONSULTAS = 128
+
+_generacion = {"numero": 0, "firma": None}
+_bloqueo_generacion = threading.Lock()
+
+
+def normalizar_consulta(consulta):
+    """Minúsculas y espacios simples, para que consultas equivalentes compartan entrada"""
+    return " ".join(consulta.lower().split())
+
+
+def incrementar_generacion():
+    """Marca el índice como modificado (invalida la caché de consultas)"""
+    with _bloqueo_generacion:
+        _generacion["numero"] += 1
+        return _generacion["numero"]
+
+
+def generacion_indice():
+    """
+    Generación actual del índice. Sube con cada save_document de este proceso
+    y también cuando index.json cambió desde otro proceso (trabajadores, CLI).
+    """
+    firma = _firma_indice()
+    with _bloqueo_generacion:
+        if firma != _generacion["firma"]:
+            _generacion["firma"] = firma
+            _generacion["numero"] += 1
+        return _generacion["numero"]
+
+
+class ResultadosBusqueda:
+    """
+    Resultados ordenados de una búsqueda: filas de la tabla y su relevancia.
+    Se recorre como una lista de DocumentoVista (creadas al pedirlas), así la
+    caché guarda solo dos arreglos de enteros por consulta.
+    """
+    __slots__ = ("_tabla", "_filas", "_relevancias", "terminos")
+    
+    def __init__(self, tabla, filas, relevancias, terminos):
+        self._tabla = tabla
+        self._filas = array.array("I", filas)
+        self._relevancias = array.array("I", relevancias)
+        self.terminos = list(terminos)
+    
+    def __len__(self):
+        return len(self._filas)
+    
+    def _vista(self, posicion):
+        doc = self._tabla[self._filas[posicion]]
+        doc.relevancia = self._relevancias[posicion]
+        doc.terminos = self.terminos
+        return doc
+    
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            return [self._vista(i) for i in range(*posicion.indices(len(self)))]
+        return self._vista(range(len(self))[posicion])
+    
+    def __iter__(self):
+        return (self._vista(i) for i in range(len(self)))
+    
+    def recortar(self, limite):
+        """Los primeros `limite` resultados (todos si es None)"""
+        if limite is None or limite >= len(self):
+            return self
+        return ResultadosBusqueda(self._tabla, self._filas[:limite], self._relevancias[:limite], self.terminos)
+    
+    def __repr__(self):
+        return f"ResultadosBusqueda({len(self)} documentos)"
+
+
+class CacheConsultas:
+    """Caché LRU de resultados de búsqueda invalidada por generación del índice"""
+    
+    def __init__(self, capacidad=CAPACIDAD_CACHE_CONSULTAS):
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()
+        self._generacion = -1
+        self._bloqueo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidadas = 0
+        self.descartadas = 0
+    
+    def _sincronizar(self, generacion):
+        # Todas las entradas son de la misma generación: si cambió, se descartan juntas
+        if generacion > self._generacion:
+            self.invalidadas += len(self._entradas)
+            self._entradas.clear()
+            self._generacion = generacion
+    
+    def obtener(self, clave, generacion):
+        """Resultado guardado para la clave, o None"""
+        with self._bloqueo:
+            self._sincronizar(generacion)
+            if generacion < self._generacion or clave not in self._entradas:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return self._entradas[clave]
+    
+    def guardar(self, clave, generacion, valor):
+        with self._bloqueo:
+            self._sincronizar(generacion)
+            # Calculado con un índice que ya cambió: no se guarda
+            if generacion < self._generacion:
+                return
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.descartadas += 1
+    
+    def limpiar(self):
+        with self._bloqueo:
+            self.invalidadas += len(self._entradas)
+            self._entradas.clear()
+    
+    def metricas(self):
+        """Aciertos, fallos y tasa de aciertos desde que arrancó el proceso"""
+        with self._bloqueo:
+            consultas = self.aciertos + self.fallos
+            return {
+                "consultas": consultas,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+                "entradas": len(self._entradas),
+                "capacidad": self.capacidad,
+                "invalidadas": self.invalidadas,
+                "descartadas": self.descartadas,
+                "generacion": self._generacion,
+            }
+
+
+_cache_consultas = CacheConsultas()
+
+
+def metricas_cache_consultas():
+    """Métricas de la caché de consultas de este proceso"""
+    metricas = _cache_consultas.metricas()
+    metricas["interpretaciones"] = _interpretar_consulta.cache_info()._asdict()
+    return metricas
+
+
 # ====================================
 # GESTIÓN DE DOCUMENTOS
 # ====================================
 
-def save_document(uploaded_file, texto_extraido, categoria, confianza):
+TAMAÑO_BLOQUE_COPIA = 1024 * 1024
+
+
+def copiar_archivo(archivo, destino):
+    """
+    Escribe un archivo subido (o ArchivoEnDisco) en `destino` por bloques,
+    sin armar otra copia completa en memoria
+    """
+    if isinstance(archivo, ArchivoEnDisco):
+        shutil.copyfile(archivo.ruta, destino)
+        return
+    with open(destino, "wb") as f:
+        if hasattr(archivo, "read"):
+            archivo.seek(0)
+            shutil.copyfileobj(archivo, f, TAMAÑO_BLOQUE_COPIA)
+        else:
+            f.write(archivo.getbuffer())
+
+
+def save_document(uploaded_file, texto_extraido, categoria, confianza, trabajo=None):
     """
     Guarda un documento en el sistema local
+    `trabajo` identifica el trabajo de la cola que lo guarda: si ya hay un
+    documento de ese trabajo (el trabajador se cayó antes de marcarlo como
+    completado), se retorna ese en vez de guardarlo otra vez.
     Retorna: (success, doc_id, mensaje)
     """
     try:
-        # Cargar índice
-        index = load_index()
-        
-        # Generar nuevo ID
-        doc_id = index["ultimo_id"] + 1
-        
-        # Crear carpeta por categoría
-        categoria_dir = DOCS_DIR / categoria.replace("/", "_")
-        categoria_dir.mkdir(exist_ok=True)
-        
-        # Guardar archivo físico
-        extension = Path(uploaded_file.name).suffix
-        nuevo_nombre = f"doc_{doc_id:04d}{extension}"
-        ruta_final = categoria_dir / nuevo_nombre
-        
-        with open(ruta_final, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        # Crear registro en índice
-        documento = {
-            "id": doc_id,
-            "nombre_original": uploaded_file.name,
-            "nombre_archivo": nuevo_nombre,
-            "ruta": str(ruta_final),
-            "categoria": categoria,
-            "confianza": round(confianza, 2),
-            "fecha_subida": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "tamaño_kb": round(uploaded_file.size / 1024, 2),
-            "extension": extension,
-            "texto_extraido": texto_extraido[:500]  # Primeros 500 caracteres
-        }
-        
-        # Agregar a índice
-        index["documentos"].append(documento)
-        index["ultimo_id"] = doc_id
-        
-        # Guardar índice
-        save_index(index)
+        with bloqueo_indice():
+            # Cargar índice
+            index = load_index()
+            
+            if trabajo is not None:
+                for doc in index["documentos"]:
+                    if doc.get("trabajo") == trabajo:
+                        return True, doc["id"], f"✅ Documento ya guardado con ID {doc['id']}"
+            
+            # Generar nuevo ID
+            doc_id = index["ultimo_id"] + 1
+            
+            # Crear carpeta por categoría
+            categoria_dir = DOCS_DIR / categoria.replace("/", "_")
+            categoria_dir.mkdir(exist_ok=True)
+            
+            # Guardar archivo físico
+            extension = Path(uploaded_file.name).suffix
+            nuevo_nombre = f"doc_{doc_id:04d}{extension}"
+            ruta_final = categoria_dir / nuevo_nombre
+            
+            copiar_archivo(uploaded_file, ruta_final)
+            
+            # Texto completo aparte, comprimido por páginas
+            guardar_texto_completo(doc_id, texto_extraido)
+            
+            # Crear registro en índice
+            documento = {
+                "id": doc_id,
+                "nombre_original": uploaded_file.name,
+                "nombre_archivo": nuevo_nombre,
+                "ruta": str(ruta_final),
+                "categoria": categoria,
+                "confianza": round(confianza, 2),
+                "fecha_subida": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "tamaño_kb": round(uploaded_file.size / 1024, 2),
+                "extension": extension,
+                "texto_extraido": texto_extraido.replace(SEPARADOR_PAGINA, "\n")[:500],  # Primeros 500 caracteres
+                "version_clasificador": VERSION_CLASIFICADOR
+            }
+            if trabajo is not None:
+                documento["trabajo"] = trabajo
+            
+            # Agregar a índice
+            index["documentos"].append(documento)
+            index["ultimo_id"] = doc_id
+            
+            # Guardar índice
+            firma_anterior = _firma_indice()
+            save_index(index)
+            
+            # Mantener el índice binario y las particiones al día (solo agrega una fila)
+            _anexar_a_tabla(documento, index, firma_anterior)
+            _anexar_a_particiones(documento, index, firma_anterior)
+            incrementar_generacion()
         
         return True, doc_id, f"✅ Documento guardado exitosamente con ID {doc_id}"
         
@@ -202,66 +568,130 @@ def save_document(uploaded_file, texto_extraido, categoria, confianza):
 
 
 def get_all_documents():
-    """Obtiene todos los documentos del índice"""
-    index = load_index()
-    return index["documentos"]
+    """
+    Obtiene todos los documentos del índice como vistas livianas
+    (ver DocumentoVista) sobre el índice binario
+    """
+    return cargar_tabla()
 
 
 def get_document_by_id(doc_id):
     """Obtiene un documento específico por ID"""
-    docs = get_all_documents()
-    for doc in docs:
-        if doc["id"] == doc_id:
-            return doc
+    tabla = cargar_tabla()
+    # Los IDs se asignan en orden creciente
+    fila = bisect.bisect_left(tabla.columnas["id"], doc_id)
+    if fila < len(tabla) and tabla.columnas["id"][fila] == doc_id:
+        return tabla[fila]
     return None
 
 
-def search_documents(query):
+def search_documents(query, limite=None):
     """
     Búsqueda inteligente de documentos
     Busca en nombre, categoría y texto extraído
+    Cada resultado trae doc["fragmentos"] con los pasajes donde aparece la consulta
+    Con `limite` retorna solo los mejores resultados
     """
-    docs = get_all_documents()
-    query_lower = query.lower()
+    query_lower = normalizar_consulta(query)
+    generacion = generacion_indice()
+    clave = ("simple", query_lower, limite)
+    resultados = _cache_consultas.obtener(clave, generacion)
+    if resultados is None:
+        resultados = None
+        if particiones_activas():
+            try:
+                resultados = _buscar_en_particiones("simple", query_lower, query_lower.split(), limite)
+            except (TimeoutError, RuntimeError):
+                # Las particiones no respondieron o fallaron: se busca en la tabla completa
+                pass
+        if resultados is None:
+            resultados = _buscar_documentos(query_lower).recortar(limite)
+        _cache_consultas.guardar(clave, generacion, resultados)
+    return resultados
+
+
+def _buscar_documentos(query_lower, tabla=None):
+    if tabla is None:
+        tabla = get_all_documents()
     
-    resultados = []
-    for doc in docs:
-        # Calcular relevancia
-        relevancia = 0
-        
-        # Buscar en nombre
-        if query_lower in doc["nombre_original"].lower():
-            relevancia += 3
-        
-        # Buscar en categoría
-        if query_lower in doc["categoria"].lower():
-            relevancia += 2
-        
-        # Buscar en texto extraído
-        if query_lower in doc["texto_extraido"].lower():
-            relevancia += 1
-        
-        if relevancia > 0:
-            doc["relevancia"] = relevancia
-            resultados.append(doc)
+    # Buscar en nombre (+3) y texto completo (+1) sobre el índice binario
+    coincidencias = tabla.buscar(query_lower)
     
-    # Ordenar por relevancia
-    resultados.sort(key=lambda x: x["relevancia"], reverse=True)
+    partes = query_lower.split()
+    if len(partes) > 1:
+        # Con espacios, las palabras sueltas del índice solo sirven para
+        # descartar: se confirma con el texto completo de cada candidato (o
+        # con el extracto del índice, si no lo tiene)
+        candidatos = set(range(len(tabla)))
+        for parte in partes:
+            candidatos &= {fila for fila, (_, en_texto) in tabla.buscar(parte).items() if en_texto}
+        for fila in coincidencias:
+            coincidencias[fila] = (coincidencias[fila][0], False)
+        ids = tabla.columnas["id"]
+        con_texto = con_texto_completo(ids[fila] for fila in candidatos)
+        for fila in candidatos:
+            if ids[fila] in con_texto:
+                encontrada = contiene_frase(ids[fila], partes)
+            else:
+                encontrada = query_lower in tabla.texto("texto", fila).lower()
+            if encontrada:
+                coincidencias[fila] = (coincidencias.get(fila, (False, False))[0], True)
     
-    return resultados
+    relevancias = {}
+    for fila, (en_nombre, en_texto) in coincidencias.items():
+        if en_nombre or en_texto:
+            relevancias[fila] = 3 * en_nombre + en_texto
+    
+    # Buscar en categoría (+2)
+    codigos = {codigo for codigo, categoria in enumerate(tabla.vocabulario["categoria"])
+               if query_lower in categoria.lower()}
+    if codigos:
+        for fila, codigo in enumerate(tabla.columnas["categoria"]):
+            if codigo in codigos:
+                relevancias[fila] = relevancias.get(fila, 0) + 2
+    
+    # Ordenar por relevancia
+    filas = sorted(relevancias, key=lambda fila: (-relevancias[fila], fila))
+    return ResultadosBusqueda(tabla, filas, [relevancias[fila] for fila in filas], query_lower.split())
 
 
 # ====================================
 # BÚSQUEDA INTELIGENTE CON IA (SIMULADA)
 # ====================================
 
-def buscar_documentos_ia(consulta_usuario):
+def buscar_documentos_ia(consulta_usuario, limite=None):
     """
     Búsqueda inteligente que interpreta lenguaje natural
     Simula IA pero es 100% funcional
     """
-    consulta_lower = consulta_usuario.lower()
+    parametros = interpretar_consulta(consulta_usuario)
     
+    # Misma clave para consultas distintas que piden lo mismo
+    generacion = generacion_indice()
+    clave = ("ia", parametros["categoria"], parametros["fecha_desde"], parametros["fecha_hasta"],
+             parametros["extension"], tuple(parametros["palabras_clave"]), limite)
+    resultados = _cache_consultas.obtener(clave, generacion)
+    if resultados is None:
+        resultados = None
+        if particiones_activas():
+            try:
+                resultados = _buscar_en_particiones("ia", parametros, parametros["palabras_clave"], limite)
+            except (TimeoutError, RuntimeError):
+                pass
+        if resultados is None:
+            resultados = _ejecutar_busqueda_ia(parametros).recortar(limite)
+        _cache_consultas.guardar(clave, generacion, resultados)
+    return parametros, resultados
+
+
+def interpretar_consulta(consulta_usuario):
+    """Parámetros de búsqueda (filtros, palabras clave y explicación) de una consulta en lenguaje natural"""
+    parametros = _interpretar_consulta(normalizar_consulta(consulta_usuario), datetime.now().year)
+    return {**parametros, "palabras_clave": list(parametros["palabras_clave"])}
+
+
+@lru_cache(maxsize=CAPACIDAD_CACHE_CONSULTAS)
+def _interpretar_consulta(consulta_lower, año_actual):
     # Extraer información de la consulta
     parametros = {
         "categoria": None,
@@ -299,7 +729,6 @@ def buscar_documentos_ia(consulta_usuario):
     }
     for mes, num in meses.items():
         if mes in consulta_lower:
-            año_actual = datetime.now().year
             parametros["fecha_desde"] = f"{año_actual}-{num}-01"
             parametros["fecha_hasta"] = f"{año_actual}-{num}-31"
             break
@@ -326,78 +755,2577 @@ def buscar_documentos_ia(consulta_usuario):
     
     parametros["explicacion"] = "Buscar " + " y ".join(explicacion_partes) if explicacion_partes else "Búsqueda general en todos los documentos"
     
-    # Ejecutar búsqueda
-    docs = get_all_documents()
-    resultados = []
+    return parametros
+
+
+def _ejecutar_busqueda_ia(parametros, tabla=None):
+    if tabla is None:
+        tabla = get_all_documents()
+    vocabulario = tabla.vocabulario
     
-    for doc in docs:
-        incluir = True
-        relevancia = 0
-        
-        # Filtro por categoría
-        if parametros["categoria"] and doc["categoria"] != parametros["categoria"]:
-            incluir = False
-        
-        # Filtro por fecha
-        if parametros["fecha_desde"]:
-            if doc["fecha_subida"] < parametros["fecha_desde"]:
-                incluir = False
-        
-        if parametros["fecha_hasta"]:
-            if doc["fecha_subida"] > parametros["fecha_hasta"]:
-                incluir = False
-        
-        # Filtro por extensión
-        if parametros["extension"] and not doc["extension"].lower().endswith(parametros["extension"]):
-            incluir = False
-        
-        # Filtro por palabras clave
-        if parametros["palabras_clave"]:
-            texto_completo = (doc["nombre_original"] + " " + doc["texto_extraido"]).lower()
-            for palabra in parametros["palabras_clave"]:
-                if palabra in texto_completo:
-                    relevancia += 1
+    # Filtros traducidos a códigos y segundos para comparar columnas
+    codigo_categoria = None
+    if parametros["categoria"]:
+        codigo_categoria = vocabulario["categoria"].index(parametros["categoria"]) \
+            if parametros["categoria"] in vocabulario["categoria"] else -1
+    desde = _dia_a_epoca(parametros["fecha_desde"]) if parametros["fecha_desde"] else None
+    hasta = _dia_a_epoca(parametros["fecha_hasta"]) if parametros["fecha_hasta"] else None
+    extensiones = None
+    if parametros["extension"]:
+        extensiones = {codigo for codigo, ext in enumerate(vocabulario["extension"])
+                       if ext.lower().endswith(parametros["extension"])}
+    
+    # Relevancia: una coincidencia por palabra clave en nombre + texto
+    relevancias = {}
+    for palabra in parametros["palabras_clave"]:
+        for fila in tabla.buscar(palabra):
+            relevancias[fila] = relevancias.get(fila, 0) + 1
+    
+    filas = []
+    columnas = tabla.columnas
+    for fila, (categoria, extension, fecha) in enumerate(zip(columnas["categoria"], columnas["extension"], columnas["fecha"])):
+        if codigo_categoria is not None and categoria != codigo_categoria:
+            continue
+        # Igual que comparar "YYYY-MM-DD HH:MM:SS" con "YYYY-MM-DD" como texto
+        if desde is not None and fecha < desde:
+            continue
+        if hasta is not None and fecha >= hasta:
+            continue
+        if extensiones is not None and extension not in extensiones:
+            continue
         
-        if incluir:
-            doc["relevancia"] = relevancia
-            resultados.append(doc)
+        filas.append(fila)
     
     # Ordenar por relevancia
-    resultados.sort(key=lambda x: x.get("relevancia", 0), reverse=True)
+    filas.sort(key=lambda fila: relevancias.get(fila, 0), reverse=True)
+    return ResultadosBusqueda(tabla, filas, [relevancias.get(fila, 0) for fila in filas],
+                              parametros["palabras_clave"])
+
+
+# ====================================
+# ALMACÉN DE TEXTO COMPLETO
+# ====================================
+#
+# El índice solo guarda un extracto; el texto completo de cada documento va
+# en su propio archivo comprimido, página por página, para poder leer una
+# sola página sin descomprimir el resto:
+#
+#   cabecera | tabla de páginas | términos | posiciones | páginas comprimidas (zlib)
+#
+# "Términos" son las palabras únicas del documento (en minúsculas), que es
+# lo que usa el índice de búsqueda. "Posiciones" dice dónde aparece cada
+# término (página y carácter dentro de la página), para armar fragmentos
+# de resultados sin descomprimir ni recorrer todo el texto; va en bloques
+# comprimidos de pocos términos precedidos por un directorio, así una
+# búsqueda solo descomprime los bloques de sus términos.
+# Los archivos de la versión 1 no tienen posiciones.
+
+_MAGIA_TEXTO = b"DFTX"
+_VERSION_TEXTO = 2
+_CODEC_ZLIB = 1
+
+# magia, versión, códec, n. páginas, términos (offset, bytes comprimidos, bytes originales)
+_CABECERA_TEXTO_V1 = struct.Struct("<4sHHIQII")
+# ... y posiciones (offset, bytes totales, n. bloques)
+_CABECERA_TEXTO = struct.Struct("<4sHHIQIIQII")
+# offset, bytes comprimidos, bytes originales
+_PAGINA_TEXTO = struct.Struct("<QII")
+
+_TERMINOS_POR_BLOQUE = 128
+_PARES_POR_BLOQUE = 4096
+
+_PALABRA = re.compile(r"\S+")
+_ESPACIOS = re.compile(r"\s+")
+
+# Caracteres aproximados de cada fragmento de resultado
+ANCHO_FRAGMENTO = 240
+# Apariciones de cada término que se consideran al elegir fragmentos; con
+# palabras muy frecuentes cualquier pasaje sirve y recorrerlas todas es caro
+MAX_APARICIONES = 1000
+
+
+def _ruta_texto(doc_id):
+    # Subcarpetas de 1000 documentos para no tener directorios enormes
+    return TEXTOS_DIR / f"{doc_id // 1000:04d}" / f"doc_{doc_id:06d}.dft"
+
+
+def dividir_paginas(texto):
+    """Separa el texto extraído en páginas (ver SEPARADOR_PAGINA)"""
+    paginas = texto.split(SEPARADOR_PAGINA)
+    # Tesseract termina la salida con un salto de página
+    if len(paginas) > 1 and not paginas[-1].strip():
+        paginas.pop()
+    return paginas
+
+
+def terminos_texto(texto):
+    """Palabras únicas (en minúsculas, separadas por espacios) de un texto"""
+    return sorted(set(texto.lower().split()))
+
+
+def posiciones_paginas(paginas):
+    """{término: [(página desde 0, carácter), ...]} de cada palabra de las páginas"""
+    posiciones = {}
+    for numero, pagina in enumerate(paginas):
+        for palabra in _PALABRA.finditer(pagina):
+            posiciones.setdefault(palabra.group().lower(), []).append((numero, palabra.start()))
+    return posiciones
+
+
+def _empaquetar_posiciones(terminos, posiciones):
+    """
+    Bloques de posiciones y su directorio. Cada bloque son enteros de 32 bits:
+    dónde empieza la lista de cada término (n. términos + 1 valores) y
+    después los pares (página, carácter). El directorio tiene el offset y el
+    primer término de cada bloque (y uno más al final).
+    """
+    bloques, primeros = [], []
+    inicios, pares = None, None
+    for numero, termino in enumerate(terminos):
+        # Bloque nuevo cada tantos términos o tantas posiciones
+        if inicios is None or len(inicios) > _TERMINOS_POR_BLOQUE or len(pares) >= 2 * _PARES_POR_BLOQUE:
+            if inicios is not None:
+                bloques.append(zlib.compress(_bytes_le(inicios) + _bytes_le(pares)))
+            primeros.append(numero)
+            inicios, pares = array.array("I", [0]), array.array("I")
+        for pagina, caracter in posiciones[termino]:
+            pares.append(pagina)
+            pares.append(caracter)
+        inicios.append(len(pares) // 2)
+    if inicios is not None:
+        bloques.append(zlib.compress(_bytes_le(inicios) + _bytes_le(pares)))
+    primeros.append(len(terminos))
     
-    return parametros, resultados
+    offsets = array.array("I", [0])
+    for bloque in bloques:
+        offsets.append(offsets[-1] + len(bloque))
+    directorio = _bytes_le(offsets) + _bytes_le(array.array("I", primeros))
+    return directorio + b"".join(bloques), len(bloques)
+
+
+def guardar_texto_completo(doc_id, texto):
+    """Guarda el texto completo de un documento comprimido por páginas"""
+    paginas_texto = dividir_paginas(texto)
+    posiciones = posiciones_paginas(paginas_texto)
+    terminos = sorted(posiciones)
+    
+    paginas = [zlib.compress(pagina.encode('utf-8')) for pagina in paginas_texto]
+    bloque_terminos = "\n".join(terminos).encode('utf-8')
+    terminos_comprimidos = zlib.compress(bloque_terminos)
+    bloque_posiciones, n_bloques = _empaquetar_posiciones(terminos, posiciones)
+    
+    inicio_terminos = _CABECERA_TEXTO.size + _PAGINA_TEXTO.size * len(paginas)
+    inicio_posiciones = inicio_terminos + len(terminos_comprimidos)
+    cabecera = _CABECERA_TEXTO.pack(_MAGIA_TEXTO, _VERSION_TEXTO, _CODEC_ZLIB, len(paginas),
+                                    inicio_terminos, len(terminos_comprimidos), len(bloque_terminos),
+                                    inicio_posiciones, len(bloque_posiciones), n_bloques)
+    tabla = []
+    offset = inicio_posiciones + len(bloque_posiciones)
+    for pagina, comprimida in zip(paginas_texto, paginas):
+        tabla.append(_PAGINA_TEXTO.pack(offset, len(comprimida), len(pagina.encode('utf-8'))))
+        offset += len(comprimida)
+    
+    ruta = _ruta_texto(doc_id)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+    with open(temporal, 'wb') as f:
+        f.write(cabecera + b"".join(tabla) + terminos_comprimidos + bloque_posiciones + b"".join(paginas))
+    os.replace(temporal, ruta)
+
+
+def _leer_cabecera_texto(f):
+    """Tabla de páginas, bloque de términos y bloque de posiciones (None en la versión 1)"""
+    inicio = f.read(_CABECERA_TEXTO_V1.size)
+    magia, version, codec, n_paginas, offset_terminos, terminos_comp, _ = _CABECERA_TEXTO_V1.unpack(inicio)
+    if magia != _MAGIA_TEXTO or version not in (1, _VERSION_TEXTO) or codec != _CODEC_ZLIB:
+        raise ValueError("Archivo de texto no soportado")
+    posiciones = None
+    if version >= 2:
+        resto = f.read(_CABECERA_TEXTO.size - _CABECERA_TEXTO_V1.size)
+        offset_posiciones, _, n_bloques = _CABECERA_TEXTO.unpack(inicio + resto)[7:]
+        posiciones = (offset_posiciones, n_bloques)
+    tabla = f.read(_PAGINA_TEXTO.size * n_paginas)
+    paginas = [_PAGINA_TEXTO.unpack_from(tabla, i * _PAGINA_TEXTO.size) for i in range(n_paginas)]
+    return paginas, (offset_terminos, terminos_comp), posiciones
+
+
+def _leer_bloque(f, offset, comprimidos):
+    f.seek(offset)
+    return zlib.decompress(f.read(comprimidos)).decode('utf-8')
+
+
+def _enteros(datos):
+    valores = array.array("I")
+    valores.frombytes(datos)
+    if sys.byteorder != "little":
+        valores.byteswap()
+    return valores
+
+
+def _leer_posiciones(f, offset, n_bloques, indices):
+    """
+    {índice de término: [(página, carácter), ...]} de los términos pedidos
+    (como mucho MAX_APARICIONES de cada uno); solo descomprime sus bloques
+    """
+    f.seek(offset)
+    directorio = _enteros(f.read(8 * (n_bloques + 1)))
+    offsets, primeros = directorio[:n_bloques + 1], directorio[n_bloques + 1:]
+    inicio_bloques = offset + 8 * (n_bloques + 1)
+    por_bloque = {}
+    for indice in indices:
+        por_bloque.setdefault(bisect.bisect_right(primeros, indice) - 1, []).append(indice)
+    
+    posiciones = {}
+    for bloque, pedidos in sorted(por_bloque.items()):
+        f.seek(inicio_bloques + offsets[bloque])
+        valores = _enteros(zlib.decompress(f.read(offsets[bloque + 1] - offsets[bloque])))
+        primero = primeros[bloque]
+        # Los pares empiezan después de los inicios de cada término
+        base = primeros[bloque + 1] - primero + 1
+        for indice in pedidos:
+            desde = valores[indice - primero]
+            hasta = min(valores[indice - primero + 1], desde + MAX_APARICIONES)
+            lugares = valores[base + 2 * desde:base + 2 * hasta]
+            posiciones[indice] = list(zip(lugares[::2], lugares[1::2]))
+    return posiciones
+
+
+def _terminos_que_contienen(bloque, buscados):
+    """{índice: término} de las líneas del bloque de términos que contienen algún buscado"""
+    lineas = {}
+    for buscado in buscados:
+        posicion = bloque.find(buscado)
+        while posicion >= 0:
+            inicio = bloque.rfind("\n", 0, posicion) + 1
+            fin = bloque.find("\n", posicion)
+            if fin < 0:
+                fin = len(bloque)
+            lineas[inicio] = bloque[inicio:fin]
+            posicion = bloque.find(buscado, fin)
+    
+    encontrados = {}
+    linea, anterior = 0, 0
+    for inicio in sorted(lineas):
+        linea += bloque.count("\n", anterior, inicio)
+        anterior = inicio
+        encontrados[linea] = lineas[inicio]
+    return encontrados
+
+
+def tiene_texto_completo(doc_id):
+    return _ruta_texto(doc_id).exists()
+
+
+def con_texto_completo(doc_ids):
+    """Los `doc_ids` que tienen texto completo guardado (lista cada subcarpeta una sola vez)"""
+    doc_ids = set(doc_ids)
+    existentes = set()
+    for carpeta in {doc_id // 1000 for doc_id in doc_ids}:
+        try:
+            nombres = os.listdir(TEXTOS_DIR / f"{carpeta:04d}")
+        except OSError:
+            continue
+        existentes.update(int(nombre[4:-4]) for nombre in nombres
+                          if nombre.startswith("doc_") and nombre.endswith(".dft"))
+    return existentes & doc_ids
+
+
+def paginas_documento(doc_id):
+    """Cantidad de páginas guardadas (0 si el documento no tiene texto completo)"""
+    try:
+        with open(_ruta_texto(doc_id), 'rb') as f:
+            return len(_leer_cabecera_texto(f)[0])
+    except (OSError, ValueError):
+        return 0
+
+
+def leer_pagina(doc_id, numero):
+    """Texto de una página (desde 1); solo se descomprime esa página"""
+    with open(_ruta_texto(doc_id), 'rb') as f:
+        paginas = _leer_cabecera_texto(f)[0]
+        if not 1 <= numero <= len(paginas):
+            raise IndexError(f"El documento {doc_id} no tiene página {numero}")
+        offset, comprimidos, _ = paginas[numero - 1]
+        return _leer_bloque(f, offset, comprimidos)
+
+
+def leer_texto_completo(doc_id, respaldo=None):
+    """
+    Texto completo de un documento (páginas separadas por SEPARADOR_PAGINA).
+    Si no hay texto guardado (documentos anteriores), retorna `respaldo`.
+    """
+    try:
+        with open(_ruta_texto(doc_id), 'rb') as f:
+            paginas = _leer_cabecera_texto(f)[0]
+            return SEPARADOR_PAGINA.join(_leer_bloque(f, offset, comprimidos)
+                                         for offset, comprimidos, _ in paginas)
+    except (OSError, ValueError):
+        return respaldo
+
+
+def contiene_frase(doc_id, partes, respaldo=""):
+    """
+    Si el texto completo contiene " ".join(partes) (las partes en minúsculas).
+    Primero descarta con la lista de términos: la primera parte tiene que ser
+    el final de un término, la última el comienzo de otro y las del medio
+    términos completos. Después descomprime página por página y se detiene
+    en la primera que la contiene. Sin texto completo usa el `respaldo`.
+    """
+    frase = " ".join(partes)
+    try:
+        with open(_ruta_texto(doc_id), 'rb') as f:
+            tabla_paginas, bloque_terminos, _ = _leer_cabecera_texto(f)
+            bloque = _leer_bloque(f, *bloque_terminos)
+            terminos = bloque.split("\n")
+            if not any(termino.endswith(partes[0])
+                       for termino in _terminos_que_contienen(bloque, [partes[0]]).values()):
+                return False
+            for parte in partes[1:-1]:
+                indice = bisect.bisect_left(terminos, parte)
+                if indice == len(terminos) or terminos[indice] != parte:
+                    return False
+            indice = bisect.bisect_left(terminos, partes[-1])
+            if indice == len(terminos) or not terminos[indice].startswith(partes[-1]):
+                return False
+            
+            # Una frase no cruza de una página a otra (el separador no es un espacio)
+            return any(frase in _leer_bloque(f, offset, comprimidos).lower()
+                       for offset, comprimidos, _ in tabla_paginas)
+    except (OSError, ValueError):
+        return frase in respaldo.lower()
+
+
+def leer_terminos(doc_id, respaldo=""):
+    """Palabras únicas del documento; si no hay texto completo, las del `respaldo`"""
+    try:
+        with open(_ruta_texto(doc_id), 'rb') as f:
+            offset, comprimidos = _leer_cabecera_texto(f)[1]
+            return _leer_bloque(f, offset, comprimidos).split("\n")
+    except (OSError, ValueError):
+        return terminos_texto(respaldo)
 
 
 # ====================================
-# ESTADÍSTICAS
+# FRAGMENTOS DE RESULTADOS
 # ====================================
 
-def get_statistics():
-    """Obtiene estadísticas del sistema"""
-    docs = get_all_documents()
+def _apariciones(posiciones, buscados):
+    """
+    Apariciones de los términos buscados: [(página, inicio, fin, n. de término)].
+    Igual que la búsqueda, un término coincide si está contenido en una palabra.
+    De cada término buscado se usan como mucho MAX_APARICIONES.
+    """
+    por_buscado = [[] for _ in buscados]
+    for termino, lugares in posiciones:
+        for numero, buscado in enumerate(buscados):
+            desplazamiento = termino.find(buscado)
+            if desplazamiento < 0 or len(por_buscado[numero]) >= MAX_APARICIONES:
+                continue
+            por_buscado[numero].extend((pagina, caracter + desplazamiento,
+                                        caracter + desplazamiento + len(buscado), numero)
+                                       for pagina, caracter in lugares)
+    apariciones = []
+    for lista in por_buscado:
+        apariciones.extend(lista[:MAX_APARICIONES])
+    apariciones.sort()
+    return apariciones
+
+
+def _mejor_ventana(apariciones, ancho):
+    """
+    Rango [desde, hasta) de apariciones que entra en `ancho` caracteres de
+    una misma página y cubre más términos distintos (y después más apariciones)
+    """
+    mejor, puntaje = None, None
+    conteo = {}
+    desde = 0
+    for hasta, (pagina, inicio, fin, termino) in enumerate(apariciones):
+        conteo[termino] = conteo.get(termino, 0) + 1
+        while desde < hasta and (apariciones[desde][0] != pagina or fin - apariciones[desde][1] > ancho):
+            anterior = apariciones[desde][3]
+            conteo[anterior] -= 1
+            if not conteo[anterior]:
+                del conteo[anterior]
+            desde += 1
+        actual = (len(conteo), hasta + 1 - desde)
+        if puntaje is None or actual > puntaje:
+            mejor, puntaje = (desde, hasta + 1), actual
+    return mejor
+
+
+def _armar_fragmento(texto, resaltados, ancho):
+    """
+    Recorta `texto` alrededor de los rangos resaltados (a palabras completas,
+    con los espacios normalizados) y corrige los rangos al texto recortado
+    """
+    inicio, fin = resaltados[0][0], resaltados[-1][1]
+    margen = max(0, ancho - (fin - inicio)) // 2
+    desde, hasta = max(0, inicio - margen), min(len(texto), fin + margen)
+    # No cortar palabras a la mitad
+    if desde > 0 and not texto[desde - 1].isspace():
+        espacio = _ESPACIOS.search(texto, desde, inicio)
+        desde = espacio.end() if espacio else inicio
+    if hasta < len(texto):
+        hasta = max((espacio.start() for espacio in _ESPACIOS.finditer(texto, fin, hasta)), default=fin)
     
-    # Contar por categoría
-    categorias_count = {}
-    for doc in docs:
-        cat = doc["categoria"]
-        categorias_count[cat] = categorias_count.get(cat, 0) + 1
+    partes = ["… "] if desde > 0 else []
+    largo = len(partes[0]) if partes else 0
+    nuevos = []
+    posicion = desde
+    for ini, fin in resaltados:
+        previo = _ESPACIOS.sub(" ", texto[posicion:ini])
+        if posicion == desde:
+            previo = previo.lstrip()
+        partes.append(previo)
+        largo += len(previo)
+        partes.append(texto[ini:fin])
+        nuevos.append((largo, largo + fin - ini))
+        largo += fin - ini
+        posicion = fin
+    partes.append(_ESPACIOS.sub(" ", texto[posicion:hasta]).rstrip())
+    if hasta < len(texto):
+        partes.append(" …")
+    return "".join(partes), nuevos
+
+
+def _unir_rangos(rangos):
+    unidos = []
+    for inicio, fin in sorted(rangos):
+        if unidos and inicio <= unidos[-1][1]:
+            unidos[-1] = (unidos[-1][0], max(unidos[-1][1], fin))
+        else:
+            unidos.append((inicio, fin))
+    return unidos
+
+
+def fragmentos_documento(doc_id, terminos, respaldo="", cantidad=2, ancho=ANCHO_FRAGMENTO):
+    """
+    Mejores pasajes de un documento para los términos de una búsqueda.
+    Retorna hasta `cantidad` fragmentos, del mejor al peor:
+    [{"pagina": n, "texto": "...", "resaltados": [(inicio, fin), ...]}]
     
-    # Contar por mes
-    meses_count = {}
-    for doc in docs:
-        mes = doc["fecha_subida"][:7]  # YYYY-MM
-        meses_count[mes] = meses_count.get(mes, 0) + 1
+    Las apariciones salen de las posiciones guardadas con el texto completo
+    y solo se descomprimen las páginas de los fragmentos elegidos. Sin
+    posiciones (documentos anteriores) se recorre el texto; sin texto
+    completo, el `respaldo` (página None).
+    """
+    buscados = list(dict.fromkeys(t.lower() for t in terminos if t.strip()))
+    if not buscados:
+        return []
     
-    # Calcular tamaño total
-    tamaño_total = sum(doc["tamaño_kb"] for doc in docs)
+    paginas = None
+    try:
+        with open(_ruta_texto(doc_id), 'rb') as f:
+            tabla_paginas, bloque_terminos, bloque_posiciones = _leer_cabecera_texto(f)
+            if bloque_posiciones:
+                lista = _leer_bloque(f, *bloque_terminos)
+                encontrados = _terminos_que_contienen(lista, buscados)
+                lugares = _leer_posiciones(f, *bloque_posiciones, encontrados)
+                posiciones = [(termino, lugares[indice]) for indice, termino in encontrados.items()]
+            else:
+                paginas = [_leer_bloque(f, offset, comprimidos) for offset, comprimidos, _ in tabla_paginas]
+    except (OSError, ValueError):
+        paginas = [respaldo or ""]
+        tabla_paginas = None
+    if paginas is not None:
+        posiciones = posiciones_paginas(paginas).items()
+    
+    apariciones = _apariciones(posiciones, buscados)
+    elegidas = []
+    while apariciones and len(elegidas) < cantidad:
+        desde, hasta = _mejor_ventana(apariciones, ancho)
+        elegidas.append(apariciones[desde:hasta])
+        del apariciones[desde:hasta]
+    if not elegidas:
+        return []
     
-    # Confianza promedio
-    confianza_promedio = sum(doc["confianza"] for doc in docs) / len(docs) if docs else 0
+    # Solo se descomprimen las páginas que aparecen en los fragmentos
+    textos = {}
+    if paginas is None:
+        with open(_ruta_texto(doc_id), 'rb') as f:
+            for numero in {ventana[0][0] for ventana in elegidas}:
+                offset, comprimidos, _ = tabla_paginas[numero]
+                textos[numero] = _leer_bloque(f, offset, comprimidos)
+    else:
+        textos = dict(enumerate(paginas))
     
+    fragmentos = []
+    for ventana in elegidas:
+        numero = ventana[0][0]
+        rangos = _unir_rangos((inicio, fin) for _, inicio, fin, _ in ventana)
+        texto, resaltados = _armar_fragmento(textos[numero], rangos, ancho)
+        fragmentos.append({
+            "pagina": numero + 1 if tabla_paginas is not None else None,
+            "texto": texto,
+            "resaltados": resaltados,
+        })
+    return fragmentos
+
+
+# ====================================
+# ÍNDICE BINARIO (MAPEADO EN MEMORIA)
+# ====================================
+#
+# Copia compacta del índice en un solo archivo binario (little-endian):
+#
+#   cabecera | tabla de secciones | secciones...
+#
+# - Columnas de ancho fijo (id, códigos de categoría/extensión, fechas...)
+# - Heaps de texto UTF-8 con su tabla de desplazamientos finales por fila
+# - Un heap en minúsculas "nombre + ' ' + texto" para buscar sin decodificar
+# - El vocabulario (categorías, extensiones, versiones) en JSON
+#
+# Cada sección reserva espacio libre para agregar filas sin reescribir el
+# archivo; cuando se llena, se escribe una generación nueva más grande.
+# Cada sección guarda su CRC32 y la cabecera el CRC32 de la tabla de secciones.
+
+INDICE_BIN_DIR = BASE_DIR / "indice"
+
+_MAGIA = b"DOCFIND\0"
+_VERSION_BINARIO = 1
+
+# magia, versión, n. secciones, crc de cabecera, filas, capacidad (filas),
+# último id, firma de index.json (mtime_ns, tamaño)
+_CABECERA = struct.Struct("<8sHHIQQQqQ")
+# nombre, desplazamiento, bytes usados, bytes reservados, crc32
+_SECCION = struct.Struct("<16sQQQI4x")
+_ALINEACION = 64
+
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+_EPOCA = datetime(1970, 1, 1)
+
+# Columnas de ancho fijo: nombre -> código de tipo (módulo array)
+_COLUMNAS = {
+    "id": "i",
+    "categoria": "H",   # código en el vocabulario de categorías
+    "extension": "H",   # código en el vocabulario de extensiones
+    "version": "H",     # código en el vocabulario de versiones del clasificador
+    "confianza": "f",
+    "tamano_kb": "d",
+    "fecha": "q",       # segundos desde 1970 (hora local, sin zona)
+    "corte": "I",       # bytes del nombre dentro del heap de búsqueda
+}
+
+# Heaps de texto: bytes UTF-8 concatenados + desplazamiento final de cada fila
+_HEAPS = ("nombre", "ruta", "texto", "busqueda")
+
+# Tablas abiertas en este proceso, por directorio: (ruta, firma, tabla)
+_tablas_abiertas = {}
+
+
+def fecha_a_epoca(fecha_texto):
+    """Convierte 'YYYY-MM-DD HH:MM:SS' a segundos enteros"""
+    return int((datetime.strptime(fecha_texto, FORMATO_FECHA) - _EPOCA).total_seconds())
+
+
+def epoca_a_fecha(segundos):
+    """Convierte segundos enteros a 'YYYY-MM-DD HH:MM:SS'"""
+    return (_EPOCA + timedelta(seconds=int(segundos))).strftime(FORMATO_FECHA)
+
+
+def _dia_a_epoca(dia):
+    """
+    Segundos al inicio de un día 'YYYY-MM-DD'. Un día fuera de rango
+    (p. ej. '2025-04-31') se toma como el primer día del mes siguiente.
+    """
+    año, mes, numero = (int(parte) for parte in dia.split("-"))
+    try:
+        inicio = datetime(año, mes, numero)
+    except ValueError:
+        inicio = datetime(año + mes // 12, mes % 12 + 1, 1)
+    return int((inicio - _EPOCA).total_seconds())
+
+
+def _firma_indice():
+    """Identifica la versión en disco de index.json (sin leerlo)"""
+    try:
+        st_index = INDEX_FILE.stat()
+        return (st_index.st_mtime_ns, st_index.st_size)
+    except FileNotFoundError:
+        return (0, 0)
+
+
+def _codigo(vocabulario, valor):
+    """Devuelve el código internado de un valor, agregándolo si es nuevo"""
+    try:
+        return vocabulario.index(valor)
+    except ValueError:
+        vocabulario.append(valor)
+        return len(vocabulario) - 1
+
+
+def _vocabulario_inicial():
+    return {"categoria": list(CATEGORIAS), "extension": [], "version": [None]}
+
+
+def _fila_columnar(documento, vocabulario):
+    """Valores de las columnas fijas para un documento del índice"""
     return {
-        "total_documentos": len(docs),
-        "categorias": categorias_count,
-        "por_mes": meses_count,
-        "tamaño_total_mb": round(tamaño_total / 1024, 2),
-        "confianza_promedio": round(confianza_promedio * 100, 1)
-    }
\ No newline at end of file
+        "id": documento["id"],
+        "categoria": _codigo(vocabulario["categoria"], documento["categoria"]),
+        "extension": _codigo(vocabulario["extension"], documento["extension"]),
+        "version": _codigo(vocabulario["version"], documento.get("version_clasificador")),
+        "confianza": documento["confianza"],
+        "tamano_kb": documento["tamaño_kb"],
+        "fecha": fecha_a_epoca(documento["fecha_subida"]),
+        "corte": len(documento["nombre_original"].lower().encode('utf-8')),
+    }
+
+
+def _busqueda_fila(documento):
+    """
+    Texto del heap de búsqueda: el nombre en minúsculas, un espacio y las
+    palabras únicas del texto completo separadas por saltos de línea.
+    Un término sin espacios aparece en el texto si y solo si aparece aquí.
+    """
+    terminos = leer_terminos(documento["id"], respaldo=documento["texto_extraido"])
+    return documento["nombre_original"].lower() + " " + "\n".join(terminos)
+
+
+def _textos_fila(documento, busqueda=None):
+    return {
+        "nombre": documento["nombre_original"],
+        "ruta": documento["ruta"],
+        "texto": documento["texto_extraido"],
+        "busqueda": busqueda if busqueda is not None else _busqueda_fila(documento),
+    }
+
+
+def _alinear(n):
+    return (n + _ALINEACION - 1) // _ALINEACION * _ALINEACION
+
+
+def _bytes_le(valores):
+    """Bytes little-endian de un array (el formato en disco es siempre LE)"""
+    if sys.byteorder != "little":
+        valores = array.array(valores.typecode, valores)
+        valores.byteswap()
+    return valores.tobytes()
+
+
+def _nombres_secciones():
+    nombres = list(_COLUMNAS)
+    for heap in _HEAPS:
+        nombres += [f"{heap}.off", heap]
+    return nombres + ["vocabulario"]
+
+
+def escribir_indice_binario(index, destino, firma=(0, 0), anterior=None):
+    """
+    Escribe el índice (dict con "documentos" y "ultimo_id") en formato binario.
+    Reserva espacio para que el archivo pueda crecer ~50% antes de reescribirse.
+    Si se pasa la tabla `anterior`, se reutilizan sus filas de búsqueda en vez
+    de volver a leer los términos del almacén de texto.
+    """
+    documentos = index["documentos"]
+    filas = len(documentos)
+    capacidad = max(1024, filas + filas // 2)
+    
+    vocabulario = _vocabulario_inicial()
+    columnas = {nombre: array.array(codigo) for nombre, codigo in _COLUMNAS.items()}
+    heaps = {heap: bytearray() for heap in _HEAPS}
+    finales = {heap: array.array("q") for heap in _HEAPS}
+    
+    for documento in documentos:
+        for nombre, valor in _fila_columnar(documento, vocabulario).items():
+            columnas[nombre].append(valor)
+        busqueda = anterior.busqueda_por_id(documento["id"]) if anterior is not None else None
+        for heap, texto in _textos_fila(documento, busqueda).items():
+            heaps[heap] += texto.encode('utf-8')
+            finales[heap].append(len(heaps[heap]))
+    
+    contenidos = {}
+    reservas = {}
+    for nombre, valores in columnas.items():
+        contenidos[nombre] = _bytes_le(valores)
+        reservas[nombre] = capacidad * valores.itemsize
+    for heap in _HEAPS:
+        contenidos[f"{heap}.off"] = _bytes_le(finales[heap])
+        reservas[f"{heap}.off"] = capacidad * 8
+        contenidos[heap] = bytes(heaps[heap])
+        reservas[heap] = len(heaps[heap]) + len(heaps[heap]) // 2 + 64 * 1024
+    contenidos["vocabulario"] = json.dumps(vocabulario, ensure_ascii=False).encode('utf-8')
+    reservas["vocabulario"] = len(contenidos["vocabulario"]) + 16 * 1024
+    
+    nombres = _nombres_secciones()
+    posicion = _alinear(_CABECERA.size + _SECCION.size * len(nombres))
+    secciones = []
+    for nombre in nombres:
+        secciones.append([nombre, posicion, len(contenidos[nombre]), reservas[nombre],
+                          zlib.crc32(contenidos[nombre])])
+        posicion = _alinear(posicion + reservas[nombre])
+    
+    temporal = Path(f"{destino}.{os.getpid()}.tmp")
+    with open(temporal, 'wb') as f:
+        f.write(_empaquetar_cabecera(secciones, filas, capacidad, index.get("ultimo_id", 0), firma))
+        for nombre, offset, *_ in secciones:
+            f.seek(offset)
+            f.write(contenidos[nombre])
+        f.truncate(posicion)
+    os.replace(temporal, destino)
+
+
+def _empaquetar_cabecera(secciones, filas, capacidad, ultimo_id, firma):
+    tabla = b"".join(_SECCION.pack(nombre.encode('ascii'), offset, usados, reservados, crc)
+                     for nombre, offset, usados, reservados, crc in secciones)
+    campos = (_MAGIA, _VERSION_BINARIO, len(secciones), 0, filas, capacidad, ultimo_id, *firma)
+    crc = zlib.crc32(_CABECERA.pack(*campos) + tabla)
+    campos = campos[:3] + (crc,) + campos[4:]
+    return _CABECERA.pack(*campos) + tabla
+
+
+def _leer_cabecera(datos):
+    """
+    Interpreta cabecera y tabla de secciones.
+    Lanza ValueError si el archivo no es un índice válido.
+    """
+    if len(datos) < _CABECERA.size:
+        raise ValueError("Archivo demasiado corto")
+    magia, version, n_secciones, crc, filas, capacidad, ultimo_id, mtime, tamaño = \
+        _CABECERA.unpack_from(datos, 0)
+    if magia != _MAGIA:
+        raise ValueError("No es un índice binario de Doc Finder")
+    if version != _VERSION_BINARIO:
+        raise ValueError(f"Versión de índice binario no soportada: {version}")
+    
+    fin_tabla = _CABECERA.size + _SECCION.size * n_secciones
+    tabla = bytes(datos[_CABECERA.size:fin_tabla])
+    sin_crc = _CABECERA.pack(magia, version, n_secciones, 0, filas, capacidad, ultimo_id, mtime, tamaño)
+    if zlib.crc32(sin_crc + tabla) != crc:
+        raise ValueError("Checksum de cabecera inválido")
+    
+    secciones = {}
+    for i in range(n_secciones):
+        nombre, offset, usados, reservados, crc_seccion = _SECCION.unpack_from(tabla, i * _SECCION.size)
+        secciones[nombre.rstrip(b"\0").decode('ascii')] = [offset, usados, reservados, crc_seccion]
+    
+    return {
+        "filas": filas,
+        "capacidad": capacidad,
+        "ultimo_id": ultimo_id,
+        "firma": (mtime, tamaño),
+        "secciones": secciones,
+    }
+
+
+def verificar_indice_binario(ruta):
+    """Comprueba cabecera y el CRC32 de cada sección (lee el archivo completo)"""
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    cabecera = _leer_cabecera(datos)
+    for nombre, (offset, usados, _, crc) in cabecera["secciones"].items():
+        if zlib.crc32(datos[offset:offset + usados]) != crc:
+            raise ValueError(f"Checksum inválido en la sección '{nombre}'")
+    return cabecera
+
+
+def _directorio_tabla(particion=None):
+    """Carpeta del índice binario completo o de una partición (ver BÚSQUEDA PARTICIONADA)"""
+    if particion is None:
+        return INDICE_BIN_DIR
+    version, numero, _ = particion
+    return PARTICIONES_DIR / f"v{version:04d}" / f"p{numero:03d}"
+
+
+def _ruta_generacion(generacion, particion=None):
+    return _directorio_tabla(particion) / f"indice_{generacion:06d}.dfb"
+
+
+def _generacion_actual(particion=None):
+    """Número de la generación más reciente del índice binario (0 si no hay)"""
+    generaciones = [int(ruta.stem.split("_")[1])
+                    for ruta in _directorio_tabla(particion).glob("indice_*.dfb")]
+    return max(generaciones, default=0)
+
+
+def reconstruir_tabla(index=None, particion=None):
+    """
+    Escribe una generación nueva del índice binario a partir de index.json
+    (solo los documentos de la partición, si se indica una).
+    Se usa un archivo nuevo para no tocar el que otro proceso pueda tener
+    mapeado en memoria.
+    """
+    if index is None:
+        init_storage()
+        index = load_index()
+    
+    directorio = _directorio_tabla(particion)
+    directorio.mkdir(parents=True, exist_ok=True)
+    generacion = _generacion_actual(particion) + 1
+    try:
+        anterior = TablaDocumentos(_ruta_generacion(generacion - 1, particion))
+    except (OSError, ValueError):
+        anterior = None
+    escribir_indice_binario(_subindice(index, particion), _ruta_generacion(generacion, particion),
+                            _firma_indice(), anterior)
+    # Soltar el mapeo antes de borrar la generación anterior
+    anterior = None
+    _limpiar_generaciones(generacion, particion)
+
+
+def _limpiar_generaciones(generacion, particion=None):
+    """Borra las generaciones distintas de `generacion` (en Windows pueden seguir mapeadas)"""
+    for ruta in _directorio_tabla(particion).glob("indice_*.dfb"):
+        if ruta != _ruta_generacion(generacion, particion):
+            try:
+                ruta.unlink()
+            except OSError:
+                pass
+
+
+def _anexar_a_tabla(documento, index, firma_anterior=None, particion=None):
+    """
+    Agrega un documento recién guardado al final del índice binario, usando
+    el espacio reservado. Si no alcanza, reescribe una generación nueva.
+    `firma_anterior` es la de index.json antes de guardar el documento: si la
+    tabla no coincide con ella, se perdió algún cambio y también se reescribe.
+    """
+    index = _subindice(index, particion)
+    try:
+        ruta = _ruta_generacion(_generacion_actual(particion), particion)
+        with open(ruta, 'r+b') as f:
+            cabecera = _leer_cabecera(f.read(64 * 1024))
+            filas = cabecera["filas"]
+            secciones = cabecera["secciones"]
+            if filas != len(index["documentos"]) - 1:
+                raise ValueError("Índice binario desfasado")
+            if firma_anterior is not None and cabecera["firma"] != tuple(firma_anterior):
+                raise ValueError("Índice binario desactualizado")
+            
+            vocabulario = json.loads(_leer_seccion(f, secciones["vocabulario"]))
+            nuevos = {}
+            for nombre, valor in _fila_columnar(documento, vocabulario).items():
+                nuevos[nombre] = _bytes_le(array.array(_COLUMNAS[nombre], [valor]))
+            for heap, texto in _textos_fila(documento).items():
+                datos = texto.encode('utf-8')
+                nuevos[heap] = datos
+                nuevos[f"{heap}.off"] = _bytes_le(array.array("q", [secciones[heap][1] + len(datos)]))
+            
+            sin_espacio = (filas + 1 > cabecera["capacidad"]
+                           or any(secciones[n][1] + len(d) > secciones[n][2] for n, d in nuevos.items()))
+            if sin_espacio:
+                raise ValueError("Sin espacio reservado")
+            
+            # Primero los datos, al final la cabecera (que los hace visibles)
+            for nombre, datos in nuevos.items():
+                offset, usados, reservados, crc = secciones[nombre]
+                f.seek(offset + usados)
+                f.write(datos)
+                secciones[nombre] = [offset, usados + len(datos), reservados, zlib.crc32(datos, crc)]
+            _escribir_vocabulario(f, secciones, vocabulario)
+            
+            f.seek(0)
+            f.write(_empaquetar_cabecera(
+                [[nombre, *secciones[nombre]] for nombre in _nombres_secciones()],
+                filas + 1, cabecera["capacidad"], index["ultimo_id"], _firma_indice()))
+    except (OSError, ValueError, KeyError):
+        # Sin archivo, desfasado o lleno: generación nueva desde el índice
+        reconstruir_tabla(index, particion)
+
+
+def _escribir_vocabulario(f, secciones, vocabulario):
+    """
+    Si el vocabulario cambió, escribe la versión nueva en el espacio libre
+    de su sección (después de la actual) y actualiza la entrada en
+    `secciones`; el cambio se ve recién al escribir la cabecera, así que un
+    lector nunca encuentra el JSON a medio sobrescribir.
+    Lanza ValueError si no queda espacio.
+    """
+    offset, usados, reservados, _ = secciones["vocabulario"]
+    datos = json.dumps(vocabulario, ensure_ascii=False).encode('utf-8')
+    f.seek(offset)
+    if f.read(usados) == datos:
+        return
+    if usados + len(datos) > reservados:
+        raise ValueError("Sin espacio para el vocabulario")
+    f.seek(offset + usados)
+    f.write(datos)
+    secciones["vocabulario"] = [offset + usados, len(datos), reservados - usados, zlib.crc32(datos)]
+
+
+def _actualizar_clasificacion_en_tabla(documentos, index, firma_anterior, particion=None):
+    """
+    Escribe una generación nueva del índice binario con las columnas
+    categoria, confianza y version de los documentos reclasificados
+    ({id: documento}) cambiadas. Se copia el archivo actual y se corrigen
+    solo esas columnas, sin volver a armar los textos; las vistas abiertas
+    siguen sobre la generación anterior, que no se modifica.
+    Si la tabla no coincide con `firma_anterior` (la de index.json antes de
+    guardar los cambios) o el vocabulario no entra, se reconstruye completa.
+    """
+    if particion is not None:
+        documentos = {doc_id: doc for doc_id, doc in documentos.items()
+                      if particion_de(doc_id, particion[2]) == particion[1]}
+    generacion = _generacion_actual(particion)
+    destino = _ruta_generacion(generacion + 1, particion)
+    temporal = Path(f"{destino}.{os.getpid()}.tmp")
+    try:
+        shutil.copyfile(_ruta_generacion(generacion, particion), temporal)
+        with open(temporal, 'r+b') as f:
+            cabecera = _leer_cabecera(f.read(64 * 1024))
+            filas = cabecera["filas"]
+            secciones = cabecera["secciones"]
+            if cabecera["firma"] != tuple(firma_anterior):
+                raise ValueError("Índice binario desactualizado")
+            
+            ids = _leer_columna(f, secciones["id"], "i", filas)
+            columnas = {nombre: _leer_columna(f, secciones[nombre], _COLUMNAS[nombre], filas)
+                        for nombre in ("categoria", "confianza", "version")}
+            vocabulario = json.loads(_leer_seccion(f, secciones["vocabulario"]))
+            for doc_id, doc in documentos.items():
+                fila = bisect.bisect_left(ids, doc_id)
+                if fila == filas or ids[fila] != doc_id:
+                    raise ValueError("Índice binario desfasado")
+                columnas["categoria"][fila] = _codigo(vocabulario["categoria"], doc["categoria"])
+                columnas["confianza"][fila] = doc["confianza"]
+                columnas["version"][fila] = _codigo(vocabulario["version"], doc.get("version_clasificador"))
+            
+            _escribir_vocabulario(f, secciones, vocabulario)
+            for nombre, valores in columnas.items():
+                datos = _bytes_le(valores)
+                offset, _, reservados, _ = secciones[nombre]
+                f.seek(offset)
+                f.write(datos)
+                secciones[nombre] = [offset, len(datos), reservados, zlib.crc32(datos)]
+            f.seek(0)
+            f.write(_empaquetar_cabecera(
+                [[nombre, *secciones[nombre]] for nombre in _nombres_secciones()],
+                filas, cabecera["capacidad"], index["ultimo_id"], _firma_indice()))
+        os.replace(temporal, destino)
+    except (OSError, ValueError, KeyError):
+        try:
+            temporal.unlink()
+        except OSError:
+            pass
+        reconstruir_tabla(index, particion)
+        return
+    _limpiar_generaciones(generacion + 1, particion)
+
+
+def _subindice(index, particion):
+    """Los documentos de index.json que le tocan a una partición (o todos)"""
+    if particion is None:
+        return index
+    _, numero, cantidad = particion
+    return {"documentos": [doc for doc in index["documentos"] if particion_de(doc["id"], cantidad) == numero],
+            "ultimo_id": index.get("ultimo_id", 0)}
+
+
+def _leer_seccion(f, seccion):
+    offset, usados, *_ = seccion
+    f.seek(offset)
+    return f.read(usados)
+
+
+def _leer_columna(f, seccion, codigo, filas):
+    """Las primeras `filas` entradas de una columna como array (en disco son little-endian)"""
+    valores = array.array(codigo)
+    f.seek(seccion[0])
+    valores.frombytes(f.read(filas * valores.itemsize))
+    if sys.byteorder != "little":
+        valores.byteswap()
+    return valores
+
+
+class TablaDocumentos:
+    """
+    Vista de solo lectura sobre el índice binario.
+    Cada columna es un memoryview sobre el archivo mapeado en memoria,
+    por lo que abrirlo es casi instantáneo y las páginas se leen al usarse.
+    """
+    
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        cabecera = _leer_cabecera(self._mapa)
+        self.filas = cabecera["filas"]
+        self.ultimo_id = cabecera["ultimo_id"]
+        self.firma = cabecera["firma"]
+        self._secciones = cabecera["secciones"]
+        
+        vista = memoryview(self._mapa)
+        self._vista = vista
+        self.vocabulario = json.loads(bytes(self._bytes("vocabulario")).decode('utf-8'))
+        self.columnas = {nombre: self._columna(nombre, codigo) for nombre, codigo in _COLUMNAS.items()}
+        self._finales = {heap: self._columna(f"{heap}.off", "q") for heap in _HEAPS}
+        self._heaps = {heap: self._bytes(heap, self._finales[heap][-1] if self.filas else 0)
+                       for heap in _HEAPS}
+    
+    def _bytes(self, seccion, cantidad=None):
+        """memoryview sobre los primeros `cantidad` bytes de una sección"""
+        offset, usados, *_ = self._secciones[seccion]
+        return self._vista[offset:offset + (usados if cantidad is None else cantidad)]
+    
+    def _columna(self, seccion, codigo):
+        """
+        Valores de una columna. En disco son little-endian: en máquinas
+        little-endian se leen directo del mapeo; en las demás se copian
+        invirtiendo el orden de los bytes.
+        """
+        datos = self._bytes(seccion, self.filas * array.array(codigo).itemsize)
+        if sys.byteorder == "little":
+            return datos.cast(codigo)
+        valores = array.array(codigo)
+        valores.frombytes(datos)
+        valores.byteswap()
+        return valores
+    
+    def __len__(self):
+        return self.filas
+    
+    def __getitem__(self, fila):
+        if fila < 0:
+            fila += self.filas
+        if not 0 <= fila < self.filas:
+            raise IndexError("fila fuera de rango")
+        return DocumentoVista(self, fila)
+    
+    def __iter__(self):
+        for fila in range(self.filas):
+            yield DocumentoVista(self, fila)
+    
+    def texto(self, heap, fila):
+        """Decodifica el texto de una fila"""
+        finales = self._finales[heap]
+        inicio = finales[fila - 1] if fila > 0 else 0
+        return bytes(self._heaps[heap][inicio:finales[fila]]).decode('utf-8')
+    
+    def busqueda_por_id(self, doc_id):
+        """Fila del heap de búsqueda de un documento (None si no está)"""
+        fila = bisect.bisect_left(self.columnas["id"], doc_id)
+        if fila < self.filas and self.columnas["id"][fila] == doc_id:
+            return self.texto("busqueda", fila)
+        return None
+    
+    def buscar(self, termino):
+        """
+        Busca un término (ya en minúsculas) en el heap "nombre + ' ' + palabras"
+        directamente sobre el archivo mapeado, sin decodificar filas.
+        Retorna {fila: (en_nombre, en_texto)}; una coincidencia que cruza del
+        nombre al texto cuenta como (False, False) pero la fila aparece igual.
+        """
+        patron = termino.encode('utf-8')
+        if not self.filas:
+            return {}
+        if not patron:
+            return {fila: (True, True) for fila in range(self.filas)}
+        
+        base = self._secciones["busqueda"][0]
+        fin = base + self._finales["busqueda"][-1]
+        finales = self._finales["busqueda"]
+        cortes = self.columnas["corte"]
+        encontrados = {}
+        
+        posicion = self._mapa.find(patron, base, fin)
+        while posicion != -1:
+            relativa = posicion - base
+            fila = bisect.bisect_right(finales, relativa)
+            inicio_fila = finales[fila - 1] if fila > 0 else 0
+            fin_nombre = inicio_fila + cortes[fila]
+            siguiente = relativa + 1
+            
+            if relativa + len(patron) <= finales[fila]:
+                en_nombre, en_texto = encontrados.get(fila, (False, False))
+                if relativa + len(patron) <= fin_nombre:
+                    en_nombre = True
+                    siguiente = max(siguiente, fin_nombre + 1)
+                elif relativa > fin_nombre:
+                    en_texto = True
+                    siguiente = finales[fila]
+                else:
+                    siguiente = max(siguiente, fin_nombre + 1)
+                encontrados[fila] = (en_nombre, en_texto)
+            
+            posicion = self._mapa.find(patron, base + siguiente, fin)
+        
+        return encontrados
+
+
+# Cómo leer cada campo del documento desde la tabla
+_CAMPOS_VISTA = {
+    "id": lambda t, f: t.columnas["id"][f],
+    "nombre_original": lambda t, f: t.texto("nombre", f),
+    "nombre_archivo": lambda t, f: f"doc_{t.columnas['id'][f]:04d}{t.vocabulario['extension'][t.columnas['extension'][f]]}",
+    "ruta": lambda t, f: t.texto("ruta", f),
+    "categoria": lambda t, f: t.vocabulario["categoria"][t.columnas["categoria"][f]],
+    "confianza": lambda t, f: round(t.columnas["confianza"][f], 2),
+    "fecha_subida": lambda t, f: epoca_a_fecha(t.columnas["fecha"][f]),
+    "tamaño_kb": lambda t, f: t.columnas["tamano_kb"][f],
+    "extension": lambda t, f: t.vocabulario["extension"][t.columnas["extension"][f]],
+    "texto_extraido": lambda t, f: t.texto("texto", f),
+    "version_clasificador": lambda t, f: t.vocabulario["version"][t.columnas["version"][f]],
+}
+
+
+class DocumentoVista(Mapping):
+    """
+    Documento de solo lectura respaldado por una fila de la tabla columnar.
+    Es un Mapping (doc["categoria"], doc.get(...), items(), dict(doc)) pero solo
+    guarda la referencia a la tabla y el número de fila; el texto se decodifica
+    recién cuando se pide. Para JSON se convierte antes con dict(doc).
+    
+    Los resultados de búsqueda además traen "relevancia" y "fragmentos" (los
+    mejores pasajes para los términos buscados, calculados al pedirlos).
+    """
+    __slots__ = ("_tabla", "_fila", "relevancia", "terminos", "_fragmentos")
+    
+    def __init__(self, tabla, fila):
+        self._tabla = tabla
+        self._fila = fila
+        self.relevancia = None
+        self.terminos = None
+        self._fragmentos = None
+    
+    def __getitem__(self, campo):
+        if campo == "relevancia" and self.relevancia is not None:
+            return self.relevancia
+        if campo == "fragmentos" and self.terminos is not None:
+            if self._fragmentos is None:
+                self._fragmentos = fragmentos_documento(self["id"], self.terminos,
+                                                        respaldo=self["texto_extraido"])
+            return self._fragmentos
+        try:
+            lector = _CAMPOS_VISTA[campo]
+        except KeyError:
+            raise KeyError(campo) from None
+        return lector(self._tabla, self._fila)
+    
+    def __setitem__(self, campo, valor):
+        # Solo la relevancia de una búsqueda se puede asignar
+        if campo != "relevancia":
+            raise TypeError(f"El campo '{campo}' es de solo lectura")
+        self.relevancia = valor
+    
+    def __contains__(self, campo):
+        return (campo in _CAMPOS_VISTA
+                or (campo == "relevancia" and self.relevancia is not None)
+                or (campo == "fragmentos" and self.terminos is not None))
+    
+    def get(self, campo, defecto=None):
+        return self[campo] if campo in self else defecto
+    
+    def keys(self):
+        campos = list(_CAMPOS_VISTA)
+        if self.relevancia is not None:
+            campos.append("relevancia")
+        if self.terminos is not None:
+            campos.append("fragmentos")
+        return campos
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    def __len__(self):
+        return len(self.keys())
+    
+    def __repr__(self):
+        return f"DocumentoVista(id={self['id']}, nombre={self['nombre_original']!r})"
+
+
+def cargar_tabla(particion=None):
+    """
+    Abre el índice binario (mapeado en memoria), el completo o el de una partición.
+    Si no existe, está dañado o index.json cambió por fuera, se reconstruye.
+    """
+    directorio = _directorio_tabla(particion)
+    ruta = _ruta_generacion(_generacion_actual(particion), particion)
+    firma = _firma_indice()
+    abierta = _tablas_abiertas.get(directorio)
+    if abierta is not None and abierta[0] == ruta and abierta[1] == firma:
+        return abierta[2]
+    
+    try:
+        tabla = TablaDocumentos(ruta)
+        if tabla.firma != firma:
+            raise ValueError("Índice binario desactualizado")
+    except (OSError, ValueError):
+        with bloqueo_indice():
+            # Otro proceso pudo haberla reconstruido mientras se esperaba el bloqueo
+            ruta = _ruta_generacion(_generacion_actual(particion), particion)
+            try:
+                tabla = TablaDocumentos(ruta)
+                if tabla.firma != _firma_indice():
+                    raise ValueError("Índice binario desactualizado")
+            except (OSError, ValueError):
+                reconstruir_tabla(particion=particion)
+                ruta = _ruta_generacion(_generacion_actual(particion), particion)
+                tabla = TablaDocumentos(ruta)
+    
+    _tablas_abiertas[directorio] = (ruta, tabla.firma, tabla)
+    return tabla
+
+
+def indice_json_a_binario(origen, destino):
+    """Convierte un index.json al formato binario"""
+    with open(origen, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    escribir_indice_binario(index, destino)
+    return len(index["documentos"])
+
+
+def indice_binario_a_json(origen, destino):
+    """Convierte un índice binario de vuelta a index.json"""
+    tabla = TablaDocumentos(origen)
+    documentos = []
+    for doc in tabla:
+        registro = dict(doc)
+        if registro["version_clasificador"] is None:
+            del registro["version_clasificador"]
+        documentos.append(registro)
+    with open(destino, 'w', encoding='utf-8') as f:
+        json.dump({"documentos": documentos, "ultimo_id": tabla.ultimo_id}, f, indent=2, ensure_ascii=False)
+    return len(documentos)
+
+
+def _arreglos(tabla):
+    """Columnas de la tabla como arreglos NumPy (sin copiar, leídas como little-endian)"""
+    import numpy as np
+    return {nombre: np.frombuffer(tabla._bytes(nombre, tabla.filas * array.array(codigo).itemsize),
+                                  dtype=np.dtype(codigo).newbyteorder("<"))
+            for nombre, codigo in _COLUMNAS.items()}
+
+
+def analisis_columnar(limite_listado=1000):
+    """
+    Agregados vectorizados para la página de análisis.
+    Retorna arreglos NumPy listos para graficar.
+    """
+    import numpy as np
+    tabla = cargar_tabla()
+    col = _arreglos(tabla)
+    categorias = tabla.vocabulario["categoria"]
+    
+    # Conteo y tamaño por categoría
+    conteos = np.bincount(col["categoria"], minlength=len(categorias))
+    tamaños = np.bincount(col["categoria"], weights=col["tamano_kb"], minlength=len(categorias))
+    presentes = np.flatnonzero(conteos)
+    
+    # Documentos por día
+    dias, por_dia = np.unique(col["fecha"] // 86400, return_counts=True)
+    
+    # Histograma de confianza (%)
+    frecuencias, bordes = np.histogram(col["confianza"].astype(np.float64) * 100, bins=20, range=(0, 100))
+    
+    # Listado de los documentos más recientes
+    desde = max(len(tabla) - limite_listado, 0)
+    listado = {
+        "id": col["id"][desde:][::-1],
+        "nombre": [tabla.texto("nombre", fila) for fila in range(len(tabla) - 1, desde - 1, -1)],
+        "categoria": np.array(categorias, dtype=object)[col["categoria"][desde:][::-1]],
+        "confianza": col["confianza"][desde:][::-1].astype(np.float64),
+        "fecha": col["fecha"][desde:][::-1].astype("datetime64[s]"),
+        "tamano_kb": col["tamano_kb"][desde:][::-1],
+    }
+    
+    return {
+        "total_documentos": len(tabla),
+        "categorias": [categorias[i] for i in presentes],
+        "conteo_categorias": conteos[presentes],
+        "tamaño_categorias": tamaños[presentes],
+        "tamaño_total_kb": float(col["tamano_kb"].sum()),
+        "confianza_promedio": float(col["confianza"].mean(dtype=np.float64)) if len(tabla) else 0.0,
+        "dias": (dias * 86400).astype("datetime64[s]").astype("datetime64[D]"),
+        "por_dia": por_dia,
+        "histograma_confianza": (frecuencias, bordes),
+        "listado": listado,
+    }
+
+
+def resumen_panel(cantidad_recientes=5):
+    """
+    Lo que muestra el Dashboard: cuántos documentos se subieron hoy y los más
+    recientes (mismo orden que ordenar por fecha_subida descendente), desde la
+    columna de fechas y sin recorrer las vistas de todos los documentos
+    """
+    import numpy as np
+    tabla = cargar_tabla()
+    fechas = _arreglos(tabla)["fecha"]
+    hoy = fecha_a_epoca(datetime.now().strftime("%Y-%m-%d 00:00:00")) // 86400
+    subidos_hoy = int(np.count_nonzero(fechas // 86400 == hoy))
+    
+    recientes = []
+    if len(fechas):
+        # Candidatos: desde la k-ésima fecha más alta (con empates); entre iguales, el orden de la tabla
+        k = min(cantidad_recientes, len(fechas))
+        umbral = np.partition(fechas, len(fechas) - k)[len(fechas) - k]
+        candidatos = np.flatnonzero(fechas >= umbral)
+        orden = candidatos[np.lexsort((candidatos, -fechas[candidatos]))][:k]
+        recientes = [tabla[int(fila)] for fila in orden]
+    
+    return {"subidos_hoy": subidos_hoy, "recientes": recientes}
+
+
+# ====================================
+# ESTADÍSTICAS
+# ====================================
+
+def get_statistics():
+    """Obtiene estadísticas del sistema"""
+    contadores = None
+    if particiones_activas():
+        try:
+            contadores = _sumar_contadores(_consultar_particiones("estadisticas"))
+        except (TimeoutError, RuntimeError):
+            pass
+    if contadores is None:
+        contadores = _contadores_estadisticas(cargar_tabla())
+    
+    total = contadores["total_documentos"]
+    return {
+        "total_documentos": total,
+        "categorias": contadores["categorias"],
+        "por_mes": contadores["por_mes"],
+        "tamaño_total_mb": round(contadores["tamaño_total_kb"] / 1024, 2),
+        "confianza_promedio": round(contadores["suma_confianza"] / total * 100, 1) if total else 0
+    }
+
+
+def _contadores_estadisticas(tabla):
+    """Conteos y sumas de una tabla (se pueden sumar entre particiones)"""
+    import numpy as np
+    col = _arreglos(tabla)
+    categorias = tabla.vocabulario["categoria"]
+    
+    # Contar por categoría
+    conteos = np.bincount(col["categoria"], minlength=len(categorias))
+    categorias_count = {categorias[i]: int(conteos[i]) for i in np.flatnonzero(conteos)}
+    
+    # Contar por mes
+    meses, por_mes = np.unique(col["fecha"].astype("datetime64[s]").astype("datetime64[M]"), return_counts=True)
+    meses_count = {str(mes): int(n) for mes, n in zip(meses, por_mes)}  # YYYY-MM
+    
+    return {
+        "total_documentos": len(tabla),
+        "categorias": categorias_count,
+        "por_mes": meses_count,
+        "tamaño_total_kb": float(col["tamano_kb"].sum()),
+        "suma_confianza": float(col["confianza"].sum(dtype=np.float64)),
+    }
+
+
+def _sumar_contadores(lista):
+    total = {"total_documentos": 0, "categorias": {}, "por_mes": {}, "tamaño_total_kb": 0.0, "suma_confianza": 0.0}
+    for contadores in lista:
+        for clave in ("total_documentos", "tamaño_total_kb", "suma_confianza"):
+            total[clave] += contadores[clave]
+        for clave in ("categorias", "por_mes"):
+            for nombre, cantidad in contadores[clave].items():
+                total[clave][nombre] = total[clave].get(nombre, 0) + cantidad
+    
+    # Mismo orden que con una sola tabla: categorías del sistema primero, meses en orden
+    orden = {categoria: i for i, categoria in enumerate(CATEGORIAS)}
+    total["categorias"] = dict(sorted(total["categorias"].items(), key=lambda x: orden.get(x[0], len(orden))))
+    total["por_mes"] = dict(sorted(total["por_mes"].items()))
+    return total
+
+
+# ====================================
+# BÚSQUEDA PARTICIONADA
+# ====================================
+#
+# Con muchos documentos el índice de búsqueda se reparte en N particiones
+# (por id: id % N). Cada partición es un índice binario como el completo,
+# en PARTICIONES_DIR/vVVVV/pNNN/, y la atiende su propio proceso trabajador.
+# Un coordinador manda cada consulta a todos, junta los mejores resultados
+# de cada uno y los devuelve sobre la tabla completa, que sigue siendo el
+# catálogo (documentos por id, análisis, exportaciones).
+#
+# particiones.json guarda la cantidad y una versión que cambia al dividir o
+# unir particiones; con cantidad 1 no se usan particiones.
+
+PARTICIONES_DIR = BASE_DIR / "particiones"
+
+# Segundos que se espera la respuesta de las particiones; si no llega se
+# responde con la tabla completa de este proceso y se relanzan los trabajadores
+TIEMPO_MAXIMO_PARTICIONES = 60
+
+# Consultas simultáneas a las particiones: cada una toma un juego de
+# trabajadores (un proceso por partición) y lo devuelve al terminar
+JUEGOS_PARTICIONES = 4
+
+_coordinador = {"version": None, "epoca": 0, "libres": [], "en_uso": 0}
+# Solo se toma para tomar, devolver, lanzar o detener juegos, nunca durante una consulta
+_bloqueo_coordinador = threading.Condition()
+
+
+def particion_de(doc_id, cantidad):
+    """Número de partición de un documento"""
+    return doc_id % cantidad
+
+
+def leer_config_particiones():
+    try:
+        with open(PARTICIONES_DIR / "particiones.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"cantidad": 1, "version": 0}
+
+
+def _guardar_config_particiones(cantidad, version):
+    PARTICIONES_DIR.mkdir(parents=True, exist_ok=True)
+    destino = PARTICIONES_DIR / "particiones.json"
+    temporal = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump({"cantidad": cantidad, "version": version}, f)
+    os.replace(temporal, destino)
+
+
+def particiones_vigentes(config=None):
+    """Particiones vigentes como (versión, número, cantidad); vacío si no se usan"""
+    config = config or leer_config_particiones()
+    if config["cantidad"] <= 1:
+        return []
+    return [(config["version"], numero, config["cantidad"]) for numero in range(config["cantidad"])]
+
+
+def particiones_activas():
+    return leer_config_particiones()["cantidad"] > 1
+
+
+def _anexar_a_particiones(documento, index, firma_anterior):
+    """
+    Agrega el documento a su partición y actualiza la firma de las demás,
+    que no cambian (así no parecen desactualizadas)
+    """
+    for particion in particiones_vigentes():
+        if particion_de(documento["id"], particion[2]) == particion[1]:
+            _anexar_a_tabla(documento, index, firma_anterior, particion)
+        else:
+            _actualizar_firma(particion, firma_anterior, index["ultimo_id"])
+
+
+def _actualizar_firma(particion, firma_anterior, ultimo_id):
+    """Reescribe solo la cabecera de una partición con la firma actual de index.json"""
+    try:
+        with open(_ruta_generacion(_generacion_actual(particion), particion), 'r+b') as f:
+            cabecera = _leer_cabecera(f.read(64 * 1024))
+            # Si ya estaba desactualizada, se deja así para que se reconstruya
+            if cabecera["firma"] != tuple(firma_anterior):
+                return
+            secciones = cabecera["secciones"]
+            f.seek(0)
+            f.write(_empaquetar_cabecera(
+                [[nombre, *secciones[nombre]] for nombre in _nombres_secciones()],
+                cabecera["filas"], cabecera["capacidad"], ultimo_id, _firma_indice()))
+    except (OSError, ValueError, KeyError):
+        pass
+
+
+def _escribir_particiones(version, cantidad, grupos, firma):
+    """Escribe las tablas de una versión nueva de particiones: grupos[n] = documentos de la n"""
+    anterior = cargar_tabla()
+    for numero, documentos in enumerate(grupos):
+        particion = (version, numero, cantidad)
+        _directorio_tabla(particion).mkdir(parents=True, exist_ok=True)
+        documentos.sort(key=lambda doc: doc["id"])
+        escribir_indice_binario({"documentos": documentos, "ultimo_id": anterior.ultimo_id},
+                                _ruta_generacion(1, particion), firma, anterior)
+
+
+def _activar_particiones(cantidad, version):
+    """Cambia a la versión nueva de particiones y borra la anterior"""
+    anterior = leer_config_particiones()
+    _guardar_config_particiones(cantidad, version)
+    detener_coordinador()
+    # En Windows las tablas pueden seguir mapeadas por otro proceso
+    shutil.rmtree(PARTICIONES_DIR / f"v{anterior['version']:04d}", ignore_errors=True)
+
+
+def configurar_particiones(cantidad):
+    """
+    Reparte el índice en `cantidad` particiones desde index.json
+    (1 vuelve a una sola tabla). Retorna la configuración nueva.
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad de particiones debe ser al menos 1")
+    with bloqueo_indice():
+        version = leer_config_particiones()["version"] + 1
+        if cantidad > 1:
+            index = load_index()
+            grupos = [[] for _ in range(cantidad)]
+            for doc in index["documentos"]:
+                grupos[particion_de(doc["id"], cantidad)].append(doc)
+            _escribir_particiones(version, cantidad, grupos, _firma_indice())
+        _activar_particiones(cantidad, version)
+    return leer_config_particiones()
+
+
+def _documentos_de_particiones(particiones):
+    """Documentos (como dicts de index.json) y firma de las tablas de varias particiones"""
+    documentos, firmas = [], set()
+    for particion in particiones:
+        tabla = cargar_tabla(particion)
+        firmas.add(tabla.firma)
+        for doc in tabla:
+            registro = dict(doc)
+            if registro["version_clasificador"] is None:
+                del registro["version_clasificador"]
+            documentos.append(registro)
+    return documentos, firmas.pop() if len(firmas) == 1 else (0, 0)
+
+
+def dividir_particiones():
+    """
+    Duplica la cantidad de particiones: la partición n se divide en n y n + N
+    (con id % 2N), leyendo solo su propia tabla
+    """
+    with bloqueo_indice():
+        config = leer_config_particiones()
+        # Sin particiones se divide la tabla completa
+        actuales = particiones_vigentes(config) or [None]
+        cantidad = 2 * config["cantidad"]
+        version = config["version"] + 1
+        grupos = [[] for _ in range(cantidad)]
+        firmas = set()
+        for particion in actuales:
+            documentos, firma = _documentos_de_particiones([particion])
+            firmas.add(firma)
+            for doc in documentos:
+                grupos[particion_de(doc["id"], cantidad)].append(doc)
+        _escribir_particiones(version, cantidad, grupos, firmas.pop() if len(firmas) == 1 else (0, 0))
+        _activar_particiones(cantidad, version)
+    return leer_config_particiones()
+
+
+def unir_particiones():
+    """Reduce a la mitad la cantidad de particiones: n y n + N/2 se unen en n"""
+    with bloqueo_indice():
+        config = leer_config_particiones()
+        if config["cantidad"] <= 1:
+            raise ValueError("No hay particiones para unir")
+        if config["cantidad"] % 2:
+            raise ValueError(f"No se pueden unir {config['cantidad']} particiones de a pares; "
+                             f"indica la cantidad directamente")
+        cantidad = config["cantidad"] // 2
+        version = config["version"] + 1
+        actuales = particiones_vigentes(config)
+        if cantidad > 1:
+            grupos, firmas = [], set()
+            for numero in range(cantidad):
+                documentos, firma = _documentos_de_particiones([actuales[numero], actuales[numero + cantidad]])
+                grupos.append(documentos)
+                firmas.add(firma)
+            _escribir_particiones(version, cantidad, grupos, firmas.pop() if len(firmas) == 1 else (0, 0))
+        _activar_particiones(cantidad, version)
+    return leer_config_particiones()
+
+
+# --- Trabajadores y coordinador ---
+
+def _responder_en_particion(particion, operacion, argumento):
+    """Ejecuta una operación sobre la tabla de una partición"""
+    import numpy as np
+    tabla = cargar_tabla(particion)
+    if operacion == "estadisticas":
+        return _contadores_estadisticas(tabla)
+    
+    consulta, limite = argumento
+    if operacion == "simple":
+        resultados = _buscar_documentos(consulta, tabla).recortar(limite)
+    elif operacion == "ia":
+        resultados = _ejecutar_busqueda_ia(consulta, tabla).recortar(limite)
+    else:
+        raise ValueError(f"Operación desconocida: {operacion}")
+    
+    # Ids en vez de filas: las filas solo valen dentro de esta partición
+    filas = np.frombuffer(resultados._filas, dtype=np.uint32)
+    relevancias = np.frombuffer(resultados._relevancias, dtype=np.uint32)
+    return _arreglos(tabla)["id"][filas].astype("<i8").tobytes(), relevancias.astype("<u4").tobytes()
+
+
+def _servir_particion(conexion, base_dir, particion):
+    """Bucle de un proceso trabajador: responde consultas sobre su partición"""
+    configurar_rutas(base_dir)
+    while True:
+        try:
+            mensaje = conexion.recv()
+        except EOFError:
+            break
+        if mensaje is None:
+            break
+        operacion, argumento = mensaje
+        try:
+            respuesta = ("ok", _responder_en_particion(particion, operacion, argumento))
+        except Exception as e:
+            respuesta = ("error", f"{type(e).__name__}: {e}")
+        conexion.send(respuesta)
+
+
+def _detener_juego(juego, espera=5):
+    """Termina los procesos de un juego de trabajadores (a la fuerza después de `espera` s)"""
+    for conexion in juego["conexiones"]:
+        try:
+            conexion.send(None)
+            conexion.close()
+        except OSError:
+            pass
+    for proceso in juego["procesos"]:
+        proceso.join(timeout=espera)
+        if proceso.is_alive():
+            proceso.terminate()
+
+
+def detener_coordinador(espera=5):
+    """Termina los procesos de las particiones de este proceso (a la fuerza después de `espera` s)"""
+    with _bloqueo_coordinador:
+        libres = _coordinador["libres"]
+        # Los juegos en uso se detienen al devolverlos (cambió la época)
+        _coordinador.update(version=None, libres=[], epoca=_coordinador["epoca"] + 1)
+    for juego in libres:
+        _detener_juego(juego, espera)
+
+
+def _iniciar_juego(config, epoca):
+    import multiprocessing
+    
+    # "spawn" y no fork: este proceso tiene otros hilos (la aplicación, la
+    # cola) y un hijo copiado con un bloqueo tomado por uno de ellos se cuelga
+    contexto = multiprocessing.get_context("spawn")
+    juego = {"epoca": epoca, "procesos": [], "conexiones": []}
+    for particion in particiones_vigentes(config):
+        local, remota = contexto.Pipe()
+        proceso = contexto.Process(target=_servir_particion, args=(remota, str(BASE_DIR), particion),
+                                   name=f"particion-{particion[1]}", daemon=True)
+        proceso.start()
+        remota.close()
+        juego["procesos"].append(proceso)
+        juego["conexiones"].append(local)
+    return juego
+
+
+def _tomar_juego(config, limite):
+    """
+    Un juego de trabajadores libre, o uno nuevo si hay menos de JUEGOS_PARTICIONES.
+    Si están todos en uso espera hasta `limite` (time.monotonic) y lanza TimeoutError.
+    """
+    descartados = []
+    try:
+        with _bloqueo_coordinador:
+            if _coordinador["version"] != config["version"]:
+                # Versión nueva de particiones: los juegos anteriores ya no sirven
+                descartados.extend(_coordinador["libres"])
+                _coordinador.update(version=config["version"], libres=[], epoca=_coordinador["epoca"] + 1)
+            while True:
+                while _coordinador["libres"]:
+                    juego = _coordinador["libres"].pop()
+                    if all(proceso.is_alive() for proceso in juego["procesos"]):
+                        _coordinador["en_uso"] += 1
+                        return juego
+                    descartados.append(juego)
+                if _coordinador["en_uso"] < JUEGOS_PARTICIONES:
+                    juego = _iniciar_juego(config, _coordinador["epoca"])
+                    _coordinador["en_uso"] += 1
+                    return juego
+                if not _bloqueo_coordinador.wait(max(0, limite - time.monotonic())):
+                    raise TimeoutError(f"Las particiones no respondieron en {TIEMPO_MAXIMO_PARTICIONES} s")
+    finally:
+        for juego in descartados:
+            _detener_juego(juego, espera=0)
+
+
+def _devolver_juego(juego, sano=True):
+    """Deja el juego para la próxima consulta, o lo detiene si falló o quedó viejo"""
+    with _bloqueo_coordinador:
+        _coordinador["en_uso"] -= 1
+        vigente = sano and juego["epoca"] == _coordinador["epoca"]
+        if vigente:
+            _coordinador["libres"].append(juego)
+        _bloqueo_coordinador.notify()
+    if not vigente:
+        _detener_juego(juego, espera=5 if sano else 0)
+
+
+def _consultar_particiones(operacion, argumento=None):
+    """
+    Manda la operación a todas las particiones a la vez y junta las respuestas.
+    Cada consulta usa su propio juego de trabajadores, así una partición lenta
+    solo demora a la consulta que la espera. Lanza TimeoutError si no responden
+    en TIEMPO_MAXIMO_PARTICIONES (ese juego se descarta) y RuntimeError si una
+    partición falla.
+    """
+    config = leer_config_particiones()
+    limite = time.monotonic() + TIEMPO_MAXIMO_PARTICIONES
+    for intento in range(2):
+        juego = _tomar_juego(config, limite)
+        respuestas = []
+        try:
+            for conexion in juego["conexiones"]:
+                conexion.send((operacion, argumento))
+            for conexion in juego["conexiones"]:
+                if not conexion.poll(max(0, limite - time.monotonic())):
+                    break
+                respuestas.append(conexion.recv())
+        except (EOFError, OSError) as e:
+            # Un trabajador caído: se descarta el juego y se prueba con otro
+            _devolver_juego(juego, sano=False)
+            if intento:
+                raise RuntimeError(f"Las particiones no responden: {type(e).__name__}: {e}") from e
+            continue
+        except BaseException:
+            _devolver_juego(juego, sano=False)
+            raise
+        if len(respuestas) < len(juego["conexiones"]):
+            # Un trabajador colgado: se descarta el juego (su respuesta podría llegar tarde)
+            _devolver_juego(juego, sano=False)
+            raise TimeoutError(f"Las particiones no respondieron en {TIEMPO_MAXIMO_PARTICIONES} s")
+        _devolver_juego(juego)
+        break
+    
+    errores = [detalle for estado, detalle in respuestas if estado == "error"]
+    if errores:
+        raise RuntimeError(f"Error en una partición: {errores[0]}")
+    return [detalle for _, detalle in respuestas]
+
+
+def _buscar_en_particiones(operacion, consulta, terminos, limite=None):
+    """
+    Búsqueda repartida: cada partición devuelve sus `limite` mejores (id, relevancia)
+    y se mezclan en el mismo orden que daría una sola tabla
+    """
+    import numpy as np
+    respuestas = _consultar_particiones(operacion, (consulta, limite))
+    ids = np.concatenate([np.frombuffer(ids, dtype="<i8") for ids, _ in respuestas])
+    relevancias = np.concatenate([np.frombuffer(rel, dtype="<u4") for _, rel in respuestas])
+    
+    orden = np.lexsort((ids, -relevancias.astype(np.int64)))[:limite]
+    ids, relevancias = ids[orden], relevancias[orden]
+    
+    # De id a fila de la tabla completa (ordenada por id)
+    tabla = get_all_documents()
+    columna_id = _arreglos(tabla)["id"]
+    filas = np.searchsorted(columna_id, ids)
+    presentes = filas < len(columna_id)
+    presentes[presentes] = columna_id[filas[presentes]] == ids[presentes]
+    return ResultadosBusqueda(tabla, filas[presentes].tolist(), relevancias[presentes].tolist(), terminos)
+
+
+# ====================================
+# EXPORTACIÓN DE REPORTES
+# ====================================
+
+# Tamaño de los bloques que se escriben al exportar
+BLOQUE_EXPORTACION = 64 * 1024
+
+FORMATOS_EXPORTACION = {
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+    "csv": ("text/csv", ".csv"),
+    "zip": ("application/zip", ".zip"),
+}
+
+# Reportes más grandes no se ofrecen como descarga en la app: el botón de
+# descarga de Streamlit carga el archivo entero en memoria
+MAX_DESCARGA_MB = 200
+
+CAMPOS_CSV = [
+    "id", "nombre_original", "nombre_archivo", "categoria", "confianza",
+    "fecha_subida", "tamaño_kb", "extension", "ruta", "texto_extraido"
+]
+
+
+def iterar_documentos(categoria=None, fecha_desde=None, fecha_hasta=None):
+    """
+    Genera los documentos que cumplen los filtros, uno a la vez.
+    Las fechas son 'YYYY-MM-DD' y ambos extremos son inclusivos.
+    """
+    for doc in get_all_documents():
+        if categoria and doc["categoria"] != categoria:
+            continue
+        fecha = doc["fecha_subida"][:10]
+        if fecha_desde and fecha < fecha_desde:
+            continue
+        if fecha_hasta and fecha > fecha_hasta:
+            continue
+        yield doc
+
+
+def _en_bloques(lineas):
+    """Agrupa cadenas pequeñas en bloques de bytes de tamaño acotado"""
+    buffer = io.StringIO()
+    for linea in lineas:
+        buffer.write(linea)
+        if buffer.tell() >= BLOQUE_EXPORTACION:
+            yield buffer.getvalue().encode('utf-8')
+            buffer = io.StringIO()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def exportar_ndjson(docs):
+    """Genera bloques NDJSON: un documento por línea"""
+    return _en_bloques(json.dumps(dict(doc), ensure_ascii=False) + "\n" for doc in docs)
+
+
+def exportar_csv(docs):
+    """Genera bloques CSV con una fila por documento"""
+    def filas():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(CAMPOS_CSV)
+        for doc in docs:
+            escritor.writerow([doc.get(campo, "") for campo in CAMPOS_CSV])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    # BOM para que Excel detecte UTF-8
+    yield "\ufeff".encode('utf-8')
+    yield from _en_bloques(filas())
+
+
+def _ruta_local(doc):
+    """Ruta del archivo físico (el índice puede traer separadores de Windows)"""
+    return Path(doc["ruta"].replace("\\", "/"))
+
+
+def _contando(docs, contador):
+    """Pasa los documentos tal cual, contándolos en contador[0]"""
+    for doc in docs:
+        contador[0] += 1
+        yield doc
+
+
+def _escribir_zip(destino, filtros, incluir_archivos):
+    """Escribe un paquete ZIP con el listado NDJSON y, opcionalmente, los archivos originales"""
+    contador = [0]
+    faltantes = []
+    
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("documentos.ndjson", 'w', force_zip64=True) as salida:
+            for bloque in exportar_ndjson(_contando(iterar_documentos(**filtros), contador)):
+                salida.write(bloque)
+        
+        # Segunda pasada para copiar los originales por bloques
+        if incluir_archivos:
+            for doc in iterar_documentos(**filtros):
+                ruta = _ruta_local(doc)
+                if not ruta.exists():
+                    faltantes.append(doc["id"])
+                    continue
+                nombre_zip = f"archivos/{doc['categoria'].replace('/', '_')}/{doc['nombre_archivo']}"
+                with open(ruta, 'rb') as origen, zf.open(nombre_zip, 'w', force_zip64=True) as salida:
+                    shutil.copyfileobj(origen, salida, BLOQUE_EXPORTACION)
+        
+        reporte = {
+            "fecha_generacion": datetime.now().strftime(FORMATO_FECHA),
+            "filtros": filtros,
+            "estadisticas": get_statistics(),
+            "total_exportados": contador[0],
+            "archivos_faltantes": faltantes,
+        }
+        zf.writestr("reporte.json", json.dumps(reporte, indent=2, ensure_ascii=False))
+    
+    return contador[0]
+
+
+def exportar_reporte(destino, formato="ndjson", categoria=None, fecha_desde=None,
+                     fecha_hasta=None, incluir_archivos=False):
+    """
+    Exporta los documentos filtrados a un archivo en disco escribiendo por bloques,
+    de modo que la memoria usada no depende del tamaño del archivo.
+    Retorna la cantidad de documentos exportados.
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    
+    filtros = {"categoria": categoria, "fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta}
+    if formato == "zip":
+        return _escribir_zip(destino, filtros, incluir_archivos)
+    
+    contador = [0]
+    generador = exportar_ndjson if formato == "ndjson" else exportar_csv
+    with open(destino, 'wb') as f:
+        for bloque in generador(_contando(iterar_documentos(**filtros), contador)):
+            f.write(bloque)
+    return contador[0]
+
+
+# ====================================
+# RECLASIFICACIÓN MASIVA
+# ====================================
+
+# Documentos reclasificados por escritura de index.json. Cada escritura relee
+# y reescribe el índice completo, así que conviene que sean pocas
+PUNTO_CONTROL_RECLASIFICACION = 50_000
+# Documentos por tarea enviada a los procesos de clasificación
+LOTE_CLASIFICACION = 500
+
+
+def buscar_desactualizados(index=None):
+    """Documentos clasificados con una versión distinta del clasificador actual"""
+    if index is None:
+        index = load_index()
+    return [doc for doc in index["documentos"]
+            if doc.get("version_clasificador") != VERSION_CLASIFICADOR]
+
+
+def _clasificar_lote(lote):
+    """Reclasifica un lote de (id, extracto, nombre) en un proceso trabajador"""
+    return [(doc_id, *clasificar_documento_inteligente(leer_texto_completo(doc_id, respaldo=extracto), nombre))
+            for doc_id, extracto, nombre in lote]
+
+
+def _aplicar_resultados(resultados):
+    """
+    Aplica los resultados al índice en una sola escritura y pasa los cambios
+    a una generación nueva del índice binario y de las particiones, copiada
+    de la actual, para que los lectores no tengan que reconstruirlos
+    """
+    with bloqueo_indice():
+        index = load_index()
+        por_id = {doc["id"]: doc for doc in index["documentos"]}
+        
+        for doc_id, categoria, confianza in resultados:
+            doc = por_id.get(doc_id)
+            if doc is None:
+                continue
+            # La ruta no cambia: el archivo físico se queda donde está
+            doc["categoria"] = categoria
+            doc["confianza"] = round(confianza, 2)
+            doc["version_clasificador"] = VERSION_CLASIFICADOR
+        
+        firma_anterior = _firma_indice()
+        save_index(index)
+        
+        actualizados = {doc_id: por_id[doc_id] for doc_id, *_ in resultados if doc_id in por_id}
+        _actualizar_clasificacion_en_tabla(actualizados, index, firma_anterior)
+        for particion in particiones_vigentes():
+            _actualizar_clasificacion_en_tabla(actualizados, index, firma_anterior, particion)
+        incrementar_generacion()
+
+
+def reclasificar_documentos(procesos=None, todos=False, aplicar=True, tamaño_lote=None):
+    """
+    Vuelve a clasificar los documentos usando el texto completo guardado
+    (o el extracto del índice si el documento no lo tiene).
+    Solo procesa los desactualizados salvo que todos=True. El puntaje se calcula
+    en paralelo y los cambios se escriben en el índice cada `tamaño_lote`
+    documentos (por defecto PUNTO_CONTROL_RECLASIFICACION) y al final.
+    Retorna un reporte con los cambios de categoría.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    index = load_index()
+    pendientes = index["documentos"] if todos else buscar_desactualizados(index)
+    trabajos = [(doc["id"], doc["texto_extraido"], doc["nombre_original"]) for doc in pendientes]
+    actuales = {doc["id"]: (doc["nombre_original"], doc["categoria"], doc["confianza"]) for doc in pendientes}
+    del index, pendientes
+    
+    inicio = datetime.now()
+    cambios = []
+    procesados = 0
+    por_escribir = []
+    
+    tamaño_lote = tamaño_lote or PUNTO_CONTROL_RECLASIFICACION
+    lotes = [trabajos[i:i + LOTE_CLASIFICACION] for i in range(0, len(trabajos), LOTE_CLASIFICACION)]
+    # Los procesos leen el texto completo de la misma carpeta de datos
+    with ProcessPoolExecutor(max_workers=procesos, initializer=configurar_rutas,
+                             initargs=(str(BASE_DIR),)) as pool:
+        for resultados in pool.map(_clasificar_lote, lotes):
+            procesados += len(resultados)
+            for doc_id, categoria, confianza in resultados:
+                nombre, anterior, confianza_anterior = actuales[doc_id]
+                if anterior != categoria:
+                    cambios.append({
+                        "id": doc_id,
+                        "nombre_original": nombre,
+                        "anterior": anterior,
+                        "nueva": categoria,
+                        "confianza_anterior": confianza_anterior,
+                        "confianza_nueva": round(confianza, 2),
+                    })
+            
+            if aplicar:
+                por_escribir.extend(resultados)
+                if len(por_escribir) >= tamaño_lote:
+                    _aplicar_resultados(por_escribir)
+                    por_escribir = []
+    
+    if por_escribir:
+        _aplicar_resultados(por_escribir)
+    
+    # Resumen "anterior -> nueva"
+    resumen = {}
+    for cambio in cambios:
+        clave = f"{cambio['anterior']} -> {cambio['nueva']}"
+        resumen[clave] = resumen.get(clave, 0) + 1
+    
+    return {
+        "fecha": inicio.strftime(FORMATO_FECHA),
+        "version_clasificador": VERSION_CLASIFICADOR,
+        "aplicado": aplicar,
+        "procesados": procesados,
+        "cambiados": len(cambios),
+        "duracion_s": round((datetime.now() - inicio).total_seconds(), 2),
+        "resumen": resumen,
+        "cambios": cambios,
+    }
+
+
+# ====================================
+# COLA DE TRABAJOS (PROCESAMIENTO EN SEGUNDO PLANO)
+# ====================================
+
+ESTADOS_TRABAJO = ("pendiente", "procesando", "completado", "error")
+
+# Reintentos ante fallos (espera 2, 4, 8... segundos entre intentos)
+MAX_INTENTOS = 3
+# Un trabajo "procesando" por más tiempo se considera abandonado (trabajador caído)
+TIEMPO_MAXIMO_TRABAJO = 15 * 60
+# Tamaño total de los archivos que se procesan a la vez entre todos los trabajadores
+# (la memoria que usan es proporcional). Si el siguiente no entra, espera a que
+# terminen los que están en curso; uno más grande que esto se procesa solo.
+PRESUPUESTO_MEMORIA_MB = 256
+
+
+class ArchivoEnDisco:
+    """Adaptador con la interfaz de un archivo subido (name, size, type, getbuffer)"""
+    
+    def __init__(self, ruta, nombre, tipo=None):
+        self.ruta = Path(ruta)
+        self.name = nombre
+        self.type = tipo or ("application/pdf" if nombre.lower().endswith(".pdf") else "image/*")
+        self.size = self.ruta.stat().st_size
+    
+    def getbuffer(self):
+        return self.ruta.read_bytes()
+
+
+def _conexion_cola():
+    COLA_DIR.mkdir(parents=True, exist_ok=True)
+    conexion = sqlite3.connect(COLA_DB, timeout=30, isolation_level=None)
+    conexion.row_factory = sqlite3.Row
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("""
+        CREATE TABLE IF NOT EXISTS trabajos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            ruta TEXT NOT NULL,
+            tipo TEXT,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            doc_id INTEGER,
+            categoria TEXT,
+            confianza REAL,
+            trabajador TEXT,
+            creado REAL NOT NULL,
+            disponible REAL NOT NULL,
+            iniciado REAL,
+            terminado REAL,
+            t_extraccion REAL,
+            t_clasificacion REAL,
+            t_guardado REAL,
+            bytes INTEGER
+        )
+    """)
+    # Colas creadas antes de que existiera la columna
+    columnas = {fila["name"] for fila in conexion.execute("PRAGMA table_info(trabajos)")}
+    if "bytes" not in columnas:
+        conexion.execute("ALTER TABLE trabajos ADD COLUMN bytes INTEGER")
+    conexion.execute("CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, disponible)")
+    return conexion
+
+
+def encolar_documento(uploaded_file):
+    """
+    Copia el archivo a la carpeta de la cola y registra el trabajo.
+    Retorna el ID del trabajo de inmediato (el procesamiento ocurre en segundo plano).
+    """
+    extension = Path(uploaded_file.name).suffix
+    ruta = COLA_DIR / f"{uuid.uuid4().hex}{extension}"
+    COLA_DIR.mkdir(parents=True, exist_ok=True)
+    copiar_archivo(uploaded_file, ruta)
+    
+    return _registrar_trabajos([(uploaded_file.name, ruta, uploaded_file.type, ruta.stat().st_size)])[0]
+
+
+def _registrar_trabajos(archivos):
+    """Registra trabajos (nombre, ruta, tipo, bytes) en una sola transacción; retorna sus IDs"""
+    ahora = time.time()
+    conexion = _conexion_cola()
+    try:
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [
+                conexion.execute(
+                    "INSERT INTO trabajos (nombre, ruta, tipo, bytes, creado, disponible) VALUES (?, ?, ?, ?, ?, ?)",
+                    (nombre, str(ruta), tipo, tamaño, ahora, ahora)).lastrowid
+                for nombre, ruta, tipo, tamaño in archivos
+            ]
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return ids
+    finally:
+        conexion.close()
+
+
+def estado_trabajos(ids=None, limite=50):
+    """Estado de los trabajos indicados (o los más recientes) como lista de dicts"""
+    conexion = _conexion_cola()
+    try:
+        if ids is not None:
+            ids = list(ids)
+            if not ids:
+                return []
+            filas = conexion.execute(
+                f"SELECT * FROM trabajos WHERE id IN ({','.join('?' * len(ids))}) ORDER BY id DESC", ids)
+        else:
+            filas = conexion.execute("SELECT * FROM trabajos ORDER BY id DESC LIMIT ?", (limite,))
+        return [dict(fila) for fila in filas]
+    finally:
+        conexion.close()
+
+
+def resumen_cola():
+    """Cantidad de trabajos por estado"""
+    conexion = _conexion_cola()
+    try:
+        conteos = dict(conexion.execute("SELECT estado, COUNT(*) FROM trabajos GROUP BY estado").fetchall())
+    finally:
+        conexion.close()
+    return {estado: conteos.get(estado, 0) for estado in ESTADOS_TRABAJO}
+
+
+def _tomar_trabajo(conexion, trabajador):
+    """Reserva el siguiente trabajo disponible de forma atómica (o None)"""
+    ahora = time.time()
+    abandonado = ahora - TIEMPO_MAXIMO_TRABAJO
+    conexion.execute("BEGIN IMMEDIATE")
+    try:
+        # Abandonados que ya agotaron sus intentos: se dan por fallidos
+        vencidos = conexion.execute("""
+            SELECT id, ruta FROM trabajos
+            WHERE estado = 'procesando' AND iniciado < ? AND intentos + 1 >= ?
+        """, (abandonado, MAX_INTENTOS)).fetchall()
+        conexion.execute("""
+            UPDATE trabajos SET estado = 'error', terminado = ?,
+                error = 'El trabajador se detuvo sin terminar'
+            WHERE estado = 'procesando' AND iniciado < ? AND intentos + 1 >= ?
+        """, (ahora, abandonado, MAX_INTENTOS))
+        fila = conexion.execute("""
+            SELECT * FROM trabajos
+            WHERE (estado = 'pendiente' AND disponible <= ?)
+               OR (estado = 'procesando' AND iniciado < ?)
+            ORDER BY id LIMIT 1
+        """, (ahora, abandonado)).fetchone()
+        if fila is not None and not _admitir_trabajo(conexion, fila, abandonado):
+            # Se respeta el orden: los siguientes también esperan
+            fila = None
+        if fila is not None:
+            # Retomar un trabajo abandonado cuenta como intento fallido
+            intentos = fila["intentos"] + (fila["estado"] == "procesando")
+            conexion.execute(
+                "UPDATE trabajos SET estado = 'procesando', intentos = ?, iniciado = ?, trabajador = ? WHERE id = ?",
+                (intentos, ahora, trabajador, fila["id"]))
+            fila = {**dict(fila), "intentos": intentos}
+        conexion.execute("COMMIT")
+    except BaseException:
+        conexion.execute("ROLLBACK")
+        raise
+    
+    for vencido in vencidos:
+        conexion.execute("UPDATE trabajos SET ruta = ? WHERE id = ?",
+                         (_apartar_fallido(vencido["ruta"]), vencido["id"]))
+    return fila
+
+
+def _apartar_fallido(ruta):
+    """
+    Mueve el archivo de un trabajo que terminó en error a COLA_DIR/fallidos y
+    retorna su ruta nueva (o la anterior si no se pudo mover). No se borra:
+    puede ser la única copia, los de las carpetas de entrada se movieron a la cola.
+    """
+    ruta = Path(ruta)
+    destino = COLA_DIR / "fallidos" / ruta.name
+    try:
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(ruta, destino)
+    except OSError:
+        return str(ruta)
+    return str(destino)
+
+
+def _admitir_trabajo(conexion, fila, abandonado):
+    """Si el trabajo entra en PRESUPUESTO_MEMORIA_MB junto con los que están en proceso"""
+    en_proceso, cantidad = conexion.execute("""
+        SELECT COALESCE(SUM(bytes), 0), COUNT(*) FROM trabajos
+        WHERE estado = 'procesando' AND iniciado >= ? AND id != ?
+    """, (abandonado, fila["id"])).fetchone()
+    return cantidad == 0 or en_proceso + (fila["bytes"] or 0) <= PRESUPUESTO_MEMORIA_MB * 1024 * 1024
+
+
+def procesar_archivo(ruta, nombre, tipo=None, trabajo=None):
+    """
+    Extracción -> clasificación -> guardado de un archivo en disco.
+    Retorna un dict con el resultado y los tiempos de cada paso.
+    Si la extracción falla se propaga la excepción (para reintentar);
+    lanza RuntimeError si no se pudo guardar.
+    """
+    archivo = ArchivoEnDisco(ruta, nombre, tipo)
+    
+    inicio = time.perf_counter()
+    if archivo.type == "application/pdf":
+        texto = _extraer_texto_pdf(archivo.ruta)
+    else:
+        texto = _extraer_texto_imagen(archivo.ruta)
+    t_extraccion = time.perf_counter() - inicio
+    
+    inicio = time.perf_counter()
+    categoria, confianza = clasificar_documento_inteligente(texto, nombre)
+    t_clasificacion = time.perf_counter() - inicio
+    
+    inicio = time.perf_counter()
+    success, doc_id, mensaje = save_document(archivo, texto, categoria, confianza, trabajo)
+    t_guardado = time.perf_counter() - inicio
+    if not success:
+        raise RuntimeError(mensaje)
+    
+    return {
+        "doc_id": doc_id,
+        "categoria": categoria,
+        "confianza": round(confianza, 2),
+        "t_extraccion": round(t_extraccion, 3),
+        "t_clasificacion": round(t_clasificacion, 3),
+        "t_guardado": round(t_guardado, 3),
+    }
+
+
+def _ejecutar_trabajo(conexion, trabajo):
+    """
+    Procesa un trabajo reservado y registra el resultado o el fallo.
+    El documento guarda el nombre del archivo en la cola (único aunque se
+    recree cola.db), así un trabajo retomado no se guarda dos veces.
+    """
+    try:
+        resultado = procesar_archivo(trabajo["ruta"], trabajo["nombre"], trabajo["tipo"],
+                                     trabajo=Path(trabajo["ruta"]).name)
+    except Exception as e:
+        intentos = trabajo["intentos"] + 1
+        if intentos < MAX_INTENTOS:
+            conexion.execute(
+                "UPDATE trabajos SET estado = 'pendiente', intentos = ?, error = ?, disponible = ? WHERE id = ?",
+                (intentos, str(e), time.time() + 2 ** intentos, trabajo["id"]))
+        else:
+            conexion.execute(
+                "UPDATE trabajos SET estado = 'error', intentos = ?, error = ?, terminado = ?, ruta = ? WHERE id = ?",
+                (intentos, str(e), time.time(), _apartar_fallido(trabajo["ruta"]), trabajo["id"]))
+        return False
+    
+    conexion.execute("""
+        UPDATE trabajos SET estado = 'completado', intentos = intentos + 1, error = NULL,
+            doc_id = :doc_id, categoria = :categoria, confianza = :confianza,
+            t_extraccion = :t_extraccion, t_clasificacion = :t_clasificacion,
+            t_guardado = :t_guardado, terminado = :terminado
+        WHERE id = :id
+    """, {**resultado, "terminado": time.time(), "id": trabajo["id"]})
+    
+    # El archivo ya quedó copiado en DOCS_DIR
+    try:
+        os.remove(trabajo["ruta"])
+    except OSError:
+        pass
+    return True
+
+
+def trabajador_cola(detener=None, espera=1.0, salir_si_vacia=False):
+    """
+    Bucle de un trabajador: toma trabajos pendientes y los procesa uno a uno.
+    `detener` es un threading/multiprocessing.Event opcional para terminar.
+    Retorna la cantidad de trabajos procesados.
+    """
+    nombre = f"{os.getpid()}-{threading.get_ident()}"
+    conexion = _conexion_cola()
+    procesados = 0
+    try:
+        while detener is None or not detener.is_set():
+            trabajo = _tomar_trabajo(conexion, nombre)
+            if trabajo is None:
+                if salir_si_vacia:
+                    break
+                time.sleep(espera)
+                continue
+            _ejecutar_trabajo(conexion, trabajo)
+            procesados += 1
+    finally:
+        conexion.close()
+    return procesados
+
+
+def iniciar_trabajadores(cantidad=None, salir_si_vacia=False):
+    """Lanza `cantidad` procesos trabajadores (por defecto uno por núcleo) y espera a que terminen"""
+    procesos = _lanzar_trabajadores(cantidad or os.cpu_count() or 1, salir_si_vacia=salir_si_vacia)
+    try:
+        for proceso in procesos:
+            proceso.join()
+    except KeyboardInterrupt:
+        for proceso in procesos:
+            proceso.terminate()
+
+
+def _lanzar_trabajadores(cantidad, salir_si_vacia=False, detener=None):
+    """Arranca `cantidad` procesos trabajadores y los retorna sin esperarlos"""
+    import multiprocessing
+    
+    procesos = [
+        multiprocessing.Process(target=_trabajador_en_proceso,
+                                args=(str(BASE_DIR), detener, salir_si_vacia),
+                                name=f"trabajador-{i + 1}", daemon=True)
+        for i in range(cantidad)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    return procesos
+
+
+def _trabajador_en_proceso(base_dir, detener, salir_si_vacia):
+    """Punto de entrada de un proceso trabajador: usa la misma carpeta de datos que quien lo lanzó"""
+    configurar_rutas(base_dir)
+    return trabajador_cola(detener=detener, salir_si_vacia=salir_si_vacia)
+
+
+_hilo_trabajador = {"hilo": None}
+_bloqueo_hilo_trabajador = threading.Lock()
+
+
+def iniciar_trabajador_en_hilo():
+    """
+    Arranca (una sola vez por proceso) un trabajador en un hilo de fondo,
+    para que la aplicación procese la cola aunque no haya trabajadores externos
+    """
+    with _bloqueo_hilo_trabajador:
+        hilo = _hilo_trabajador["hilo"]
+        if hilo is None or not hilo.is_alive():
+            hilo = threading.Thread(target=trabajador_cola, name="trabajador-cola", daemon=True)
+            hilo.start()
+            _hilo_trabajador["hilo"] = hilo
+    return hilo
+
+
+# ====================================
+# CARPETAS DE ENTRADA (INGESTA AUTOMÁTICA)
+# ====================================
+#
+# Los escáneres dejan archivos en carpetas compartidas. El vigilante los
+# detecta, espera a que terminen de escribirse (tamaño y fecha sin cambios
+# durante ESPERA_ESTABLE segundos) y los pasa en lotes a la cola de trabajos,
+# moviéndolos a COLA_DIR: lo que queda en la carpeta es lo que falta ingerir.
+#
+# Con watchdog instalado los cambios llegan como avisos del sistema (inotify
+# en Linux); si no, se revisa cada carpeta en cada vuelta, pero solo se lista
+# de nuevo cuando cambió su fecha de modificación.
+
+CARPETAS_ENTRADA = [BASE_DIR / "entrada"]
+EXTENSIONES_ENTRADA = {".pdf", ".jpg", ".jpeg", ".png"}
+# Segundos sin cambios para dar un archivo por terminado
+ESPERA_ESTABLE = 2.0
+# Archivos que se encolan juntos, en una sola transacción
+TAMAÑO_LOTE_ENTRADA = 50
+# Con tantos trabajos sin terminar en la cola se deja de encolar (los archivos esperan en su carpeta)
+MAX_PENDIENTES_COLA = 200
+# Cada cuánto se listan todas las carpetas aunque no haya avisos (por si se perdió alguno,
+# como pasa con carpetas de red, o la fecha de la carpeta no alcanzó a cambiar)
+REVISION_COMPLETA = 60.0
+
+
+def trabajos_en_curso():
+    """Trabajos pendientes o en proceso en la cola"""
+    conexion = _conexion_cola()
+    try:
+        return conexion.execute(
+            "SELECT COUNT(*) FROM trabajos WHERE estado IN ('pendiente', 'procesando')").fetchone()[0]
+    finally:
+        conexion.close()
+
+
+def encolar_archivos(rutas):
+    """
+    Mueve archivos ya escritos a la carpeta de la cola y los registra juntos.
+    Retorna {ruta: ID del trabajo}; los que no se pudieron mover (en uso,
+    sin permisos) se omiten y quedan donde estaban.
+    """
+    COLA_DIR.mkdir(parents=True, exist_ok=True)
+    movidos = []
+    for ruta in map(Path, rutas):
+        destino = COLA_DIR / f"{uuid.uuid4().hex}{ruta.suffix.lower()}"
+        try:
+            # En Windows falla mientras el escáner tenga el archivo abierto
+            shutil.move(ruta, destino)
+        except OSError:
+            continue
+        movidos.append((ruta, destino))
+    
+    if not movidos:
+        return {}
+    ids = _registrar_trabajos([(ruta.name, destino, None, destino.stat().st_size) for ruta, destino in movidos])
+    return {ruta: trabajo_id for (ruta, _), trabajo_id in zip(movidos, ids)}
+
+
+class VigilanteCarpetas:
+    """
+    Vigila carpetas de entrada y encola los archivos nuevos cuando dejan de cambiar.
+    `al_encolar(lote)` se llama con el {ruta: ID del trabajo} de cada lote encolado.
+    """
+    
+    def __init__(self, carpetas=None, espera_estable=None, tamaño_lote=None,
+                 max_pendientes=None, intervalo=1.0, al_encolar=None):
+        self.carpetas = [Path(carpeta) for carpeta in (carpetas or CARPETAS_ENTRADA)]
+        self.espera_estable = ESPERA_ESTABLE if espera_estable is None else espera_estable
+        self.tamaño_lote = tamaño_lote or TAMAÑO_LOTE_ENTRADA
+        self.max_pendientes = max_pendientes or MAX_PENDIENTES_COLA
+        self.intervalo = intervalo
+        self.al_encolar = al_encolar
+        self.encolados = 0
+        # ruta -> ((tamaño, mtime_ns), momento desde el que no cambia)
+        self._candidatos = {}
+        # Rutas avisadas (por el sistema o al listar) que aún no se revisaron
+        self._avisados = set()
+        self._bloqueo = threading.Lock()
+        self._fechas_carpetas = {}
+        self._observador = None
+    
+    @staticmethod
+    def admitido(nombre):
+        """Si un archivo se ingiere (descarta temporales y formatos no soportados)"""
+        return not nombre.startswith((".", "~")) and Path(nombre).suffix.lower() in EXTENSIONES_ENTRADA
+    
+    def avisar(self, ruta):
+        ruta = Path(ruta)
+        if self.admitido(ruta.name):
+            with self._bloqueo:
+                self._avisados.add(ruta)
+    
+    def listar(self, forzar=False):
+        """Avisa los archivos de las carpetas que cambiaron desde el último listado"""
+        for carpeta in self.carpetas:
+            try:
+                fecha = carpeta.stat().st_mtime_ns
+                if not forzar and self._fechas_carpetas.get(carpeta) == fecha:
+                    continue
+                with os.scandir(carpeta) as entradas:
+                    archivos = [Path(entrada.path) for entrada in entradas
+                                if entrada.is_file() and self.admitido(entrada.name)]
+            except OSError:
+                continue
+            self._fechas_carpetas[carpeta] = fecha
+            with self._bloqueo:
+                self._avisados.update(archivos)
+    
+    def revisar(self):
+        """
+        Encola un lote con los archivos que ya dejaron de cambiar, si la cola
+        tiene lugar. Retorna la cantidad encolada.
+        """
+        with self._bloqueo:
+            avisados, self._avisados = self._avisados, set()
+        for ruta in avisados:
+            self._candidatos.setdefault(ruta, None)
+        if not self._candidatos:
+            return 0
+        
+        # Contrapresión: con la cola llena no se revisa nada; los archivos esperan en su carpeta
+        lugar = min(self.tamaño_lote, self.max_pendientes - trabajos_en_curso())
+        if lugar <= 0:
+            return 0
+        
+        ahora = time.monotonic()
+        listos = []
+        for ruta, anterior in list(self._candidatos.items()):
+            try:
+                info = os.stat(ruta)
+            except OSError:
+                # Ya no está (lo movió otro vigilante o el usuario)
+                del self._candidatos[ruta]
+                continue
+            firma = (info.st_size, info.st_mtime_ns)
+            if anterior is None or anterior[0] != firma:
+                self._candidatos[ruta] = (firma, ahora)
+            elif info.st_size and ahora - anterior[1] >= self.espera_estable:
+                listos.append((anterior[1], ruta))
+        if not listos:
+            return 0
+        
+        # Primero los que llevan más tiempo terminados
+        lote = [ruta for _, ruta in sorted(listos)[:lugar]]
+        encolados = encolar_archivos(lote)
+        for ruta in encolados:
+            del self._candidatos[ruta]
+        self.encolados += len(encolados)
+        if encolados and self.al_encolar:
+            self.al_encolar(encolados)
+        return len(encolados)
+    
+    def _iniciar_observador(self):
+        """Avisos del sistema con watchdog, si está instalado (None si no)"""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return None
+        
+        vigilante = self
+        
+        class Manejador(FileSystemEventHandler):
+            def on_any_event(self, evento):
+                if not evento.is_directory:
+                    vigilante.avisar(os.fsdecode(getattr(evento, "dest_path", "") or evento.src_path))
+        
+        observador = Observer()
+        for carpeta in self.carpetas:
+            observador.schedule(Manejador(), str(carpeta), recursive=False)
+        observador.start()
+        return observador
+    
+    def ejecutar(self, detener=None):
+        """
+        Bucle del vigilante hasta que se active `detener` (threading.Event opcional).
+        Retorna la cantidad de archivos encolados.
+        """
+        detener = detener or threading.Event()
+        for carpeta in self.carpetas:
+            carpeta.mkdir(parents=True, exist_ok=True)
+        self._observador = self._iniciar_observador()
+        ultima_completa = None
+        try:
+            while not detener.is_set():
+                ahora = time.monotonic()
+                if ultima_completa is None or ahora - ultima_completa >= REVISION_COMPLETA:
+                    self.listar(forzar=True)
+                    ultima_completa = ahora
+                elif self._observador is None:
+                    self.listar()
+                # Un lote completo: puede haber más esperando
+                if self.revisar() < self.tamaño_lote:
+                    detener.wait(self.intervalo)
+        finally:
+            if self._observador is not None:
+                self._observador.stop()
+                self._observador.join()
+                self._observador = None
+        return self.encolados
+
+
+def vigilar_carpetas(carpetas=None, trabajadores=None, detener=None, **opciones):
+    """
+    Servicio de ingesta automática: vigila las carpetas de entrada y procesa
+    lo que encola con `trabajadores` procesos (por defecto uno por núcleo;
+    0 si los trabajadores corren aparte). Retorna la cantidad de archivos encolados.
+    """
+    import multiprocessing
+    
+    if trabajadores is None:
+        trabajadores = os.cpu_count() or 1
+    fin_trabajadores = multiprocessing.Event()
+    # Los trabajadores se lanzan antes de que existan los hilos del vigilante
+    procesos = _lanzar_trabajadores(trabajadores, detener=fin_trabajadores)
+    try:
+        return VigilanteCarpetas(carpetas, **opciones).ejecutar(detener)
+    finally:
+        # Terminan el trabajo en curso y salen
+        fin_trabajadores.set()
+        for proceso in procesos:
+            proceso.join(timeout=TIEMPO_MAXIMO_TRABAJO)
+            if proceso.is_alive():
+                proceso.terminate()
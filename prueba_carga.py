@@ -0,0 +1,374 @@
+"""
+Prueba de carga de Doc Finder: muchos usuarios a la vez subiendo documentos,
+buscando (simple e IA) y abriendo el panel, sobre un corpus sintético.
+
+Los usuarios son hilos repartidos en varios procesos, como las sesiones de
+Streamlit (hilos de un mismo servidor) y los trabajadores de la cola
+(procesos aparte), todos sobre la misma carpeta de datos. Al terminar se
+reportan rendimiento, latencias y errores por operación, y se verifica
+la integridad del índice (IDs duplicados, registros perdidos, índice
+binario y particiones al día).
+
+Por defecto el índice se reparte en particiones, así cada proceso tiene
+varios hilos consultando a sus propios trabajadores de partición. Una
+operación que tarda más de `limite_operacion` cuenta como error; si no
+termina, el usuario se abandona y el reporte la marca como atascada.
+
+Uso (ver también `python cli.py carga -h`):
+    python cli.py carga --usuarios 20 --procesos 4 --duracion 30
+"""
+import io
+import multiprocessing
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import doc_utils as du
+
+# ====================================
+# CONFIGURACIÓN
+# ====================================
+
+# Peso de cada operación en la mezcla (proporción de veces que un usuario la elige)
+MEZCLA_PREDETERMINADA = {"subida": 1, "busqueda": 5, "ia": 2, "panel": 2}
+
+# Resultados que "mira" un usuario después de buscar (campos y fragmentos)
+RESULTADOS_VISTOS = 10
+
+# Mensajes de error distintos que se guardan por operación
+MAX_MENSAJES_ERROR = 5
+
+# Segundos que puede tardar una operación antes de contarse como error
+LIMITE_OPERACION = 60.0
+# Margen para que un proceso arranque y entregue sus resultados
+MARGEN_PROCESO = 30.0
+
+PALABRAS_RELLENO = [
+    "el", "de", "la", "que", "en", "los", "se", "del", "por", "con", "para", "una",
+    "documento", "fecha", "número", "nombre", "dirección", "según", "artículo", "página",
+    "municipal", "nacional", "oficina", "registro", "servicio", "solicitud", "año",
+]
+
+CONSULTAS_IA = [
+    "busca {palabra}", "dame {categoria} de {año}", "documentos de {categoria} pdf",
+    "muestra {palabra} de {mes}", "{categoria} con {palabra}", "busca imágenes de {palabra}",
+]
+
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+         "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+
+# ====================================
+# CORPUS SINTÉTICO
+# ====================================
+
+class ArchivoSintetico(io.BytesIO):
+    """Archivo subido en memoria (name, size, type, getbuffer) como los de Streamlit"""
+    
+    def __init__(self, nombre, contenido):
+        super().__init__(contenido)
+        self.name = nombre
+        self.size = len(contenido)
+        self.type = "application/pdf" if nombre.endswith(".pdf") else "image/png"
+
+
+def _vocabulario():
+    return [palabra for palabras in du.PALABRAS_CLAVE.values() for palabra in palabras]
+
+
+def texto_sintetico(rnd, paginas=2, palabras_por_pagina=120):
+    """Texto de un documento: palabras clave de una categoría al azar mezcladas con relleno"""
+    claves = rnd.choice(list(du.PALABRAS_CLAVE.values()))
+    vocabulario = _vocabulario()
+    return du.SEPARADOR_PAGINA.join(
+        " ".join(rnd.choice(claves) if rnd.random() < 0.15
+                 else rnd.choice(vocabulario) if rnd.random() < 0.1
+                 else rnd.choice(PALABRAS_RELLENO)
+                 for _ in range(palabras_por_pagina))
+        for _ in range(paginas))
+
+
+def subir_sintetico(rnd):
+    """
+    Sube un documento sintético como lo hace un trabajador de la cola después del
+    OCR (clasificar y guardar). Retorna el ID asignado; lanza RuntimeError si falla.
+    """
+    texto = texto_sintetico(rnd, paginas=rnd.randint(1, 4))
+    extension = rnd.choice([".pdf", ".pdf", ".png"])
+    nombre = f"{rnd.choice(_vocabulario())}_{rnd.randrange(10 ** 6):06d}{extension}"
+    categoria, confianza = du.clasificar_documento_inteligente(texto, nombre)
+    archivo = ArchivoSintetico(nombre, os.urandom(rnd.randint(2, 64) * 1024))
+    success, doc_id, mensaje = du.save_document(archivo, texto, categoria, confianza)
+    if not success:
+        raise RuntimeError(mensaje)
+    return doc_id
+
+
+def generar_corpus(cantidad, semilla=0):
+    """Agrega `cantidad` documentos sintéticos al índice actual"""
+    rnd = random.Random(semilla)
+    for _ in range(cantidad):
+        subir_sintetico(rnd)
+
+
+# ====================================
+# OPERACIONES DE UN USUARIO
+# ====================================
+
+def _ver_resultados(resultados):
+    """Lo que hace la página al mostrar resultados: leer campos y armar fragmentos"""
+    return [(doc["nombre_original"], doc["categoria"], doc["fecha_subida"], doc["fragmentos"])
+            for doc in resultados[:RESULTADOS_VISTOS]]
+
+
+def operacion_busqueda(rnd):
+    consulta = " ".join(rnd.sample(_vocabulario(), rnd.randint(1, 2)))
+    _ver_resultados(du.search_documents(consulta))
+
+
+def operacion_ia(rnd):
+    consulta = rnd.choice(CONSULTAS_IA).format(
+        palabra=rnd.choice(_vocabulario()), categoria=rnd.choice(du.CATEGORIAS).lower(),
+        año=rnd.randint(2020, 2026), mes=rnd.choice(MESES))
+    _, resultados = du.buscar_documentos_ia(consulta)
+    _ver_resultados(resultados)
+
+
+def operacion_panel(rnd):
+    """Lo que calcula el Dashboard en cada recarga"""
+    estadisticas = du.get_statistics()
+    panel = du.resumen_panel()
+    return (estadisticas, panel["subidos_hoy"],
+            [(doc["nombre_original"], doc["texto_extraido"]) for doc in panel["recientes"]])
+
+
+OPERACIONES = {
+    "subida": subir_sintetico,
+    "busqueda": operacion_busqueda,
+    "ia": operacion_ia,
+    "panel": operacion_panel,
+}
+
+
+def _usuario(rnd, mezcla, inicio, fin, pausa, limite, resultado, bloqueo):
+    """
+    Bucle de un usuario virtual: elige operaciones según la mezcla hasta `fin`.
+    Mientras corre una operación queda anotada en resultado["en_curso"].
+    """
+    nombres = list(mezcla)
+    pesos = [mezcla[nombre] for nombre in nombres]
+    hilo = threading.current_thread().name
+    time.sleep(max(0.0, inicio - time.time()))
+    while time.time() < fin:
+        nombre = rnd.choices(nombres, pesos)[0]
+        with bloqueo:
+            resultado["en_curso"][hilo] = nombre
+        comienzo = time.perf_counter()
+        valor, error = None, None
+        try:
+            valor = OPERACIONES[nombre](rnd)  # ID asignado, en las subidas
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:200]
+        duracion = time.perf_counter() - comienzo
+        if error is None and duracion > limite:
+            error = f"Superó el límite de {limite:g} s"
+        with bloqueo:
+            del resultado["en_curso"][hilo]
+            # Una subida lenta igual quedó guardada: cuenta para la integridad
+            if nombre == "subida" and valor is not None:
+                resultado["ids"].append(valor)
+            if error is None:
+                resultado["latencias"][nombre].append(duracion)
+            else:
+                resultado["errores"][nombre][error] += 1
+        if pausa:
+            time.sleep(rnd.uniform(0, 2 * pausa))
+
+
+def _proceso_carga(salida, numero, base_dir, usuarios, mezcla, inicio, fin, pausa, limite, semilla):
+    """
+    Corre `usuarios` hilos en este proceso y pone (numero, resultado) en la
+    cola `salida`: latencias, errores e IDs subidos. Los hilos que siguen en
+    una operación pasado `fin + limite` se abandonan y esa operación cuenta
+    como error.
+    """
+    du.configurar_rutas(base_dir)
+    resultado = {
+        "latencias": {nombre: [] for nombre in mezcla},
+        "errores": {nombre: Counter() for nombre in mezcla},
+        "ids": [],
+        "en_curso": {},
+    }
+    bloqueo = threading.Lock()
+    hilos = [
+        threading.Thread(target=_usuario, name=f"usuario-{i}", daemon=True,
+                         args=(random.Random(semilla * 1000 + i), mezcla, inicio, fin, pausa, limite,
+                               resultado, bloqueo))
+        for i in range(usuarios)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    plazo = fin + limite + 2 * pausa
+    for hilo in hilos:
+        hilo.join(max(0.0, plazo - time.time()))
+    
+    # Copia: los hilos abandonados pueden seguir escribiendo mientras se envía
+    with bloqueo:
+        atascadas = list(resultado["en_curso"].values())
+        entrega = {
+            "latencias": {nombre: list(latencias) for nombre, latencias in resultado["latencias"].items()},
+            "errores": {nombre: Counter(errores) for nombre, errores in resultado["errores"].items()},
+            "ids": list(resultado["ids"]),
+        }
+    for nombre in atascadas:
+        entrega["errores"][nombre][f"Sin terminar después de {limite:g} s"] += 1
+    salida.put((numero, entrega))
+    # Un hilo atascado puede tener tomado el bloqueo del coordinador
+    if not atascadas:
+        du.detener_coordinador()
+
+
+# ====================================
+# REPORTE E INTEGRIDAD
+# ====================================
+
+def percentil(ordenados, p):
+    """Percentil p (0-100) de una lista ya ordenada, por rango más cercano"""
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+
+def verificar_integridad(iniciales, subidos):
+    """
+    Compara el índice con lo esperado: los IDs que había al empezar más los que
+    se informaron como subidos. Retorna un dict con los problemas encontrados
+    ("ok" es True si no hay ninguno).
+    """
+    index = du.load_index()
+    ids = [doc["id"] for doc in index["documentos"]]
+    conteo = Counter(ids)
+    presentes = set(ids)
+    esperados = set(iniciales) | set(subidos)
+    
+    tabla = du.cargar_tabla()
+    ids_tabla = [doc["id"] for doc in tabla]
+    filas_particiones = [len(du.cargar_tabla(particion)) for particion in du.particiones_vigentes()]
+    
+    problemas = {
+        "ids_duplicados": sorted(doc_id for doc_id, veces in conteo.items() if veces > 1),
+        "ids_asignados_dos_veces": sorted(doc_id for doc_id, veces in Counter(subidos).items() if veces > 1),
+        "registros_perdidos": sorted(esperados - presentes),
+        "registros_inesperados": sorted(presentes - esperados),
+        "ultimo_id_atrasado": bool(ids) and index["ultimo_id"] < max(ids),
+        "archivos_faltantes": [doc["id"] for doc in index["documentos"] if not Path(doc["ruta"]).exists()],
+        "indice_binario_distinto": ids_tabla != sorted(ids),
+        "particiones_incompletas": bool(filas_particiones) and sum(filas_particiones) != len(ids),
+    }
+    return {
+        "documentos": len(ids),
+        "esperados": len(esperados),
+        **problemas,
+        "ok": not any(problemas.values()),
+    }
+
+
+def ejecutar_prueba_carga(usuarios=8, procesos=2, duracion=30.0, corpus=200, mezcla=None,
+                          pausa=0.0, datos=None, particiones=2, semilla=0, limite_operacion=LIMITE_OPERACION):
+    """
+    Corre la prueba de carga y retorna el reporte como dict.
+    `datos` es la carpeta de datos (por defecto una temporal nueva); el corpus
+    sintético solo se genera si está vacía, para no mezclarlo con documentos reales.
+    Un proceso que no entrega sus resultados a tiempo se termina y cuenta
+    en "procesos_sin_respuesta" (y en el total de errores).
+    """
+    mezcla = {nombre: peso for nombre, peso in (mezcla or MEZCLA_PREDETERMINADA).items() if peso > 0}
+    desconocidas = set(mezcla) - set(OPERACIONES)
+    if desconocidas:
+        raise ValueError(f"Operaciones desconocidas: {', '.join(sorted(desconocidas))}")
+    procesos = max(1, min(procesos, usuarios))
+    
+    datos = Path(datos or tempfile.mkdtemp(prefix="doc_finder_carga_"))
+    du.configurar_rutas(datos)
+    du.init_storage()
+    if not du.load_index()["documentos"]:
+        generar_corpus(corpus, semilla)
+    # En una carpeta real la cantidad de particiones se deja como estaba
+    cantidad_original = du.leer_config_particiones()["cantidad"]
+    if particiones != cantidad_original:
+        du.configurar_particiones(particiones)
+    try:
+        iniciales = [doc["id"] for doc in du.load_index()["documentos"]]
+        
+        # Todos los procesos empiezan a la vez, cuando ya arrancaron
+        inicio = time.time() + 2.0
+        fin = inicio + duracion
+        reparto = [usuarios // procesos + (i < usuarios % procesos) for i in range(procesos)]
+        salida = multiprocessing.Queue()
+        trabajadores = [
+            multiprocessing.Process(target=_proceso_carga, name=f"carga-{i + 1}",
+                                    args=(salida, i, str(datos), cantidad, mezcla, inicio, fin, pausa,
+                                          limite_operacion, semilla * 100 + i))
+            for i, cantidad in enumerate(reparto)
+        ]
+        for trabajador in trabajadores:
+            trabajador.start()
+        
+        resultados = {}
+        plazo = fin + limite_operacion + 2 * pausa + MARGEN_PROCESO
+        while len(resultados) < len(trabajadores):
+            try:
+                numero, resultado = salida.get(timeout=1.0)
+                resultados[numero] = resultado
+            except queue.Empty:
+                if time.time() > plazo or not any(trabajador.is_alive() for trabajador in trabajadores):
+                    break
+        transcurrido = time.time() - inicio
+        for trabajador in trabajadores:
+            trabajador.join(timeout=5)
+            if trabajador.is_alive():
+                trabajador.terminate()
+                trabajador.join()
+        sin_respuesta = len(trabajadores) - len(resultados)
+        resultados = list(resultados.values())
+        
+        operaciones = {}
+        for nombre in mezcla:
+            latencias = sorted(l for r in resultados for l in r["latencias"][nombre])
+            errores = sum((r["errores"][nombre] for r in resultados), Counter())
+            operaciones[nombre] = {
+                "completadas": len(latencias),
+                "errores": sum(errores.values()),
+                "por_segundo": round(len(latencias) / transcurrido, 2),
+                "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+                "p90_ms": round(percentil(latencias, 90) * 1000, 2),
+                "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+                "max_ms": round(latencias[-1] * 1000, 2) if latencias else 0.0,
+                "mensajes_error": dict(errores.most_common(MAX_MENSAJES_ERROR)),
+            }
+        subidos = [doc_id for r in resultados for doc_id in r["ids"]]
+        
+        return {
+            "datos": str(datos),
+            "usuarios": usuarios,
+            "procesos": procesos,
+            "duracion_s": round(transcurrido, 2),
+            "mezcla": mezcla,
+            "particiones": particiones,
+            "documentos_iniciales": len(iniciales),
+            "total_por_segundo": round(sum(op["completadas"] for op in operaciones.values()) / transcurrido, 2),
+            "limite_operacion_s": limite_operacion,
+            "procesos_sin_respuesta": sin_respuesta,
+            "total_errores": sum(op["errores"] for op in operaciones.values()) + sin_respuesta,
+            "operaciones": operaciones,
+            "integridad": verificar_integridad(iniciales, subidos),
+        }
+    finally:
+        du.detener_coordinador()
+        if particiones != cantidad_original:
+            du.configurar_particiones(cantidad_original)
@@ -0,0 +1,42 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import doc_utils
+
+
+class ArchivoPrueba(io.BytesIO):
+    """Archivo subido de mentira (como el de st.file_uploader)"""
+    
+    def __init__(self, nombre, contenido=b"contenido de prueba", tipo="application/pdf"):
+        super().__init__(contenido)
+        self.name = nombre
+        self.size = len(contenido)
+        self.type = tipo
+
+
+@pytest.fixture
+def datos(tmp_path):
+    """Carpeta de datos temporal; al terminar se vuelve a la original"""
+    anterior = doc_utils.BASE_DIR
+    doc_utils.configurar_rutas(tmp_path)
+    doc_utils.init_storage()
+    doc_utils.incrementar_generacion()
+    yield tmp_path
+    doc_utils.detener_coordinador()
+    doc_utils.configurar_rutas(anterior)
+    doc_utils.incrementar_generacion()
+
+
+@pytest.fixture
+def agregar(datos):
+    """Guarda un documento con el texto dado y retorna su ID"""
+    def agregar(nombre, texto, categoria="Factura", confianza=0.9):
+        exito, doc_id, mensaje = doc_utils.save_document(ArchivoPrueba(nombre), texto, categoria, confianza)
+        assert exito, mensaje
+        return doc_id
+    return agregar
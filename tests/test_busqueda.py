@@ -0,0 +1,178 @@
+import time
+
+import pytest
+
+import doc_utils
+from doc_utils import contiene_frase, search_documents
+
+
+def _ids(resultados):
+    return sorted(doc["id"] for doc in resultados)
+
+
+def _juegos_libres():
+    return [len(juego["procesos"]) for juego in doc_utils._coordinador["libres"]]
+
+
+def test_frase_en_texto_completo(datos, agregar):
+    relleno = " ".join(["palabra"] * 200)
+    uno = agregar("uno.pdf", f"{relleno}\f{relleno} total a pagar: 1500 pesos")
+    dos = agregar("dos.pdf", f"{relleno} total\na pagar")
+    tres = agregar("tres.pdf", f"el total. pagar a plazo {relleno}")
+    
+    assert _ids(search_documents("total a pagar")) == [uno]
+    assert _ids(search_documents("otal a pag")) == [uno]
+    assert _ids(search_documents("a plazo")) == [tres]
+    assert _ids(search_documents("palabra total")) == [uno, dos]
+    assert len(search_documents("pagar total")) == 0
+    
+    assert contiene_frase(uno, ["total", "a", "pagar"])
+    assert not contiene_frase(dos, ["total", "a", "pagar"])
+    assert not contiene_frase(uno, ["pesos", "palabra"])
+
+
+def test_frase_sin_texto_completo(datos, agregar):
+    doc_id = agregar("viejo.pdf", "Recibo de pago del mes de marzo")
+    doc_utils._ruta_texto(doc_id).unlink()
+    
+    assert _ids(search_documents("pago del mes")) == [doc_id]
+    assert _ids(search_documents("mes de abril")) == []
+    assert contiene_frase(doc_id, ["de", "pago"], respaldo="Recibo de pago")
+
+
+def _corpus(agregar):
+    textos = [
+        ("factura_luz.pdf", "Factura de luz. Total a pagar 1500 pesos", "Factura"),
+        ("contrato_alquiler.pdf", "Contrato de alquiler entre las partes", "Contrato"),
+        ("recibo.pdf", "Recibo de pago de la factura de agua", "Recibo"),
+        ("informe.pdf", "Informe anual de la empresa, total de ventas", "Informe"),
+        ("cv.pdf", "Curriculum: experiencia en facturación", "Currículum / Hoja de vida"),
+        ("factura_gas.pdf", "Factura de gas del mes de marzo", "Factura"),
+        ("nota.pdf", "Nota sin nada en especial", "Otros"),
+    ]
+    for nombre, texto, categoria in textos:
+        agregar(nombre, texto, categoria=categoria)
+
+
+CONSULTAS = ["factura", "de la", "total", "pago de la", "contrato", "marzo", "nada que ver"]
+CONSULTAS_IA = ["facturas de marzo", "contratos", "documentos con total"]
+
+
+def _todas():
+    simples = {consulta: [(doc["id"], doc["relevancia"]) for doc in doc_utils.search_documents(consulta)]
+               for consulta in CONSULTAS}
+    ia = {consulta: [(doc["id"], doc["relevancia"]) for doc in doc_utils.buscar_documentos_ia(consulta)[1]]
+          for consulta in CONSULTAS_IA}
+    estadisticas = doc_utils.get_statistics()
+    return simples, ia, estadisticas
+
+
+def test_particionada_igual_que_una_tabla(datos, agregar):
+    _corpus(agregar)
+    esperado = _todas()
+    
+    doc_utils.configurar_particiones(3)
+    doc_utils._cache_consultas.limpiar()
+    assert _todas() == esperado
+    assert _juegos_libres() == [3]
+    
+    # Un documento nuevo llega a su partición
+    nuevo = agregar("factura_agua.pdf", "Factura de agua", categoria="Factura")
+    assert nuevo in [doc["id"] for doc in doc_utils.search_documents("factura")]
+
+
+def test_particiones_desde_varios_hilos(datos, agregar):
+    from concurrent.futures import ThreadPoolExecutor
+    
+    _corpus(agregar)
+    esperado = {consulta: [doc["id"] for doc in doc_utils.search_documents(consulta)] for consulta in CONSULTAS}
+    doc_utils.configurar_particiones(2)
+    
+    def buscar(numero):
+        consulta = CONSULTAS[numero % len(CONSULTAS)]
+        # Sin caché, para que cada búsqueda vaya a las particiones
+        return consulta, [doc["id"] for doc in doc_utils._buscar_en_particiones("simple", consulta, consulta.split())]
+    
+    with ThreadPoolExecutor(max_workers=8) as hilos:
+        respuestas = list(hilos.map(buscar, range(40), timeout=120))
+    
+    assert all(ids == esperado[consulta] for consulta, ids in respuestas)
+    # Varios juegos a la vez, nunca más que JUEGOS_PARTICIONES
+    assert 1 <= len(_juegos_libres()) <= doc_utils.JUEGOS_PARTICIONES
+    assert set(_juegos_libres()) == {2}
+    assert doc_utils._coordinador["en_uso"] == 0
+
+
+def test_sin_respuesta_de_particiones_busca_local(datos, agregar, monkeypatch):
+    _corpus(agregar)
+    esperado = [doc["id"] for doc in doc_utils.search_documents("factura")]
+    doc_utils.configurar_particiones(2)
+    doc_utils._cache_consultas.limpiar()
+    
+    # Los trabajadores recién lanzados no llegan a responder a tiempo
+    monkeypatch.setattr(doc_utils, "TIEMPO_MAXIMO_PARTICIONES", 0)
+    assert [doc["id"] for doc in doc_utils.search_documents("factura")] == esperado
+    assert _juegos_libres() == []
+    
+    monkeypatch.setattr(doc_utils, "TIEMPO_MAXIMO_PARTICIONES", 60)
+    doc_utils._cache_consultas.limpiar()
+    assert [doc["id"] for doc in doc_utils.search_documents("factura")] == esperado
+    assert _juegos_libres() == [2]
+
+
+def test_consulta_vacia_devuelve_todo(datos, agregar):
+    _corpus(agregar)
+    
+    for consulta in ("", "   "):
+        resultados = doc_utils.search_documents(consulta)
+        assert sorted(doc["id"] for doc in resultados) == list(range(1, 8))
+    
+    doc_utils.configurar_particiones(2)
+    doc_utils._cache_consultas.limpiar()
+    assert len(doc_utils.search_documents("   ")) == 7
+
+
+def test_consulta_ocupada_no_frena_a_las_demas(datos, agregar, monkeypatch):
+    _corpus(agregar)
+    esperado = _ids(search_documents("factura"))
+    doc_utils.configurar_particiones(2)
+    config = doc_utils.leer_config_particiones()
+    monkeypatch.setattr(doc_utils, "JUEGOS_PARTICIONES", 2)
+    
+    # Un juego tomado por una consulta que no termina
+    ocupados = [doc_utils._tomar_juego(config, time.monotonic() + 60)]
+    try:
+        assert _ids(doc_utils._buscar_en_particiones("simple", "factura", ["factura"])) == esperado
+        
+        # Con todos los juegos en uso se espera hasta el límite y no más
+        ocupados.append(doc_utils._tomar_juego(config, time.monotonic() + 60))
+        monkeypatch.setattr(doc_utils, "TIEMPO_MAXIMO_PARTICIONES", 0.2)
+        inicio = time.monotonic()
+        with pytest.raises(TimeoutError):
+            doc_utils._buscar_en_particiones("simple", "factura", ["factura"])
+        assert time.monotonic() - inicio < 5
+        doc_utils._cache_consultas.limpiar()
+        assert _ids(search_documents("factura")) == esperado
+    finally:
+        for juego in ocupados:
+            doc_utils._devolver_juego(juego)
+    assert doc_utils._coordinador["en_uso"] == 0
+    assert _juegos_libres() == [2, 2]
+
+
+def test_error_en_particion_busca_local(datos, agregar, monkeypatch):
+    _corpus(agregar)
+    esperado = _todas()
+    doc_utils.configurar_particiones(2)
+    
+    # El error de un trabajador llega como RuntimeError y el juego sigue sirviendo
+    with pytest.raises(RuntimeError, match="Operación desconocida"):
+        doc_utils._consultar_particiones("otra", ("factura", None))
+    assert _juegos_libres() == [2]
+    
+    def falla(operacion, argumento=None):
+        raise RuntimeError("Error en una partición: ValueError: dañada")
+    
+    monkeypatch.setattr(doc_utils, "_consultar_particiones", falla)
+    doc_utils._cache_consultas.limpiar()
+    assert _todas() == esperado
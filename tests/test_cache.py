@@ -0,0 +1,139 @@
+import json
+import os
+
+import pytest
+
+import doc_utils
+from doc_utils import CacheConsultas, buscar_documentos_ia, generacion_indice, search_documents
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Caché de consultas vacía para el test"""
+    nueva = CacheConsultas()
+    monkeypatch.setattr(doc_utils, "_cache_consultas", nueva)
+    return nueva
+
+
+def _ids(resultados):
+    return [doc["id"] for doc in resultados]
+
+
+def test_consulta_repetida_normalizada(datos, agregar, cache):
+    agregar("factura_luz.pdf", "Factura de luz")
+    
+    primera = search_documents("Factura")
+    assert search_documents("  FACTURA ") is primera
+    
+    metricas = cache.metricas()
+    assert (metricas["aciertos"], metricas["fallos"], metricas["entradas"]) == (1, 1, 1)
+
+
+def test_save_document_invalida(datos, agregar, cache):
+    uno = agregar("factura_luz.pdf", "Factura de luz")
+    assert _ids(search_documents("factura")) == [uno]
+    
+    dos = agregar("factura_gas.pdf", "Factura de gas")
+    assert _ids(search_documents("factura")) == [uno, dos]
+    
+    metricas = cache.metricas()
+    assert metricas["aciertos"] == 0
+    assert metricas["invalidadas"] == 1
+    assert metricas["generacion"] == generacion_indice()
+
+
+def test_cambio_externo_de_index_invalida(datos, agregar, cache):
+    uno = agregar("factura_luz.pdf", "Factura de luz")
+    dos = agregar("factura_gas.pdf", "Factura de gas")
+    assert _ids(search_documents("factura")) == [uno, dos]
+    generacion = generacion_indice()
+    
+    # Otro proceso (un trabajador, la CLI) borra un documento de index.json
+    with open(doc_utils.INDEX_FILE, encoding="utf-8") as f:
+        indice = json.load(f)
+    indice["documentos"] = [doc for doc in indice["documentos"] if doc["id"] != dos]
+    with open(doc_utils.INDEX_FILE, "w", encoding="utf-8") as f:
+        json.dump(indice, f)
+    
+    assert generacion_indice() > generacion
+    assert _ids(search_documents("factura")) == [uno]
+    assert cache.metricas()["aciertos"] == 0
+
+
+def test_generacion_estable_hasta_que_cambia_index(datos, agregar, cache):
+    agregar("factura_luz.pdf", "Factura de luz")
+    primera = search_documents("factura")
+    
+    # Tocar el archivo (otra fecha, mismo contenido) ya cuenta como cambio
+    info = os.stat(doc_utils.INDEX_FILE)
+    os.utime(doc_utils.INDEX_FILE, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000))
+    assert search_documents("factura") is not primera
+    
+    # Sin cambios la generación se mantiene y la consulta sale de la caché
+    segunda = search_documents("factura")
+    assert search_documents("factura") is segunda
+
+
+def test_descarta_la_menos_usada():
+    cache = CacheConsultas(capacidad=2)
+    cache.guardar("a", 1, "A")
+    cache.guardar("b", 1, "B")
+    assert cache.obtener("a", 1) == "A"
+    
+    # "b" es la menos usada desde que se leyó "a"
+    cache.guardar("c", 1, "C")
+    assert cache.obtener("b", 1) is None
+    assert cache.obtener("a", 1) == "A"
+    assert cache.obtener("c", 1) == "C"
+    
+    cache.guardar("d", 1, "D")
+    assert cache.obtener("a", 1) is None
+    assert cache.metricas()["descartadas"] == 2
+
+
+def test_metricas_y_generaciones():
+    cache = CacheConsultas(capacidad=4)
+    cache.guardar("a", 1, "A")
+    cache.guardar("b", 1, "B")
+    assert cache.obtener("a", 1) == "A"
+    assert cache.obtener("x", 1) is None
+    
+    # Generación nueva: se invalida todo
+    assert cache.obtener("a", 2) is None
+    # Un resultado calculado con la generación anterior ya no se guarda ni se lee
+    cache.guardar("b", 1, "B")
+    assert cache.obtener("b", 1) is None
+    
+    assert cache.metricas() == {
+        "consultas": 4,
+        "aciertos": 1,
+        "fallos": 3,
+        "tasa_aciertos": 0.25,
+        "entradas": 0,
+        "capacidad": 4,
+        "invalidadas": 2,
+        "descartadas": 0,
+        "generacion": 2,
+    }
+    
+    cache.guardar("c", 2, "C")
+    cache.limpiar()
+    assert cache.metricas()["invalidadas"] == 3
+    assert cache.obtener("c", 2) is None
+
+
+def test_clave_ia_por_parametros_interpretados(datos, agregar, cache):
+    agregar("factura_marzo.pdf", "Factura de marzo")
+    
+    parametros, primera = buscar_documentos_ia("facturas de marzo")
+    # Redactadas distinto, piden lo mismo: comparten entrada
+    for consulta in ("Busca las facturas de marzo", "FACTURAS  de   marzo"):
+        otros, resultados = buscar_documentos_ia(consulta)
+        assert otros == parametros
+        assert resultados is primera
+    
+    # Otra palabra clave es otra búsqueda
+    assert buscar_documentos_ia("mostrar facturas de marzo")[1] is not primera
+    
+    metricas = cache.metricas()
+    assert (metricas["aciertos"], metricas["fallos"], metricas["entradas"]) == (2, 2, 2)
@@ -0,0 +1,145 @@
+import pytest
+
+import doc_utils
+from doc_utils import encolar_documento, estado_trabajos, load_index, trabajador_cola
+
+from conftest import ArchivoPrueba
+
+
+def _pdf(texto):
+    fitz = pytest.importorskip("fitz")
+    documento = fitz.open()
+    documento.new_page().insert_text((72, 72), texto)
+    datos = documento.tobytes()
+    documento.close()
+    return datos
+
+
+def _liberar_esperas():
+    """Los reintentos esperan 2, 4... segundos: se adelantan para no dormir en el test"""
+    conexion = doc_utils._conexion_cola()
+    try:
+        conexion.execute("UPDATE trabajos SET disponible = 0 WHERE estado = 'pendiente'")
+    finally:
+        conexion.close()
+
+
+def test_falla_de_extraccion_se_reintenta_y_termina_en_error(datos):
+    trabajo_id = encolar_documento(ArchivoPrueba("roto.pdf", b"esto no es un pdf"))
+    
+    trabajador_cola(salir_si_vacia=True)
+    trabajo, = estado_trabajos([trabajo_id])
+    assert trabajo["estado"] == "pendiente"
+    assert trabajo["intentos"] == 1
+    assert trabajo["error"]
+    
+    for _ in range(doc_utils.MAX_INTENTOS - 1):
+        _liberar_esperas()
+        trabajador_cola(salir_si_vacia=True)
+    
+    trabajo, = estado_trabajos([trabajo_id])
+    assert trabajo["estado"] == "error"
+    assert trabajo["intentos"] == doc_utils.MAX_INTENTOS
+    assert trabajo["doc_id"] is None
+    assert load_index()["documentos"] == []
+    
+    # El archivo sale de la cola y queda apartado para revisarlo
+    assert [ruta.name for ruta in doc_utils.COLA_DIR.glob("*.pdf")] == []
+    apartado = doc_utils.Path(trabajo["ruta"])
+    assert apartado.parent == doc_utils.COLA_DIR / "fallidos"
+    assert apartado.read_bytes() == b"esto no es un pdf"
+
+
+def test_trabajo_completado(datos):
+    trabajo_id = encolar_documento(ArchivoPrueba("factura.pdf", _pdf("Factura total a pagar")))
+    
+    assert trabajador_cola(salir_si_vacia=True) == 1
+    
+    trabajo, = estado_trabajos([trabajo_id])
+    assert trabajo["estado"] == "completado"
+    documento, = load_index()["documentos"]
+    assert documento["id"] == trabajo["doc_id"]
+    assert "Factura" in documento["texto_extraido"]
+    assert doc_utils.resumen_cola()["pendiente"] == 0
+
+
+def test_trabajo_retomado_no_duplica(datos):
+    trabajo_id = encolar_documento(ArchivoPrueba("contrato.pdf", _pdf("Contrato entre las partes")))
+    
+    # El trabajador guarda el documento y se cae antes de marcarlo completado
+    conexion = doc_utils._conexion_cola()
+    try:
+        trabajo = doc_utils._tomar_trabajo(conexion, "caido")
+        resultado = doc_utils.procesar_archivo(trabajo["ruta"], trabajo["nombre"], trabajo["tipo"],
+                                               trabajo=doc_utils.Path(trabajo["ruta"]).name)
+        conexion.execute("UPDATE trabajos SET iniciado = 0 WHERE id = ?", (trabajo_id,))
+    finally:
+        conexion.close()
+    
+    assert trabajador_cola(salir_si_vacia=True) == 1
+    
+    trabajo, = estado_trabajos([trabajo_id])
+    assert trabajo["estado"] == "completado"
+    assert trabajo["doc_id"] == resultado["doc_id"]
+    assert len(load_index()["documentos"]) == 1
+
+
+def test_procesos_trabajadores_usan_la_carpeta_configurada(datos):
+    trabajo_id = encolar_documento(ArchivoPrueba("recibo.pdf", _pdf("Recibo de pago")))
+    
+    for proceso in doc_utils._lanzar_trabajadores(1, salir_si_vacia=True):
+        proceso.join(60)
+        assert proceso.exitcode == 0
+    
+    trabajo, = estado_trabajos([trabajo_id])
+    assert trabajo["estado"] == "completado"
+    assert len(load_index()["documentos"]) == 1
+
+
+def test_abandonado_sin_intentos_aparta_su_archivo(datos):
+    trabajo_id = encolar_documento(ArchivoPrueba("escaneo.pdf", b"contenido"))
+    conexion = doc_utils._conexion_cola()
+    try:
+        conexion.execute("UPDATE trabajos SET estado = 'procesando', iniciado = 0, intentos = ? WHERE id = ?",
+                         (doc_utils.MAX_INTENTOS, trabajo_id))
+    finally:
+        conexion.close()
+    
+    assert trabajador_cola(salir_si_vacia=True) == 0
+    
+    trabajo, = estado_trabajos([trabajo_id])
+    assert trabajo["estado"] == "error"
+    assert doc_utils.Path(trabajo["ruta"]).parent == doc_utils.COLA_DIR / "fallidos"
+    assert doc_utils.Path(trabajo["ruta"]).read_bytes() == b"contenido"
+    assert list(doc_utils.COLA_DIR.glob("*.pdf")) == []
+
+
+def test_hilo_trabajador_no_espera_al_indice(datos, monkeypatch):
+    import threading
+    
+    fin = threading.Event()
+    monkeypatch.setattr(doc_utils, "trabajador_cola", fin.wait)
+    monkeypatch.setitem(doc_utils._hilo_trabajador, "hilo", None)
+    
+    # Otro hilo está escribiendo el índice
+    tomado, soltar = threading.Event(), threading.Event()
+    
+    def escritor():
+        with doc_utils.bloqueo_indice():
+            tomado.set()
+            soltar.wait(10)
+    
+    hilo_escritor = threading.Thread(target=escritor)
+    hilo_escritor.start()
+    try:
+        assert tomado.wait(10)
+        iniciado = []
+        arranque = threading.Thread(target=lambda: iniciado.append(doc_utils.iniciar_trabajador_en_hilo()))
+        arranque.start()
+        arranque.join(5)
+        assert iniciado and iniciado[0].is_alive()
+        assert doc_utils.iniciar_trabajador_en_hilo() is iniciado[0]
+    finally:
+        soltar.set()
+        fin.set()
+        hilo_escritor.join()
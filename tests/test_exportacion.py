@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+
+import doc_utils
+from doc_utils import CAMPOS_CSV, exportar_reporte, load_index, save_index
+
+FECHAS = {
+    "factura_febrero.pdf": ("Factura", "2025-02-28 23:59:59"),
+    "factura_marzo.pdf": ("Factura", "2025-03-01 00:00:00"),
+    "contrato.pdf": ("Contrato", "2025-03-15 12:30:00"),
+    "factura_fin.pdf": ("Factura", "2025-03-31 23:59:59"),
+    "factura_abril.pdf": ("Factura", "2025-04-01 00:00:00"),
+}
+
+
+@pytest.fixture
+def documentos(datos, agregar):
+    """Documentos con fechas fijas alrededor de marzo de 2025; retorna {nombre: id}"""
+    ids = {nombre: agregar(nombre, f'Texto de {nombre}, con "comillas"\ny otra línea', categoria=categoria)
+           for nombre, (categoria, _) in FECHAS.items()}
+    indice = load_index()
+    for doc in indice["documentos"]:
+        doc["fecha_subida"] = FECHAS[doc["nombre_original"]][1]
+    save_index(indice)
+    return ids
+
+
+def _lineas_ndjson(contenido):
+    return [json.loads(linea) for linea in contenido.decode("utf-8").splitlines()]
+
+
+def test_ndjson(documentos, datos, monkeypatch):
+    # Bloques chicos para que un documento quede repartido entre varios
+    monkeypatch.setattr(doc_utils, "BLOQUE_EXPORTACION", 16)
+    destino = datos / "reporte.ndjson"
+    
+    assert exportar_reporte(destino) == 5
+    assert _lineas_ndjson(destino.read_bytes()) == load_index()["documentos"]
+
+
+def test_csv_con_filtro_de_categoria(documentos, datos):
+    destino = datos / "reporte.csv"
+    
+    assert exportar_reporte(destino, formato="csv", categoria="Factura") == 4
+    
+    contenido = destino.read_bytes()
+    assert contenido.startswith("\ufeff".encode("utf-8"))
+    encabezado, *filas = csv.reader(io.StringIO(contenido.decode("utf-8-sig"), newline=""))
+    assert encabezado == CAMPOS_CSV
+    assert sorted(int(fila[0]) for fila in filas) == sorted(
+        doc_id for nombre, doc_id in documentos.items() if FECHAS[nombre][0] == "Factura")
+    assert {fila[CAMPOS_CSV.index("categoria")] for fila in filas} == {"Factura"}
+    # Comillas y saltos de línea del texto sobreviven al CSV
+    fila = filas[0]
+    assert fila[CAMPOS_CSV.index("texto_extraido")] == (
+        f'Texto de {fila[CAMPOS_CSV.index("nombre_original")]}, con "comillas"\ny otra línea')
+
+
+def test_rango_de_fechas_inclusivo(documentos, datos):
+    destino = datos / "marzo.ndjson"
+    
+    assert exportar_reporte(destino, fecha_desde="2025-03-01", fecha_hasta="2025-03-31") == 3
+    nombres = [doc["nombre_original"] for doc in _lineas_ndjson(destino.read_bytes())]
+    assert nombres == ["factura_marzo.pdf", "contrato.pdf", "factura_fin.pdf"]
+    
+    assert exportar_reporte(destino, categoria="Factura", fecha_hasta="2025-03-01") == 2
+    assert exportar_reporte(destino, fecha_desde="2025-04-01") == 1
+    assert exportar_reporte(destino, categoria="Recibo") == 0
+    assert destino.read_bytes() == b""
+
+
+def test_zip_con_archivos_y_faltantes(documentos, datos):
+    originales = {doc["id"]: doc for doc in load_index()["documentos"]}
+    faltante = documentos["factura_fin.pdf"]
+    doc_utils._ruta_local(originales[faltante]).unlink()
+    destino = datos / "paquete.zip"
+    
+    assert exportar_reporte(destino, formato="zip", categoria="Factura", incluir_archivos=True) == 4
+    
+    with zipfile.ZipFile(destino) as zf:
+        listado = _lineas_ndjson(zf.read("documentos.ndjson"))
+        reporte = json.loads(zf.read("reporte.json"))
+        archivos = {nombre: zf.read(nombre) for nombre in zf.namelist() if nombre.startswith("archivos/")}
+    
+    assert [doc["id"] for doc in listado] == sorted(
+        doc_id for nombre, doc_id in documentos.items() if FECHAS[nombre][0] == "Factura")
+    assert reporte["total_exportados"] == 4
+    assert reporte["archivos_faltantes"] == [faltante]
+    assert reporte["filtros"] == {"categoria": "Factura", "fecha_desde": None, "fecha_hasta": None}
+    
+    esperados = {f"archivos/Factura/{doc['nombre_archivo']}": doc_utils._ruta_local(doc).read_bytes()
+                 for doc_id, doc in originales.items()
+                 if doc["categoria"] == "Factura" and doc_id != faltante}
+    assert archivos == esperados
+
+
+def test_zip_sin_archivos(documentos, datos):
+    destino = datos / "paquete.zip"
+    
+    assert exportar_reporte(destino, formato="zip") == 5
+    with zipfile.ZipFile(destino) as zf:
+        assert sorted(zf.namelist()) == ["documentos.ndjson", "reporte.json"]
+        assert json.loads(zf.read("reporte.json"))["archivos_faltantes"] == []
+
+
+def test_formato_desconocido(datos):
+    with pytest.raises(ValueError):
+        exportar_reporte(datos / "reporte.xml", formato="xml")
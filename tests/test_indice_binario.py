@@ -0,0 +1,108 @@
+import json
+
+import doc_utils
+from doc_utils import (cargar_tabla, indice_binario_a_json, indice_json_a_binario,
+                       load_index, save_index, verificar_indice_binario)
+
+
+def _agregar_varios(agregar):
+    agregar("factura_luz.pdf", "Factura de luz\fTotal a pagar: 1500 pesos")
+    agregar("contrato.pdf", "Contrato de alquiler entre las partes", categoria="Contrato")
+    agregar("foto_dni.png", "Documento nacional de identidad", categoria="Identificación personal")
+
+
+def test_ida_y_vuelta_json(datos, agregar):
+    _agregar_varios(agregar)
+    destino = datos / "copia.dfb"
+    
+    assert indice_json_a_binario(doc_utils.INDEX_FILE, destino) == 3
+    verificar_indice_binario(destino)
+    assert indice_binario_a_json(destino, datos / "copia.json") == 3
+    
+    original = load_index()
+    with open(datos / "copia.json", encoding="utf-8") as f:
+        copia = json.load(f)
+    assert copia == original
+
+
+def test_anexar_sin_reescribir(datos, agregar):
+    agregar("primero.pdf", "texto inicial")
+    tabla = cargar_tabla()
+    ruta = doc_utils._ruta_generacion(doc_utils._generacion_actual())
+    
+    # Extensión nueva: cambia el vocabulario
+    doc_id = agregar("escaneo.png", "otro texto", categoria="Recibo")
+    
+    assert doc_utils._ruta_generacion(doc_utils._generacion_actual()) == ruta
+    cabecera = verificar_indice_binario(ruta)
+    assert cabecera["filas"] == 2
+    assert cabecera["firma"] == doc_utils._firma_indice()
+    nueva = cargar_tabla()
+    assert nueva[1]["id"] == doc_id
+    assert nueva[1]["extension"] == ".png"
+    assert nueva[1]["categoria"] == "Recibo"
+    # La vista abierta antes sigue viendo solo su fila
+    assert len(tabla) == 1
+    assert tabla[0]["extension"] == ".pdf"
+
+
+def test_vocabulario_nuevo_no_pisa_el_anterior(datos, agregar):
+    agregar("primero.pdf", "texto")
+    ruta = doc_utils._ruta_generacion(doc_utils._generacion_actual())
+    antes = verificar_indice_binario(ruta)["secciones"]["vocabulario"]
+    with open(ruta, "rb") as f:
+        f.seek(antes[0])
+        vocabulario_anterior = f.read(antes[1])
+    
+    agregar("segundo.png", "texto")
+    
+    despues = verificar_indice_binario(ruta)["secciones"]["vocabulario"]
+    assert despues[0] == antes[0] + antes[1]
+    with open(ruta, "rb") as f:
+        f.seek(antes[0])
+        assert f.read(antes[1]) == vocabulario_anterior
+    
+    # Sin cambios de vocabulario no se escribe nada
+    agregar("tercero.png", "texto")
+    assert verificar_indice_binario(ruta)["secciones"]["vocabulario"] == despues
+
+
+def test_reconstruye_si_index_cambia_por_fuera(datos, agregar):
+    _agregar_varios(agregar)
+    generacion = doc_utils._generacion_actual()
+    
+    index = load_index()
+    index["documentos"][0]["categoria"] = "Otros"
+    save_index(index)
+    
+    tabla = cargar_tabla()
+    assert doc_utils._generacion_actual() == generacion + 1
+    assert tabla[0]["categoria"] == "Otros"
+    assert [doc["id"] for doc in tabla] == [doc["id"] for doc in index["documentos"]]
+    assert len(list(doc_utils.INDICE_BIN_DIR.glob("indice_*.dfb"))) == 1
+
+
+def test_arreglos_little_endian(datos, agregar):
+    _agregar_varios(agregar)
+    tabla = cargar_tabla()
+    columnas = doc_utils._arreglos(tabla)
+    assert list(columnas["id"]) == [1, 2, 3]
+    assert all(columna.dtype.byteorder in "<=|" for columna in columnas.values())
+
+
+def test_vista_se_comporta_como_mapping(datos, agregar):
+    _agregar_varios(agregar)
+    original = load_index()["documentos"][0]
+    doc = cargar_tabla()[0]
+    
+    assert list(doc) == list(doc.keys()) == list(original)
+    assert len(doc) == len(original)
+    assert dict(doc.items()) == original
+    assert list(doc.values()) == list(original.values())
+    assert json.loads(json.dumps(dict(doc), ensure_ascii=False)) == original
+    assert doc.get("no_existe", "x") == "x"
+    
+    # Los resultados de búsqueda agregan relevancia y fragmentos
+    resultado = doc_utils.search_documents("factura")[0]
+    assert list(resultado)[-2:] == ["relevancia", "fragmentos"]
+    assert len(resultado) == len(original) + 2
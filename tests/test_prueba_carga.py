@@ -0,0 +1,15 @@
+import doc_utils
+from prueba_carga import ejecutar_prueba_carga
+
+
+def test_hilos_y_particiones(datos):
+    reporte = ejecutar_prueba_carga(usuarios=4, procesos=2, duracion=1.0, corpus=20, datos=datos)
+    
+    assert reporte["particiones"] == 2
+    assert reporte["procesos_sin_respuesta"] == 0
+    assert reporte["total_errores"] == 0, reporte["operaciones"]
+    assert reporte["integridad"]["ok"], reporte["integridad"]
+    assert sum(op["completadas"] for op in reporte["operaciones"].values()) > 0
+    
+    # La carpeta de datos queda con las particiones que tenía
+    assert doc_utils.leer_config_particiones()["cantidad"] == 1
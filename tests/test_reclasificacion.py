@@ -0,0 +1,82 @@
+import doc_utils
+from doc_utils import (cargar_tabla, configurar_particiones, load_index, reclasificar_documentos,
+                       save_index, verificar_indice_binario)
+
+
+def _desactualizar(agregar):
+    agregar("a.pdf", "Factura número 123\fTotal a pagar con IVA", categoria="Contrato")
+    agregar("b.pdf", "Contrato de alquiler. Las partes acuerdan la cláusula primera", categoria="Factura")
+    agregar("c.png", "Curriculum vitae, experiencia laboral y educación", categoria="Otros")
+    index = load_index()
+    for doc in index["documentos"]:
+        doc["version_clasificador"] = "vieja"
+    save_index(index)
+    cargar_tabla()
+
+
+def _columnas(tabla):
+    return [(doc["id"], doc["categoria"], doc["confianza"], doc["version_clasificador"]) for doc in tabla]
+
+
+def _esperado():
+    return [(doc["id"], doc["categoria"], doc["confianza"], doc.get("version_clasificador"))
+            for doc in load_index()["documentos"]]
+
+
+def test_una_escritura_y_generacion_copiada(datos, agregar, monkeypatch):
+    _desactualizar(agregar)
+    generacion = doc_utils._generacion_actual()
+    vista = cargar_tabla()
+    antes = _columnas(vista)
+    escrituras = []
+    guardar = doc_utils.save_index
+    monkeypatch.setattr(doc_utils, "save_index", lambda index: escrituras.append(1) or guardar(index))
+    
+    def sin_reconstruir(*args, **kwargs):
+        raise AssertionError("no debería reconstruirse la tabla")
+    monkeypatch.setattr(doc_utils, "reconstruir_tabla", sin_reconstruir)
+    
+    reporte = reclasificar_documentos(procesos=1)
+    
+    assert reporte["procesados"] == 3
+    assert reporte["cambiados"] > 0
+    assert len(escrituras) == 1
+    assert doc_utils._generacion_actual() == generacion + 1
+    ruta = doc_utils._ruta_generacion(generacion + 1)
+    assert verificar_indice_binario(ruta)["firma"] == doc_utils._firma_indice()
+    assert _columnas(cargar_tabla()) == _esperado()
+    assert all(version == doc_utils.VERSION_CLASIFICADOR for *_, version in _esperado())
+    assert doc_utils.buscar_desactualizados() == []
+    # La vista abierta antes no cambia (la versión nueva del clasificador no está en su vocabulario)
+    assert _columnas(vista) == antes
+    assert [dict(doc)["version_clasificador"] for doc in vista] == ["vieja"] * 3
+
+
+def test_puntos_de_control(datos, agregar, monkeypatch):
+    _desactualizar(agregar)
+    escrituras = []
+    guardar = doc_utils.save_index
+    monkeypatch.setattr(doc_utils, "save_index", lambda index: escrituras.append(1) or guardar(index))
+    monkeypatch.setattr(doc_utils, "LOTE_CLASIFICACION", 1)
+    
+    reclasificar_documentos(procesos=1, tamaño_lote=2)
+    
+    assert len(escrituras) == 2
+    assert _columnas(cargar_tabla()) == _esperado()
+
+
+def test_particiones_actualizadas_en_el_lugar(datos, agregar):
+    _desactualizar(agregar)
+    configurar_particiones(2)
+    particiones = doc_utils.particiones_vigentes()
+    generaciones = [doc_utils._generacion_actual(particion) for particion in particiones]
+    
+    reclasificar_documentos(procesos=1)
+    
+    esperado = {fila[0]: fila for fila in _esperado()}
+    for particion, generacion in zip(particiones, generaciones):
+        assert doc_utils._generacion_actual(particion) == generacion + 1
+        assert len(list(doc_utils._directorio_tabla(particion).glob("indice_*.dfb"))) == 1
+        tabla = cargar_tabla(particion)
+        assert tabla.firma == doc_utils._firma_indice()
+        assert _columnas(tabla) == [esperado[doc["id"]] for doc in tabla]
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import doc_utils
+from doc_utils import VigilanteCarpetas, estado_trabajos, trabajos_en_curso, vigilar_carpetas
+
+
+def _entrada(datos):
+    carpeta = datos / "entrada"
+    carpeta.mkdir(exist_ok=True)
+    return carpeta
+
+
+def _escribir(carpeta, nombre, contenido=b"%PDF escaneado"):
+    ruta = carpeta / nombre
+    ruta.write_bytes(contenido)
+    return ruta
+
+
+def test_espera_a_que_el_archivo_deje_de_cambiar(datos):
+    carpeta = _entrada(datos)
+    ruta = _escribir(carpeta, "escaneo.pdf")
+    vacio = _escribir(carpeta, "vacio.pdf", b"")
+    vigilante = VigilanteCarpetas([carpeta], espera_estable=0.3)
+    
+    vigilante.listar()
+    assert vigilante.revisar() == 0
+    
+    # El escáner sigue escribiendo: vuelve a empezar la espera
+    time.sleep(0.2)
+    with open(ruta, "ab") as f:
+        f.write(b" segunda hoja")
+    assert vigilante.revisar() == 0
+    time.sleep(0.2)
+    assert vigilante.revisar() == 0
+    
+    time.sleep(0.2)
+    assert vigilante.revisar() == 1
+    assert not ruta.exists()
+    # Un archivo vacío todavía no se terminó de escribir
+    assert vacio.exists()
+    
+    trabajo, = estado_trabajos()
+    assert trabajo["nombre"] == "escaneo.pdf"
+    assert trabajo["estado"] == "pendiente"
+    assert [ruta.suffix for ruta in doc_utils.COLA_DIR.iterdir()] == [".pdf"]
+
+
+def test_ignora_ocultos_temporales_y_no_soportados(datos):
+    carpeta = _entrada(datos)
+    for nombre in (".oculto.pdf", "~$borrador.pdf", "notas.txt", "escaneo.pdf.part", "foto.PNG"):
+        _escribir(carpeta, nombre)
+    vigilante = VigilanteCarpetas([carpeta], espera_estable=0)
+    
+    vigilante.listar()
+    vigilante.revisar()
+    assert vigilante.revisar() == 1
+    
+    assert sorted(ruta.name for ruta in carpeta.iterdir()) == [".oculto.pdf", "escaneo.pdf.part",
+                                                               "notas.txt", "~$borrador.pdf"]
+    assert [trabajo["nombre"] for trabajo in estado_trabajos()] == ["foto.PNG"]
+    
+    # Los avisos del sistema pasan por el mismo filtro
+    vigilante.avisar(carpeta / "notas.txt")
+    vigilante.avisar(carpeta / ".oculto.pdf")
+    assert vigilante.revisar() == 0
+
+
+def test_lotes_de_tamaño_limitado(datos):
+    carpeta = _entrada(datos)
+    for numero in range(5):
+        _escribir(carpeta, f"hoja_{numero}.pdf")
+    lotes = []
+    vigilante = VigilanteCarpetas([carpeta], espera_estable=0, tamaño_lote=2, al_encolar=lotes.append)
+    
+    vigilante.listar()
+    assert vigilante.revisar() == 0
+    assert [vigilante.revisar() for _ in range(4)] == [2, 2, 1, 0]
+    
+    assert [len(lote) for lote in lotes] == [2, 2, 1]
+    assert vigilante.encolados == 5
+    assert list(carpeta.iterdir()) == []
+    # Todas en la cola con su archivo movido
+    assert len(estado_trabajos()) == 5
+    assert len(list(doc_utils.COLA_DIR.iterdir())) == 5
+
+
+def test_contrapresion_con_la_cola_llena(datos):
+    carpeta = _entrada(datos)
+    for numero in range(5):
+        _escribir(carpeta, f"hoja_{numero}.pdf")
+    vigilante = VigilanteCarpetas([carpeta], espera_estable=0, max_pendientes=3)
+    
+    vigilante.listar()
+    vigilante.revisar()
+    assert vigilante.revisar() == 3
+    assert trabajos_en_curso() == 3
+    
+    # Con la cola llena los archivos esperan en su carpeta
+    assert vigilante.revisar() == 0
+    assert len(list(carpeta.iterdir())) == 2
+    
+    conexion = doc_utils._conexion_cola()
+    try:
+        conexion.execute("UPDATE trabajos SET estado = 'completado'")
+    finally:
+        conexion.close()
+    assert vigilante.revisar() == 2
+    assert list(carpeta.iterdir()) == []
+
+
+def test_vigilar_carpetas_mueve_los_archivos_a_la_cola(datos):
+    carpeta = _entrada(datos)
+    detener = threading.Event()
+    resultado = []
+    hilo = threading.Thread(target=lambda: resultado.append(
+        vigilar_carpetas([carpeta], trabajadores=0, detener=detener, espera_estable=0.1, intervalo=0.05)))
+    hilo.start()
+    try:
+        for numero in range(3):
+            _escribir(carpeta, f"hoja_{numero}.jpg")
+        limite = time.monotonic() + 10
+        while any(carpeta.iterdir()) and time.monotonic() < limite:
+            time.sleep(0.05)
+    finally:
+        detener.set()
+        hilo.join(timeout=10)
+    
+    assert resultado == [3]
+    assert list(carpeta.iterdir()) == []
+    assert sorted(trabajo["nombre"] for trabajo in estado_trabajos()) == [
+        "hoja_0.jpg", "hoja_1.jpg", "hoja_2.jpg"]
+    assert sorted(ruta.suffix for ruta in doc_utils.COLA_DIR.iterdir()) == [".jpg"] * 3